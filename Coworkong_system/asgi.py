@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Le flux de notifications (/api/notifications/flux/) est une vue asynchrone
+qui garde la connexion ouverte : il doit être servi par un serveur ASGI, par
+exemple ``uvicorn Coworkong_system.asgi:application``.
 """
 
 import os
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,10 +44,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Avant tout middleware qui lit ou modifie le corps de la réponse
+    'coworking.reponses.CompressionMiddleware',
+    # ETag haché sur le corps pour les pages sans condition_modeles (coworking.reponses)
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'coworking.roles.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,12 +80,96 @@ WSGI_APPLICATION = 'Coworkong_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Base de données : profil choisi par COWORKING_BASE.
+# sqlite (défaut) : fichier local en WAL, les lectures ne bloquent plus les
+# écritures ; COWORKING_SQLITE_OPTIMISE=0 revient aux réglages d'origine.
+# postgres : connexions persistantes (COWORKING_BASE_CONN_MAX_AGE secondes,
+# vérifiées avant réutilisation) ou, si COWORKING_BASE_POOL donne une taille,
+# pool psycopg 3 (pip install "psycopg[pool]"). COWORKING_PGBOUNCER=1
+# derrière PgBouncer en mode transaction (pas de curseurs côté serveur).
+# Comparer les profils : manage.py bench_reservations.
+COWORKING_BASE = os.environ.get('COWORKING_BASE', 'sqlite')
+
+if COWORKING_BASE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'coworking'),
+            'USER': os.environ.get('POSTGRES_USER', 'coworking'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('COWORKING_BASE_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('COWORKING_PGBOUNCER') == '1',
+            'OPTIONS': {},
+        }
     }
-}
+    if int(os.environ.get('COWORKING_BASE_POOL', 0)):
+        # Le pool garde lui-même les connexions ouvertes : CONN_MAX_AGE doit valoir 0
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('COWORKING_BASE_POOL_MIN', 2)),
+            'max_size': int(os.environ['COWORKING_BASE_POOL']),
+            'timeout': 10,
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('COWORKING_SQLITE', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+    if os.environ.get('COWORKING_SQLITE_OPTIMISE', '1') != '0':
+        DATABASES['default']['OPTIONS'] = {
+            # Verrou d'écriture pris dès BEGIN : une transaction attend son tour
+            # au lieu d'échouer (« database is locked ») au milieu
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join([
+                'PRAGMA journal_mode=WAL',
+                'PRAGMA synchronous=NORMAL',
+                'PRAGMA busy_timeout=5000',
+                'PRAGMA mmap_size=134217728',
+                'PRAGMA cache_size=-20000',
+                'PRAGMA temp_store=MEMORY',
+            ]),
+        }
+
+
+# Cache : mémoire locale par défaut (propre à chaque processus).
+# COWORKING_CACHE=fichier partage le cache entre processus via un dossier ;
+# COWORKING_CACHE=base le range dans une table de la base (lancer d'abord
+# « manage.py createcachetable »).
+COWORKING_CACHE = os.environ.get('COWORKING_CACHE', 'memoire')
+
+if COWORKING_CACHE == 'fichier':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('COWORKING_CACHE_DOSSIER', str(BASE_DIR / 'cache')),
+        }
+    }
+elif COWORKING_CACHE == 'base':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'coworking_cache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'coworking',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Durée de vie (secondes) des pages publiques en cache (coworking.cache_modeles)
+CACHE_MODELES_DUREE = 300
+
+# Taille minimale (octets) d'une réponse texte compressée en gzip (coworking.reponses)
+COMPRESSION_TAILLE_MIN = 1024
 
 
 # Password validation
@@ -118,6 +208,18 @@ LOGIN_URL = '/login/'
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+# Sortie de collectstatic (commande construire_statiques)
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Noms empreintés (css/styles.<empreinte>.css) : cache navigateur illimité
+    'staticfiles': {
+        'BACKEND': 'coworking.statiques.StockageStatiques',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -5,7 +5,9 @@ from django.contrib import admin
 from .models import (
     TypeEspace, EspaceTravail, ProfilMembre, Reservation,
     Evenement, Inscription, Facture, Notification,
-    HistoriqueReservation, HistoriquePaiement, RoleUtilisateur
+    HistoriqueReservation, HistoriquePaiement, RoleUtilisateur,
+    CompteurNotifications, ListeAttente, SequenceFacture, MetriqueTache, SerieReservation,
+    RevenuJournalier, RegleTarif,
 )
 
 # -------------------
@@ -34,6 +36,15 @@ class ProfilMembreAdmin(admin.ModelAdmin):
     list_filter = ('type_abonnement', 'abonnement_actif')
     search_fields = ('user__username', 'entreprise', 'telephone')
 
+# -------------------
+# RegleTarif (compilées par coworking.tarifs)
+# -------------------
+@admin.register(RegleTarif)
+class RegleTarifAdmin(admin.ModelAdmin):
+    list_display = ('nom', 'genre', 'espace', 'type_espace', 'actif')
+    list_filter = ('genre', 'actif', 'type_espace')
+    search_fields = ('nom',)
+
 # -------------------
 # Reservation
 # -------------------
@@ -43,6 +54,15 @@ class ReservationAdmin(admin.ModelAdmin):
     list_filter = ('statut', 'espace')
     search_fields = ('membre__username', 'espace__nom')
 
+# -------------------
+# SerieReservation
+# -------------------
+@admin.register(SerieReservation)
+class SerieReservationAdmin(admin.ModelAdmin):
+    list_display = ('membre', 'espace', 'frequence', 'intervalle', 'date_debut', 'nombre_occurrences', 'jusqu_au')
+    list_filter = ('frequence', 'espace')
+    search_fields = ('membre__username', 'espace__nom')
+
 # -------------------
 # Evenement
 # -------------------
@@ -60,6 +80,14 @@ class InscriptionAdmin(admin.ModelAdmin):
     list_filter = ('presente',)
     search_fields = ('membre__username', 'evenement__nom')
 
+# -------------------
+# ListeAttente
+# -------------------
+@admin.register(ListeAttente)
+class ListeAttenteAdmin(admin.ModelAdmin):
+    list_display = ('membre', 'evenement', 'date_demande')
+    search_fields = ('membre__username', 'evenement__nom')
+
 # -------------------
 # Facture
 # -------------------
@@ -69,6 +97,23 @@ class FactureAdmin(admin.ModelAdmin):
     list_filter = ('statut',)
     search_fields = ('numero', 'membre__username')
 
+# -------------------
+# SequenceFacture
+# -------------------
+@admin.register(SequenceFacture)
+class SequenceFactureAdmin(admin.ModelAdmin):
+    list_display = ('jour', 'dernier')
+
+# -------------------
+# RevenuJournalier (tenu à jour par coworking.revenus, recalculé par reconstruire_revenus)
+# -------------------
+@admin.register(RevenuJournalier)
+class RevenuJournalierAdmin(admin.ModelAdmin):
+    list_display = ('jour', 'type_espace', 'type_abonnement', 'nombre_factures', 'montant_emis',
+                    'montant_paye', 'montant_encaisse')
+    list_filter = ('type_espace', 'type_abonnement')
+    date_hierarchy = 'jour'
+
 # -------------------
 # Notification
 # -------------------
@@ -78,6 +123,14 @@ class NotificationAdmin(admin.ModelAdmin):
     list_filter = ('type_notification', 'lue')
     search_fields = ('titre', 'destinataire__username')
 
+# -------------------
+# CompteurNotifications
+# -------------------
+@admin.register(CompteurNotifications)
+class CompteurNotificationsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'non_lues', 'version')
+    search_fields = ('user__username',)
+
 # -------------------
 # HistoriqueReservation
 # -------------------
@@ -102,3 +155,12 @@ class RoleUtilisateurAdmin(admin.ModelAdmin):
     list_display = ('user', 'role')
     list_filter = ('role',)
     search_fields = ('user__username',)
+
+# -------------------
+# MetriqueTache
+# -------------------
+@admin.register(MetriqueTache)
+class MetriqueTacheAdmin(admin.ModelAdmin):
+    list_display = ('nom', 'debut', 'duree_ms', 'lignes')
+    list_filter = ('nom',)
+    readonly_fields = ('nom', 'debut', 'duree_ms', 'lignes', 'erreur')
@@ -1,6 +1,21 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
 class CoworkingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'coworking'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import planificateur
+
+        # Pas de planificateur pour les commandes ponctuelles (migrate, shell...),
+        # ni dans le processus de surveillance de l'autoreload de runserver
+        commande = sys.argv[1] if len(sys.argv) > 1 and sys.argv[0].endswith('manage.py') else None
+        if planificateur.ACTIF and (
+            commande is None or (commande == 'runserver' and (os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv))
+        ):
+            planificateur.configurer()
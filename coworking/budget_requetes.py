@@ -0,0 +1,109 @@
+"""
+Budget de requêtes SQL par vue.
+
+@budget_requetes(n) compte les requêtes exécutées pendant la vue, rendu du
+gabarit compris, et signale tout dépassement : avertissement dans les logs,
+ou exception BudgetDepasse si BUDGET_REQUETES_STRICT est vrai. Le budget vaut
+pour une page en régime établi : la première visite d'un utilisateur peut le
+dépasser (compteur de notifications créé à la demande, par exemple). Il reste
+lisible sur la vue (attribut budget_requetes).
+
+BudgetRequetesMixin (pour les TestCase) charge une page, vérifie qu'elle
+respecte le budget de sa vue, puis ajoute des données et vérifie que le
+nombre de requêtes n'a pas bougé : un N+1 apparu dans une vue ou un gabarit
+fait échouer les tests.
+"""
+import logging
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+STRICT = getattr(settings, 'BUDGET_REQUETES_STRICT', False)
+
+
+class BudgetDepasse(Exception):
+    """Une vue a exécuté plus de requêtes que son budget."""
+
+
+class CompteurRequetes:
+    """execute_wrapper qui compte (et garde) les requêtes exécutées."""
+
+    def __init__(self):
+        self.requetes = []
+
+    @property
+    def nombre(self):
+        return len(self.requetes)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.requetes.append(sql)
+        return execute(sql, params, many, context)
+
+    def detail(self):
+        return '\n'.join(f'{rang}. {sql}' for rang, sql in enumerate(self.requetes, 1))
+
+
+@contextmanager
+def compter_requetes(alias=DEFAULT_DB_ALIAS):
+    compteur = CompteurRequetes()
+    with connections[alias].execute_wrapper(compteur):
+        yield compteur
+
+
+def budget_requetes(maximum):
+    """Déclare qu'une vue exécute au plus `maximum` requêtes (authentification comprise).
+
+    À placer au-dessus de @login_required pour compter aussi la session et l'utilisateur.
+    """
+    def decorateur(vue):
+        @wraps(vue)
+        def enveloppe(request, *args, **kwargs):
+            with compter_requetes() as compteur:
+                reponse = vue(request, *args, **kwargs)
+            if compteur.nombre > maximum:
+                message = f"{vue.__name__} : {compteur.nombre} requêtes pour un budget de {maximum}"
+                if STRICT:
+                    raise BudgetDepasse(f"{message}\n{compteur.detail()}")
+                logger.warning("%s (%s)", message, request.path)
+            return reponse
+
+        enveloppe.budget_requetes = maximum
+        return enveloppe
+    return decorateur
+
+
+class BudgetRequetesMixin:
+    """Assertions de budget de requêtes pour les TestCase (utilise self.client)."""
+
+    def compter_requetes_page(self, url):
+        with compter_requetes() as compteur:
+            reponse = self.client.get(url)
+        self.assertEqual(reponse.status_code, 200, f"{url} : statut {reponse.status_code}")
+        return compteur
+
+    def assertBudgetRequetes(self, url, ajouter_donnees=None):
+        """Vérifie que `url` respecte le budget de sa vue et, si `ajouter_donnees`
+        est donné, que son nombre de requêtes ne change pas une fois ces données créées.
+        """
+        budget = getattr(resolve(urlsplit(url).path).func, 'budget_requetes', None)
+        self.assertIsNotNone(budget, f"{url} : la vue ne déclare pas de budget (@budget_requetes)")
+        # Premier chargement hors mesure : caches et tables créées à la demande
+        self.compter_requetes_page(url)
+        avant = self.compter_requetes_page(url)
+        self.assertLessEqual(
+            avant.nombre, budget, f"{url} : {avant.nombre} requêtes pour un budget de {budget}\n{avant.detail()}"
+        )
+        if ajouter_donnees is not None:
+            ajouter_donnees()
+            apres = self.compter_requetes_page(url)
+            self.assertEqual(
+                apres.nombre, avant.nombre,
+                f"{url} : {avant.nombre} puis {apres.nombre} requêtes après ajout de données\n{apres.detail()}",
+            )
+        return avant.nombre
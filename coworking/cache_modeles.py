@@ -0,0 +1,133 @@
+"""
+Cache des pages publiques (accueil, espaces, événements) invalidé par modèle.
+
+Chaque modèle suivi a une version dans le cache ; les signaux la changent à
+chaque enregistrement ou suppression. Les entrées (données de vue ou
+fragments de gabarit, voir {% en_cache %}) sont rangées sous une clé qui
+contient les versions des modèles dont elles dépendent : une modification
+les rend inaccessibles, sans avoir à les retrouver pour les effacer.
+
+Les update() et bulk_create() ne passent pas par les signaux, et un cache
+en mémoire locale n'est pas partagé entre processus : les entrées expirent
+donc aussi au bout de CACHE_MODELES_DUREE secondes.
+
+Succès et défauts sont comptés par nom d'entrée, dans le processus
+(ratios()).
+
+L'heure de la dernière invalidation de chaque modèle est gardée à côté de
+sa version (derniere_modification()) : elle sert d'en-tête Last-Modified
+aux pages qui dépendent de ces modèles (voir coworking.reponses).
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+DUREE = getattr(settings, 'CACHE_MODELES_DUREE', 300)
+
+_ABSENT = object()
+
+
+def _label(modele):
+    return modele.lower() if isinstance(modele, str) else modele._meta.label_lower
+
+
+def cle_version(modele):
+    return f'modeles:version:{_label(modele)}'
+
+
+def cle_date(modele):
+    return f'modeles:date:{_label(modele)}'
+
+
+def versions(modeles):
+    """Versions courantes des modèles (une lecture du cache) ; tire celles qui manquent."""
+    cles = [cle_version(modele) for modele in modeles]
+    trouvees = cache.get_many(cles)
+    for cle in cles:
+        if cle not in trouvees:
+            cache.add(cle, uuid.uuid4().hex, None)
+            trouvees[cle] = cache.get(cle)
+    return [trouvees[cle] for cle in cles]
+
+
+def invalider(modele):
+    cache.delete(cle_version(modele))
+    cache.set(cle_date(modele), time.time(), None)
+
+
+def derniere_modification(modeles):
+    """Heure (UTC, à la seconde) de la dernière invalidation parmi `modeles`.
+
+    Une date perdue par le cache est remplacée par l'heure courante : la page
+    paraît alors modifiée, jamais l'inverse. None si le cache ne garde rien
+    (DummyCache).
+    """
+    cles = [cle_date(modele) for modele in modeles]
+    trouvees = cache.get_many(cles)
+    for cle in cles:
+        if cle not in trouvees:
+            cache.add(cle, time.time(), None)
+            trouvees[cle] = cache.get(cle)
+    if None in trouvees.values():
+        return None
+    return datetime.fromtimestamp(int(max(trouvees.values())), tz=timezone.utc)
+
+
+def cle(nom, modeles, variantes=()):
+    empreinte = hashlib.md5(repr((versions(modeles), variantes)).encode()).hexdigest()
+    return f'modeles:{nom}:{empreinte}'
+
+
+class Compteurs:
+    """Succès / défauts par nom d'entrée (processus courant)."""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.succes = Counter()
+        self.defauts = Counter()
+
+    def compter(self, nom, trouve):
+        with self._verrou:
+            (self.succes if trouve else self.defauts)[nom] += 1
+
+    def ratios(self):
+        """{nom: (succès, défauts, ratio)}"""
+        with self._verrou:
+            noms = sorted(set(self.succes) | set(self.defauts))
+            return {
+                nom: (self.succes[nom], self.defauts[nom],
+                      self.succes[nom] / (self.succes[nom] + self.defauts[nom]))
+                for nom in noms
+            }
+
+    def remettre_a_zero(self):
+        with self._verrou:
+            self.succes.clear()
+            self.defauts.clear()
+
+
+compteurs = Compteurs()
+
+
+def lire(nom, modeles, calculer, variantes=(), duree=DUREE):
+    """Valeur en cache pour (nom, versions des modeles, variantes), calculée au besoin.
+
+    `calculer` doit retourner une valeur sérialisable (liste plutôt que queryset).
+    """
+    cle_entree = cle(nom, modeles, variantes)
+    valeur = cache.get(cle_entree, _ABSENT)
+    compteurs.compter(nom, valeur is not _ABSENT)
+    if valeur is _ABSENT:
+        valeur = calculer()
+        cache.set(cle_entree, valeur, duree)
+    return valeur
+
+
+def ratios():
+    return compteurs.ratios()
@@ -0,0 +1,81 @@
+"""
+Recherche de créneaux libres sur l'ensemble des espaces.
+
+La disponibilité de la période et les créneaux libres suivants sont lus dans
+les arbres d'intervalles du moteur de disponibilité (coworking.disponibilite),
+chargés en une seule requête pour les espaces qui n'y sont pas encore.
+chiffrer() ajoute ensuite les prix de la période demandée et des créneaux
+proposés, en un seul devis (coworking.tarifs).
+"""
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from . import tarifs
+from .disponibilite import espaces_libres, moteur
+from .models import EspaceTravail
+
+# Fenêtre explorée après la période demandée pour proposer des alternatives
+HORIZON_SUGGESTIONS = timedelta(days=7)
+NB_SUGGESTIONS = 3
+
+
+@dataclass
+class ResultatCreneaux:
+    espace: EspaceTravail
+    libre: bool
+    prochains_creneaux: list = field(default_factory=list)
+    # Renseignés par chiffrer()
+    prix: object = None
+    prix_creneaux: list = field(default_factory=list)
+
+    @property
+    def creneaux_chiffres(self):
+        """[(début, fin, prix)] des prochains créneaux libres."""
+        return [(debut, fin, prix) for (debut, fin), prix in zip(self.prochains_creneaux, self.prix_creneaux)]
+
+
+def candidats(type_espace=None, capacite_min=None):
+    espaces = EspaceTravail.objects.filter(disponible=True).select_related('type_espace')
+    if type_espace:
+        espaces = espaces.filter(type_espace=type_espace)
+    if capacite_min:
+        espaces = espaces.filter(capacite__gte=capacite_min)
+    return espaces
+
+
+def rechercher_creneaux(date_debut, date_fin, type_espace=None, capacite_min=None,
+                        nombre=NB_SUGGESTIONS, horizon=HORIZON_SUGGESTIONS):
+    """Pour chaque espace candidat : libre sur [date_debut, date_fin) et prochains créneaux libres.
+
+    Les créneaux proposés ont la même durée que la période demandée et
+    commencent au plus tôt à date_debut (et pas avant la veille).
+    """
+    espaces = list(candidats(type_espace, capacite_min))
+    libres = espaces_libres(espaces, date_debut, date_fin)
+    suggestions = moteur.creneaux_libres(
+        [espace.pk for espace in espaces], date_debut, date_fin - date_debut, date_fin + horizon, nombre,
+    )
+    return [
+        ResultatCreneaux(espace=espace, libre=espace.pk in libres, prochains_creneaux=suggestions[espace.pk])
+        for espace in espaces
+    ]
+
+
+def chiffrer(resultats, date_debut, date_fin, type_abonnement=None):
+    """Prix de la période demandée et des créneaux proposés de chaque résultat, en un devis.
+
+    Le chiffrage parcourt la période jour par jour : une période refusée par
+    tarifs.erreur_creneau (trop longue ou trop lointaine) lève ValueError.
+    """
+    erreur = tarifs.erreur_creneau(date_debut, date_fin)
+    if erreur:
+        raise ValueError(erreur)
+    demandes = []
+    for resultat in resultats:
+        demandes.append((resultat.espace, date_debut, date_fin))
+        demandes.extend((resultat.espace, debut, fin) for debut, fin in resultat.prochains_creneaux)
+    prix = iter(tarifs.devis(demandes, type_abonnement))
+    for resultat in resultats:
+        resultat.prix = next(prix)
+        resultat.prix_creneaux = [next(prix) for _ in resultat.prochains_creneaux]
+    return resultats
@@ -0,0 +1,227 @@
+"""
+Moteur de disponibilité des espaces de travail.
+
+Chaque espace possède un arbre d'intervalles en mémoire construit à partir
+de ses réservations confirmées. L'arbre est chargé en une seule requête
+(appuyée sur l'index composite de Reservation) puis conservé dans le
+processus jusqu'à ce qu'une réservation de l'espace soit modifiée ou que
+la durée de validité soit dépassée.
+
+Les arbres servent aux recherches sur de nombreux espaces (espaces libres,
+créneaux libres) : une écriture faite par un autre processus n'y apparaît
+qu'après DUREE_VALIDITE. La validation d'une saisie (est_disponible) et la
+vérification faite sous verrou par coworking.reservations lisent la base.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Reservation
+
+# Statuts qui occupent réellement un créneau
+STATUTS_BLOQUANTS = ('confirmee',)
+
+# Durée de validité (secondes) d'un arbre en mémoire. Les signaux invalident
+# l'arbre dans le processus courant ; la durée borne le retard vu par les
+# autres processus.
+DUREE_VALIDITE = getattr(settings, 'DISPONIBILITE_DUREE_VALIDITE', 30)
+
+# Les réservations terminées avant cet horizon ne sont pas chargées en mémoire :
+# une recherche qui commence avant l'horizon interroge directement la base.
+HORIZON_PASSE = timedelta(days=1)
+
+
+class ArbreIntervalles:
+    """Arbre d'intervalles statique [debut, fin) construit sur un tableau trié."""
+
+    def __init__(self, intervalles):
+        # intervalles : liste de tuples (debut, fin, reservation_id)
+        self.intervalles = sorted(intervalles, key=lambda i: i[0])
+        self.fin_max = [None] * len(self.intervalles)
+        if self.intervalles:
+            self._construire(0, len(self.intervalles) - 1)
+
+    def _construire(self, bas, haut):
+        milieu = (bas + haut) // 2
+        fin_max = self.intervalles[milieu][1]
+        if bas < milieu:
+            fin_max = max(fin_max, self._construire(bas, milieu - 1))
+        if milieu < haut:
+            fin_max = max(fin_max, self._construire(milieu + 1, haut))
+        self.fin_max[milieu] = fin_max
+        return fin_max
+
+    def chevauchements(self, debut, fin, exclure=None):
+        """Retourne les intervalles qui chevauchent [debut, fin)."""
+        return [i for i in self._parcourir(0, len(self.intervalles) - 1, debut, fin) if i[2] != exclure]
+
+    def chevauche(self, debut, fin, exclure=None):
+        """Indique si au moins un intervalle chevauche [debut, fin)."""
+        return any(i[2] != exclure for i in self._parcourir(0, len(self.intervalles) - 1, debut, fin))
+
+    def _parcourir(self, bas, haut, debut, fin):
+        if bas > haut:
+            return
+        milieu = (bas + haut) // 2
+        if self.fin_max[milieu] <= debut:
+            # Aucun intervalle de ce sous-arbre ne se termine après le début
+            return
+        yield from self._parcourir(bas, milieu - 1, debut, fin)
+        intervalle = self.intervalles[milieu]
+        if intervalle[0] >= fin:
+            # Le sous-arbre droit commence entièrement après la fin recherchée
+            return
+        if intervalle[1] > debut:
+            yield intervalle
+        yield from self._parcourir(milieu + 1, haut, debut, fin)
+
+    def creneaux_libres(self, debut, duree, limite, nombre):
+        """Les `nombre` premiers créneaux de `duree` libres entre debut et limite, au plus tôt."""
+        creneaux = []
+        curseur = debut
+        # Intervalles qui touchent la fenêtre, par ordre de début
+        occupes = iter(self.chevauchements(debut, limite))
+        prochain = next(occupes, None)
+        while len(creneaux) < nombre and curseur + duree <= limite:
+            if prochain and prochain[0] < curseur + duree:
+                # Intervalle occupé sur le chemin : on reprend à sa fin
+                curseur = max(curseur, prochain[1])
+                prochain = next(occupes, None)
+            else:
+                creneaux.append((curseur, curseur + duree))
+                curseur += duree
+        return creneaux
+
+    def __len__(self):
+        return len(self.intervalles)
+
+
+class MoteurDisponibilite:
+    """Cache des arbres d'intervalles par espace, partagé par le processus."""
+
+    def __init__(self):
+        self._arbres = {}
+        self._verrou = threading.Lock()
+
+    def invalider(self, espace_id=None):
+        with self._verrou:
+            if espace_id is None:
+                self._arbres.clear()
+            else:
+                self._arbres.pop(espace_id, None)
+
+    def _horizon(self):
+        return timezone.now() - HORIZON_PASSE
+
+    def _charger(self, espace_ids, horizon):
+        """Charge en une requête les arbres manquants ou expirés."""
+        maintenant = time.monotonic()
+        with self._verrou:
+            manquants = [
+                espace_id for espace_id in espace_ids
+                if espace_id not in self._arbres
+                or maintenant - self._arbres[espace_id][1] > DUREE_VALIDITE
+            ]
+        if not manquants:
+            return
+        intervalles = {espace_id: [] for espace_id in manquants}
+        lignes = Reservation.objects.filter(
+            espace_id__in=manquants,
+            statut__in=STATUTS_BLOQUANTS,
+            date_fin__gt=horizon,
+        ).values_list('espace_id', 'date_debut', 'date_fin', 'id')
+        for espace_id, debut, fin, pk in lignes.iterator():
+            intervalles[espace_id].append((debut, fin, pk))
+        with self._verrou:
+            for espace_id, liste in intervalles.items():
+                self._arbres[espace_id] = (ArbreIntervalles(liste), maintenant)
+
+    def _arbres_de(self, espace_ids, horizon):
+        self._charger(espace_ids, horizon)
+        with self._verrou:
+            return {espace_id: self._arbres[espace_id][0] for espace_id in espace_ids}
+
+    def espaces_libres(self, espace_ids, date_debut, date_fin, exclure=None):
+        """Retourne l'ensemble des espaces libres sur [date_debut, date_fin)."""
+        espace_ids = list(espace_ids)
+        if not espace_ids:
+            return set()
+        horizon = self._horizon()
+        occupes = set()
+        if date_debut < horizon:
+            # Partie antérieure à l'horizon : non couverte par les arbres
+            anciennes = bloquantes(espace_ids, date_debut, min(date_fin, horizon), exclure)
+            occupes.update(anciennes.values_list('espace_id', flat=True))
+            if date_fin <= horizon:
+                return set(espace_ids) - occupes
+        debut = max(date_debut, horizon)
+        for espace_id, arbre in self._arbres_de(espace_ids, horizon).items():
+            if espace_id not in occupes and arbre.chevauche(debut, date_fin, exclure=exclure):
+                occupes.add(espace_id)
+        return set(espace_ids) - occupes
+
+    def creneaux_libres(self, espace_ids, debut, duree, limite, nombre):
+        """{espace_id: [(début, fin)]} : les `nombre` premiers créneaux de `duree` libres
+        de chaque espace entre debut et limite.
+
+        Les créneaux proposés ne commencent pas avant l'horizon des arbres
+        (la veille) : un créneau passé ne se réserve pas.
+        """
+        horizon = self._horizon()
+        debut = max(debut, horizon)
+        return {
+            espace_id: arbre.creneaux_libres(debut, duree, limite, nombre)
+            for espace_id, arbre in self._arbres_de(list(espace_ids), horizon).items()
+        }
+
+    def conflits(self, espace_id, date_debut, date_fin, exclure=None):
+        """Retourne les identifiants des réservations bloquantes en conflit, par ordre de début."""
+        horizon = self._horizon()
+        ids = []
+        if date_debut < horizon:
+            anciennes = bloquantes([espace_id], date_debut, min(date_fin, horizon), exclure)
+            ids = list(anciennes.order_by('date_debut').values_list('id', flat=True))
+            if date_fin <= horizon:
+                return ids
+        arbre = self._arbres_de([espace_id], horizon)[espace_id]
+        # Une réservation à cheval sur l'horizon est aussi dans l'arbre
+        return ids + [
+            pk for _, _, pk in arbre.chevauchements(max(date_debut, horizon), date_fin, exclure=exclure)
+            if pk not in ids
+        ]
+
+
+moteur = MoteurDisponibilite()
+
+
+def bloquantes(espace_ids, date_debut, date_fin, exclure=None):
+    """Réservations bloquantes des espaces qui chevauchent [date_debut, date_fin) (lecture en base)."""
+    reservations = Reservation.objects.filter(
+        espace_id__in=espace_ids,
+        statut__in=STATUTS_BLOQUANTS,
+        date_debut__lt=date_fin,
+        date_fin__gt=date_debut,
+    )
+    if exclure:
+        reservations = reservations.exclude(pk=exclure)
+    return reservations
+
+
+def conflits_en_base(espace_id, date_debut, date_fin, exclure=None):
+    """Identifiants des réservations bloquantes qui chevauchent la période (lecture en base)."""
+    return list(bloquantes([espace_id], date_debut, date_fin, exclure).values_list('id', flat=True))
+
+
+def est_disponible(espace, date_debut, date_fin, exclure=None):
+    """Indique, d'après la base (une requête), si l'espace est libre : utilisé par les modèles et formulaires."""
+    espace_id = getattr(espace, 'pk', espace)
+    return not bloquantes([espace_id], date_debut, date_fin, exclure).exists()
+
+
+def espaces_libres(espaces, date_debut, date_fin):
+    """Filtre en une passe une liste d'espaces (ou d'identifiants) libres."""
+    ids = [getattr(espace, 'pk', espace) for espace in espaces]
+    return moteur.espaces_libres(ids, date_debut, date_fin)
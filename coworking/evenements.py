@@ -0,0 +1,132 @@
+"""
+Inscriptions aux événements sans survente, avec liste d'attente.
+
+Une place est prise par un UPDATE conditionnel sur Evenement.nb_inscrits
+(nb_inscrits < places_max) : la base arbitre entre les requêtes concurrentes
+et le compteur ne peut jamais dépasser places_max. La liste d'attente est
+promue dans l'ordre d'arrivée dès qu'une place se libère.
+"""
+from dataclasses import dataclass
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from .models import Evenement, Inscription, ListeAttente, Notification
+
+
+@dataclass(frozen=True)
+class ResultatInscription:
+    INSCRIT = 'inscrit'
+    DEJA_INSCRIT = 'deja_inscrit'
+    EN_ATTENTE = 'en_attente'
+    DEJA_EN_ATTENTE = 'deja_en_attente'
+
+    statut: str
+    position: int = None
+
+
+def _prendre_place(evenement_id):
+    """UPDATE conditionnel : retourne True si une place a été réservée."""
+    return bool(Evenement.objects.filter(
+        pk=evenement_id,
+        nb_inscrits__lt=F('places_max'),
+    ).update(nb_inscrits=F('nb_inscrits') + 1))
+
+
+def _liberer_place(evenement_id):
+    Evenement.objects.filter(pk=evenement_id, nb_inscrits__gt=0).update(nb_inscrits=F('nb_inscrits') - 1)
+
+
+def _creer_inscription(membre_id, evenement_id):
+    inscription = Inscription(membre_id=membre_id, evenement_id=evenement_id)
+    # La place est déjà comptée : le signal post_save ne doit pas l'incrémenter
+    inscription._place_reservee = True
+    inscription.save()
+    return inscription
+
+
+def _retirer_premiere_demande(evenement_id):
+    """Supprime et retourne la première demande en attente, ou None si la liste est vide.
+
+    Une demande n'est promue que par celui qui réussit à la supprimer : si
+    toutes celles lues ont été prises entre-temps, la liste est relue.
+    """
+    while True:
+        demandes = list(ListeAttente.objects.filter(evenement_id=evenement_id)[:10])
+        if not demandes:
+            return None
+        for demande in demandes:
+            if ListeAttente.objects.filter(pk=demande.pk).delete()[0]:
+                return demande
+
+
+def position_attente(membre, evenement):
+    """Rang (1 = prochain promu) du membre dans la liste d'attente, ou None."""
+    demande = ListeAttente.objects.filter(membre=membre, evenement=evenement).first()
+    if demande is None:
+        return None
+    return ListeAttente.objects.filter(
+        Q(date_demande__lt=demande.date_demande) | Q(date_demande=demande.date_demande, id__lte=demande.id),
+        evenement=evenement,
+    ).count()
+
+
+def inscrire(membre, evenement):
+    """Inscrit le membre s'il reste une place, sinon l'ajoute à la liste d'attente."""
+    if Inscription.objects.filter(membre=membre, evenement=evenement).exists():
+        return ResultatInscription(ResultatInscription.DEJA_INSCRIT)
+    try:
+        # L'écriture vient en premier : sous SQLite, la transaction prend ainsi
+        # le verrou d'écriture d'emblée au lieu de devoir le promouvoir.
+        with transaction.atomic():
+            if _prendre_place(evenement.pk):
+                _creer_inscription(membre.pk, evenement.pk)
+                ListeAttente.objects.filter(membre=membre, evenement=evenement).delete()
+                return ResultatInscription(ResultatInscription.INSCRIT)
+    except IntegrityError:
+        # Double soumission du même membre : la place prise est annulée avec la transaction
+        return ResultatInscription(ResultatInscription.DEJA_INSCRIT)
+
+    _, creee = ListeAttente.objects.get_or_create(membre=membre, evenement=evenement)
+    statut = ResultatInscription.EN_ATTENTE if creee else ResultatInscription.DEJA_EN_ATTENTE
+    return ResultatInscription(statut, position=position_attente(membre, evenement))
+
+
+def desinscrire(membre, evenement):
+    """Annule l'inscription (ou la demande en attente) ; retourne les membres promus."""
+    with transaction.atomic():
+        # Écriture neutre en tête de transaction : verrou d'écriture pris d'emblée sous SQLite
+        Evenement.objects.filter(pk=evenement.pk).update(nb_inscrits=F('nb_inscrits'))
+        supprimees, _ = Inscription.objects.filter(membre=membre, evenement=evenement).delete()
+        ListeAttente.objects.filter(membre=membre, evenement=evenement).delete()
+    if supprimees:
+        return promouvoir(evenement)
+    return []
+
+
+def promouvoir(evenement):
+    """Attribue les places libres aux premiers de la liste d'attente ; retourne les membres promus."""
+    promus = []
+    while True:
+        with transaction.atomic():
+            if not _prendre_place(evenement.pk):
+                break
+            demande = _retirer_premiere_demande(evenement.pk)
+            if demande is None:
+                _liberer_place(evenement.pk)
+                break
+            try:
+                with transaction.atomic():
+                    _creer_inscription(demande.membre_id, evenement.pk)
+            except IntegrityError:
+                # Déjà inscrit entre-temps : la place revient au suivant
+                _liberer_place(evenement.pk)
+                continue
+        promus.append(demande.membre_id)
+        Notification.objects.create(
+            destinataire_id=demande.membre_id,
+            titre=f'Inscription confirmée : {evenement.nom}',
+            message=f'Une place s\'est libérée : vous êtes maintenant inscrit à « {evenement.nom} ».',
+            type_notification='evenement',
+        )
+    return promus
@@ -0,0 +1,259 @@
+"""
+Exports en flux des réservations, factures et paiements.
+
+Les lignes sont lues avec values_list().iterator(chunk_size=...) et écrites au
+fil de l'eau : la mémoire reste constante quel que soit le volume. Deux
+formats :
+
+- CSV (séparateur « ; », lisible par un tableur français) ;
+- Parquet, colonnaire, pour l'analyse (nécessite pyarrow, optionnel) :
+  un groupe de lignes par lot.
+
+Les filtres reprennent ceux des listes de l'espace gestionnaire, plus une
+plage de dates (du / au) sur la date de référence de chaque jeu. La commande
+exporter découpe la plage en partitions (un fichier par jour ou par mois).
+"""
+import csv
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Facture, HistoriquePaiement, Reservation
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # dépendance optionnelle
+    pyarrow = None
+
+TAILLE_LOT = getattr(settings, 'EXPORTS_TAILLE_LOT', 5000)
+
+FORMATS = ('csv', 'parquet')
+
+
+class ExportIndisponible(Exception):
+    """Format demandé non disponible (dépendance absente)."""
+
+
+@dataclass(frozen=True)
+class JeuExport:
+    modele: type
+    # (en-tête, chemin ORM)
+    colonnes: tuple
+    champ_date: str
+    # Paramètre GET -> lookup ORM, comme dans les vues de liste
+    filtres: dict
+
+    @property
+    def entetes(self):
+        return [entete for entete, _ in self.colonnes]
+
+
+JEUX = {
+    'reservations': JeuExport(
+        modele=Reservation,
+        colonnes=(
+            ('id', 'id'),
+            ('membre', 'membre__username'),
+            ('espace', 'espace__nom'),
+            ('date_debut', 'date_debut'),
+            ('date_fin', 'date_fin'),
+            ('statut', 'statut'),
+            ('prix_total', 'prix_total'),
+            ('date_creation', 'date_creation'),
+        ),
+        champ_date='date_debut',
+        filtres={'statut': 'statut', 'espace': 'espace_id', 'date_debut': 'date_debut__date'},
+    ),
+    'factures': JeuExport(
+        modele=Facture,
+        colonnes=(
+            ('id', 'id'),
+            ('numero', 'numero'),
+            ('membre', 'membre__username'),
+            ('reservation', 'reservation_id'),
+            ('date_creation', 'date_creation'),
+            ('date_echeance', 'date_echeance'),
+            ('montant_total', 'montant_total'),
+            ('statut', 'statut'),
+        ),
+        champ_date='date_creation',
+        filtres={'statut': 'statut'},
+    ),
+    'paiements': JeuExport(
+        modele=HistoriquePaiement,
+        colonnes=(
+            ('id', 'id'),
+            ('facture', 'facture__numero'),
+            ('membre', 'facture__membre__username'),
+            ('date_paiement', 'date_paiement'),
+            ('montant', 'montant'),
+        ),
+        champ_date='date_paiement',
+        filtres={'facture': 'facture__numero'},
+    ),
+}
+
+
+def _debut_du_jour(jour):
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def queryset(nom, parametres=None, du=None, au=None):
+    """Lignes du jeu `nom` (tuples dans l'ordre des colonnes), filtrées.
+
+    `du` et `au` sont des dates incluses.
+    """
+    jeu = JEUX[nom]
+    lignes = jeu.modele.objects.all()
+    for parametre, lookup in jeu.filtres.items():
+        valeur = (parametres or {}).get(parametre)
+        if valeur:
+            lignes = lignes.filter(**{lookup: valeur})
+    if du:
+        lignes = lignes.filter(**{f'{jeu.champ_date}__gte': _debut_du_jour(du)})
+    if au:
+        lignes = lignes.filter(**{f'{jeu.champ_date}__lt': _debut_du_jour(au + timedelta(days=1))})
+    return lignes.order_by(jeu.champ_date, 'id').values_list(*(chemin for _, chemin in jeu.colonnes))
+
+
+def partitions(du, au, decoupage):
+    """Découpe [du, au] en (étiquette, début, fin) par 'jour' ou 'mois'."""
+    debut = du
+    while debut <= au:
+        if decoupage == 'jour':
+            fin, etiquette = debut, f'{debut:%Y-%m-%d}'
+        else:
+            mois_suivant = (debut.replace(day=1) + timedelta(days=32)).replace(day=1)
+            fin, etiquette = min(mois_suivant - timedelta(days=1), au), f'{debut:%Y-%m}'
+        yield etiquette, debut, fin
+        debut = fin + timedelta(days=1)
+
+
+class _Tampon:
+    """Pseudo-fichier : write() retourne ce qu'on lui donne (pour csv.writer)."""
+
+    def write(self, valeur):
+        return valeur
+
+
+def _champ(jeu, chemin):
+    """Champ de modèle désigné par un chemin ORM (« facture__membre__username »)."""
+    parties = chemin.split('__')
+    champ = jeu.modele._meta.get_field(parties[0])
+    for partie in parties[1:]:
+        champ = champ.related_model._meta.get_field(partie)
+    return champ
+
+
+def flux_csv(nom, lignes, taille_lot=TAILLE_LOT):
+    """Génère le CSV par lots de lignes (chaînes)."""
+    jeu = JEUX[nom]
+    fuseau = timezone.get_current_timezone()
+    # Indices des colonnes de dates, converties en heure locale
+    dates = [
+        indice for indice, (_, chemin) in enumerate(jeu.colonnes)
+        if _champ(jeu, chemin).get_internal_type() == 'DateTimeField'
+    ]
+    ecrivain = csv.writer(_Tampon(), delimiter=';')
+    # BOM : Excel reconnaît ainsi l'UTF-8
+    yield '\ufeff' + ecrivain.writerow(jeu.entetes)
+    morceaux = []
+    for ligne in lignes.iterator(chunk_size=taille_lot):
+        if dates:
+            ligne = list(ligne)
+            for indice in dates:
+                if ligne[indice] is not None:
+                    ligne[indice] = ligne[indice].astimezone(fuseau).isoformat(sep=' ', timespec='seconds')
+        morceaux.append(ecrivain.writerow(ligne))
+        if len(morceaux) >= taille_lot:
+            yield ''.join(morceaux)
+            morceaux = []
+    if morceaux:
+        yield ''.join(morceaux)
+
+
+class _Collecteur:
+    """Sortie binaire en mémoire vidée après chaque groupe de lignes Parquet."""
+
+    def __init__(self):
+        self.morceaux = []
+        self.closed = False
+
+    def write(self, donnees):
+        self.morceaux.append(bytes(donnees))
+        return len(donnees)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def vider(self):
+        donnees = b''.join(self.morceaux)
+        self.morceaux = []
+        return donnees
+
+
+def _schema_parquet(jeu):
+    types = []
+    for entete, chemin in jeu.colonnes:
+        champ = _champ(jeu, chemin)
+        interne = champ.get_internal_type()
+        if interne == 'DateTimeField':
+            type_arrow = pyarrow.timestamp('us', tz='UTC')
+        elif interne == 'DecimalField':
+            type_arrow = pyarrow.decimal128(champ.max_digits, champ.decimal_places)
+        elif interne in ('AutoField', 'BigAutoField', 'IntegerField', 'PositiveIntegerField', 'ForeignKey'):
+            type_arrow = pyarrow.int64()
+        else:
+            type_arrow = pyarrow.string()
+        types.append(pyarrow.field(entete, type_arrow))
+    return pyarrow.schema(types)
+
+
+def flux_parquet(nom, lignes, taille_lot=TAILLE_LOT):
+    """Génère le fichier Parquet par morceaux (octets), un groupe de lignes par lot."""
+    jeu = JEUX[nom]
+    schema = _schema_parquet(jeu)
+    sortie = _Collecteur()
+    ecrivain = pyarrow.parquet.ParquetWriter(sortie, schema, compression='zstd')
+    lot = []
+
+    def ecrire():
+        colonnes = list(zip(*lot))
+        ecrivain.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(colonne, type=champ.type) for colonne, champ in zip(colonnes, schema)],
+            schema=schema,
+        ))
+
+    for ligne in lignes.iterator(chunk_size=taille_lot):
+        lot.append(ligne)
+        if len(lot) >= taille_lot:
+            ecrire()
+            lot = []
+            yield sortie.vider()
+    if lot:
+        ecrire()
+    ecrivain.close()
+    yield sortie.vider()
+
+
+def flux(nom, format_export, lignes, taille_lot=TAILLE_LOT):
+    if format_export == 'parquet':
+        return flux_parquet(nom, lignes, taille_lot)
+    return flux_csv(nom, lignes, taille_lot)
+
+
+def verifier_format(format_export):
+    if format_export not in FORMATS:
+        raise ExportIndisponible(f"Format inconnu : {format_export} (formats : {', '.join(FORMATS)}).")
+    if format_export == 'parquet' and pyarrow is None:
+        raise ExportIndisponible("L'export Parquet nécessite pyarrow (pip install pyarrow).")
+
+
+def type_contenu(format_export):
+    return 'application/vnd.apache.parquet' if format_export == 'parquet' else 'text/csv; charset=utf-8'
@@ -0,0 +1,156 @@
+"""
+Numérotation des factures sans trou ni doublon.
+
+Les numéros FAC-AAAAMMJJ-NNNN viennent d'un compteur par jour
+(SequenceFacture) incrémenté par un UPDATE atomique dans la même transaction
+que l'insertion des factures : deux créations concurrentes obtiennent des
+numéros distincts, et une création annulée rend ses numéros. Un bloc de N
+numéros est réservé en un seul UPDATE pour la facturation en masse.
+
+Les factures échues passent en retard par un seul UPDATE ensembliste
+(marquer_factures_en_retard), lancé par le planificateur ou la commande
+marquer_factures_en_retard.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Facture, Notification, Reservation, SequenceFacture
+from .notifications import creer_par_lots
+from .revenus import ajouter_factures
+
+# Délai de paiement des factures générées automatiquement
+DELAI_ECHEANCE = timedelta(days=getattr(settings, 'FACTURES_DELAI_ECHEANCE_JOURS', 30))
+
+
+def prefixe(jour):
+    return f"FAC-{jour:%Y%m%d}-"
+
+
+def formater_numero(jour, rang):
+    return f"{prefixe(jour)}{rang:04d}"
+
+
+def _dernier_rang_existant(jour):
+    """Plus grand rang déjà utilisé ce jour-là (factures antérieures au compteur)."""
+    rangs = [
+        int(numero.rsplit('-', 1)[1])
+        for numero in Facture.objects.filter(numero__startswith=prefixe(jour)).values_list('numero', flat=True)
+        if numero.rsplit('-', 1)[1].isdigit()
+    ]
+    return max(rangs, default=0)
+
+
+def _verrouiller_sequence(jour):
+    """Verrouille le compteur du jour (créé au besoin) jusqu'à la fin de la transaction.
+
+    L'UPDATE vient en premier : il verrouille la ligne, ou la base sous SQLite
+    avant toute lecture.
+    """
+    if SequenceFacture.objects.filter(jour=jour).update(dernier=F('dernier')):
+        return
+    try:
+        with transaction.atomic():
+            SequenceFacture.objects.create(jour=jour, dernier=_dernier_rang_existant(jour))
+    except IntegrityError:
+        # Créé entre-temps par une transaction concurrente
+        SequenceFacture.objects.filter(jour=jour).update(dernier=F('dernier'))
+
+
+def allouer_numeros(nombre=1, jour=None):
+    """Réserve `nombre` numéros consécutifs pour le jour donné et les retourne.
+
+    À appeler dans la transaction qui insère les factures pour rester sans trou.
+    """
+    jour = jour or timezone.localdate()
+    with transaction.atomic():
+        _verrouiller_sequence(jour)
+        SequenceFacture.objects.filter(jour=jour).update(dernier=F('dernier') + nombre)
+        dernier = SequenceFacture.objects.filter(jour=jour).values_list('dernier', flat=True).get()
+    return [formater_numero(jour, rang) for rang in range(dernier - nombre + 1, dernier + 1)]
+
+
+def enregistrer_facture(facture):
+    """Attribue un numéro à la facture et l'enregistre, dans une seule transaction."""
+    with transaction.atomic():
+        facture.numero = allouer_numeros(1)[0]
+        facture.save()
+    return facture
+
+
+def facturer_reservations_en_attente(reservations=None):
+    """Crée en une transaction une facture par réservation en attente non encore facturée.
+
+    Retourne la liste des factures créées.
+    """
+    if reservations is None:
+        reservations = Reservation.objects.filter(statut='en_attente')
+    maintenant = timezone.now()
+    with transaction.atomic():
+        # Deux facturations en masse simultanées ne peuvent pas voir les mêmes réservations
+        _verrouiller_sequence(timezone.localdate(maintenant))
+        a_facturer = list(
+            reservations.filter(facture__isnull=True)
+            .select_for_update(of=('self',))
+            .values_list('id', 'membre_id', 'prix_total')
+        )
+        if not a_facturer:
+            return []
+        numeros = allouer_numeros(len(a_facturer), timezone.localdate(maintenant))
+        factures = [
+            Facture(
+                membre_id=membre_id,
+                reservation_id=reservation_id,
+                numero=numero,
+                date_creation=maintenant,
+                date_echeance=maintenant + DELAI_ECHEANCE,
+                montant_total=prix_total,
+            )
+            for (reservation_id, membre_id, prix_total), numero in zip(a_facturer, numeros)
+        ]
+        factures = Facture.objects.bulk_create(factures, batch_size=1000)
+        # bulk_create ne passe pas par les signaux qui tiennent les cumuls de revenus
+        ajouter_factures([facture.pk for facture in factures])
+        return factures
+
+
+def factures_echues(maintenant=None):
+    """Factures en attente dont l'échéance est passée."""
+    return Facture.objects.filter(statut='en_attente', date_echeance__lt=maintenant or timezone.now())
+
+
+def marquer_factures_en_retard(maintenant=None, notifier=True):
+    """Passe en retard toutes les factures échues en un UPDATE ; retourne le nombre de factures.
+
+    Chaque membre concerné reçoit une seule notification récapitulative.
+    """
+    maintenant = maintenant or timezone.now()
+    echues = factures_echues(maintenant)
+    par_membre = {}
+    with transaction.atomic():
+        if notifier:
+            # Les factures échues restent verrouillées jusqu'à l'UPDATE : un paiement
+            # concurrent attend, et le récapitulatif compte exactement les factures
+            # modifiées. SELECT ... FOR UPDATE sous PostgreSQL ; sous SQLite, le
+            # profil de base (transaction_mode IMMEDIATE) prend le verrou d'écriture dès BEGIN.
+            lignes = echues.select_for_update().values_list('membre_id', 'montant_total')
+            for membre_id, montant in lignes.iterator():
+                compte, total = par_membre.get(membre_id, (0, 0))
+                par_membre[membre_id] = (compte + 1, total + montant)
+        nombre = echues.update(statut='en_retard')
+    if par_membre:
+        creer_par_lots(
+            Notification(
+                destinataire_id=membre_id,
+                titre='Facture en retard' if total_factures == 1 else f'{total_factures} factures en retard',
+                message=f'Vous avez {total_factures} facture(s) impayée(s) après échéance '
+                        f'pour un total de {montant} €. Merci de régulariser votre situation.',
+                type_notification='facture',
+                date_creation=maintenant,
+            )
+            for membre_id, (total_factures, montant) in par_membre.items()
+        )
+    return nombre
@@ -2,7 +2,11 @@ from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from .models import *
-from datetime import timedelta
+from .disponibilite import est_disponible
+from .reservations import creneaux_serie
+from .notifications import envoyer
+from . import tarifs
+from datetime import datetime, timedelta
 
 from django.core.exceptions import ValidationError
 
@@ -92,6 +96,9 @@ class ProfilMembreForm(forms.ModelForm):
         return profil
 
 
+# Au-delà, deux occurrences quotidiennes se chevaucheraient
+DUREE_MAX_OCCURRENCE = timedelta(hours=24)
+
 class ReservationForm(forms.ModelForm):
     
     date_debut = forms.DateTimeField(
@@ -104,6 +111,24 @@ class ReservationForm(forms.ModelForm):
         required=True,
         label="Date et heure de fin",
     )
+    # Récurrence (facultative) : sans fréquence, une seule réservation
+    frequence = forms.ChoiceField(
+        choices=[('', 'Pas de répétition')] + SerieReservation.FREQUENCES,
+        required=False,
+        label="Répéter",
+    )
+    intervalle = forms.IntegerField(min_value=1, max_value=12, initial=1, required=False, label="Toutes les (périodes)")
+    nombre_occurrences = forms.IntegerField(min_value=2, required=False, label="Nombre d'occurrences")
+    jusqu_au = forms.DateField(
+        widget=forms.DateInput(attrs={'type': 'date'}),
+        required=False,
+        label="Jusqu'au",
+    )
+    exceptions = forms.CharField(
+        required=False,
+        label="Dates exclues",
+        help_text="JJ/MM/AAAA, séparées par des virgules",
+    )
     class Meta:
         model = Reservation
         fields = ['espace', 'date_debut', 'date_fin']
@@ -112,6 +137,16 @@ class ReservationForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['espace'].queryset = EspaceTravail.objects.filter(disponible=True)
+
+    def clean_exceptions(self):
+        dates = []
+        for morceau in self.cleaned_data['exceptions'].split(','):
+            if morceau.strip():
+                try:
+                    dates.append(datetime.strptime(morceau.strip(), '%d/%m/%Y').date())
+                except ValueError:
+                    raise ValidationError(f"Date invalide : {morceau.strip()} (format JJ/MM/AAAA).")
+        return dates
        
 
     
@@ -120,6 +155,12 @@ class ReservationForm(forms.ModelForm):
         date_debut = cleaned_data.get('date_debut')
         date_fin = cleaned_data.get('date_fin')
         
+        if cleaned_data.get('frequence'):
+            if not cleaned_data.get('intervalle'):
+                cleaned_data['intervalle'] = 1
+            if not cleaned_data.get('nombre_occurrences') and not cleaned_data.get('jusqu_au'):
+                self.add_error('nombre_occurrences', "Indiquez un nombre d'occurrences ou une date de fin.")
+        
         if date_debut and date_fin:
             # 1) Si la date de fin est identique ou avant la date de début
             if date_fin <= date_debut:
@@ -136,20 +177,26 @@ class ReservationForm(forms.ModelForm):
                     f"La réservation doit durer au moins 1 heure (durée actuelle : {minutes_diff} minutes)."
                 )
 
+            # 3) Une occurrence de série ne doit pas chevaucher la suivante
+            elif cleaned_data.get('frequence') and date_fin - date_debut > DUREE_MAX_OCCURRENCE:
+                self.add_error('date_fin', "Une réservation répétée ne peut pas dépasser 24 heures.")
+            
+            elif cleaned_data.get('frequence') and not self.errors:
+                try:
+                    if not creneaux_serie(
+                        date_debut, date_fin, cleaned_data['frequence'], cleaned_data['intervalle'],
+                        cleaned_data.get('nombre_occurrences'), cleaned_data.get('jusqu_au'),
+                        cleaned_data.get('exceptions', []),
+                    ):
+                        self.add_error(None, "Toutes les occurrences de la série sont exclues.")
+                except ValueError as erreur:
+                    self.add_error(None, str(erreur))
             
-            # Vérifier les conflits de réservation
+            # Vérifier les conflits de réservation (une série les vérifie
+            # occurrence par occurrence, voir reserver_serie)
             espace = cleaned_data.get('espace')
-            if espace:
-                conflits = Reservation.objects.filter(
-                    espace=espace,
-                    statut='confirmee',
-                    date_debut__lt=date_fin,
-                    date_fin__gt=date_debut
-                )
-                if self.instance.pk:
-                    conflits = conflits.exclude(pk=self.instance.pk)
-                
-                if conflits.exists():
+            if espace and not cleaned_data.get('frequence'):
+                if not est_disponible(espace, date_debut, date_fin, exclure=self.instance.pk):
                     raise forms.ValidationError("Cet espace est déjà réservé pour cette période")
         
         return cleaned_data
@@ -214,14 +261,17 @@ class NotificationForm(forms.ModelForm):
         }
         
     def save(self, commit=True):
+        """Envoie la notification ; retourne (nombre de destinataires, envoi différé)"""
         destinataires = self.cleaned_data.get('destinataires_multiples')
-        for user in destinataires:
-            Notification.objects.create(
-                destinataire=user,
-                titre=self.cleaned_data['titre'],
-                message=self.cleaned_data['message'],
-                type_notification=self.cleaned_data['type_notification']
-            )
+        if not destinataires:
+            # Envoyer à tous les membres
+            destinataires = User.objects.filter(roleutilisateur__role='membre')
+        return envoyer(
+            destinataires,
+            self.cleaned_data['titre'],
+            self.cleaned_data['message'],
+            self.cleaned_data['type_notification'],
+        )
 
 
 class RechercheEspaceForm(forms.Form):
@@ -242,4 +292,16 @@ class RechercheEspaceForm(forms.Form):
         min_value=1,
         required=False,
         label="Capacité minimale"
-    )
\ No newline at end of file
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_debut = cleaned_data.get('date_debut')
+        date_fin = cleaned_data.get('date_fin')
+        if date_debut and date_fin:
+            # Période bornée (durée et éloignement) : la recherche et le chiffrage
+            # parcourent toute la période, jour par jour
+            erreur = tarifs.erreur_creneau(date_debut, date_fin)
+            if erreur:
+                self.add_error('date_fin', f'{erreur}.')
+        return cleaned_data
@@ -0,0 +1,88 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from coworking import cache_modeles
+from coworking.models import EspaceTravail, Evenement, Reservation, TypeEspace
+
+PREFIXE = 'bench_cache_'
+
+
+class Command(BaseCommand):
+    help = "Mesure les pages publiques (accueil, espaces, événements) avec et sans cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requetes', type=int, default=2000)
+        # Une réservation créée toutes les N requêtes (invalide le détail des espaces)
+        parser.add_argument('--ecriture-toutes-les', type=int, default=50)
+
+    def handle(self, *args, **options):
+        aleatoire = random.Random(42)
+        membre = User.objects.create(username=f'{PREFIXE}membre', password=make_password(None))
+        types = [TypeEspace.objects.create(nom=f'{PREFIXE}type{i}') for i in range(4)]
+        espaces = EspaceTravail.objects.bulk_create(
+            EspaceTravail(nom=f'{PREFIXE}espace{i}', type_espace=types[i % 4], capacite=2 + i % 10, prix_heure=10)
+            for i in range(60)
+        )
+        maintenant = timezone.now()
+        Evenement.objects.bulk_create(
+            Evenement(nom=f'{PREFIXE}evenement{i}', description='Atelier ' * 20, lieu='Salle',
+                      date_debut=maintenant + timedelta(days=i), date_fin=maintenant + timedelta(days=i, hours=2),
+                      places_max=20, organisateur=membre)
+            for i in range(40)
+        )
+        urls = [reverse('accueil'), reverse('liste_espaces'), reverse('liste_evenements')] + [
+            reverse('detail_espace', args=[espace.id]) for espace in espaces[:20]
+        ]
+        client = Client()
+        try:
+            self.stdout.write(f"Base : {connection.vendor}, cache : {settings.CACHES['default']['BACKEND']}")
+            for url in urls[:4]:
+                froid = self.mesurer(client, url, invalider=True)
+                chaud = self.mesurer(client, url)
+                self.stdout.write(f"{url:<28} sans cache {froid[0]:6.2f} ms / {froid[1]} requêtes, "
+                                  f"avec cache {chaud[0]:6.2f} ms / {chaud[1]} requêtes")
+
+            cache_modeles.compteurs.remettre_a_zero()
+            depart = time.perf_counter()
+            for rang in range(options['requetes']):
+                if rang % options['ecriture_toutes_les'] == 0:
+                    debut = maintenant + timedelta(days=rang)
+                    Reservation.objects.create(membre=membre, espace=aleatoire.choice(espaces), prix_total=10,
+                                               statut='confirmee', date_debut=debut,
+                                               date_fin=debut + timedelta(hours=1))
+                client.get(aleatoire.choice(urls))
+            duree = time.perf_counter() - depart
+            self.stdout.write(f"{options['requetes']} requêtes mêlées d'écritures : "
+                              f"{options['requetes'] / duree:,.0f} pages/s")
+            for nom, (succes, defauts, ratio) in cache_modeles.ratios().items():
+                self.stdout.write(f"  {nom:<20} {succes:>6} succès {defauts:>5} défauts  ratio {ratio:.1%}")
+        finally:
+            Reservation.objects.filter(membre=membre).delete()
+            Evenement.objects.filter(organisateur=membre).delete()
+            EspaceTravail.objects.filter(nom__startswith=PREFIXE).delete()
+            TypeEspace.objects.filter(nom__startswith=PREFIXE).delete()
+            membre.delete()
+
+    def mesurer(self, client, url, invalider=False, repetitions=20):
+        """(durée moyenne en ms, requêtes SQL du dernier passage)"""
+        total = 0
+        for _ in range(repetitions):
+            if invalider:
+                for modele in (EspaceTravail, TypeEspace, Evenement, Reservation):
+                    cache_modeles.invalider(modele)
+            with CaptureQueriesContext(connection) as requetes:
+                depart = time.perf_counter()
+                client.get(url)
+                total += time.perf_counter() - depart
+        return total / repetitions * 1000, len(requetes)
@@ -0,0 +1,73 @@
+import os
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from coworking import exports
+from coworking.models import EspaceTravail, Reservation, TypeEspace
+
+PREFIXE = 'bench_export_'
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit et la mémoire de l'export en flux des réservations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lignes', type=int, default=1_000_000)
+        parser.add_argument('--taille-lot', type=int, default=exports.TAILLE_LOT)
+
+    def handle(self, *args, **options):
+        membre = User.objects.create(username=f'{PREFIXE}membre', password=make_password(None))
+        type_espace = TypeEspace.objects.create(nom=f'{PREFIXE}type')
+        espace = EspaceTravail.objects.create(nom=f'{PREFIXE}espace', type_espace=type_espace,
+                                              capacite=4, prix_heure=10)
+        debut = timezone.now() - timedelta(days=365)
+        self.stdout.write(f"Création de {options['lignes']:,} réservations...")
+        Reservation.objects.bulk_create(
+            (
+                Reservation(
+                    membre=membre, espace=espace, prix_total=10, statut='confirmee',
+                    date_debut=debut + timedelta(minutes=i), date_fin=debut + timedelta(minutes=i + 30),
+                )
+                for i in range(options['lignes'])
+            ),
+            batch_size=5000,
+        )
+
+        try:
+            self.stdout.write(f"Base : {connection.vendor}, lots de {options['taille_lot']}")
+            formats = ['csv'] + (['parquet'] if exports.pyarrow is not None else [])
+            for format_export in formats:
+                depart = time.perf_counter()
+                taille = self.exporter(format_export, espace, options['taille_lot'])
+                duree = time.perf_counter() - depart
+                # Second passage instrumenté : tracemalloc ralentit trop pour chronométrer
+                tracemalloc.start()
+                self.exporter(format_export, espace, options['taille_lot'])
+                _, pic = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.stdout.write(f"{format_export:>8} : {options['lignes'] / duree:,.0f} lignes/s, "
+                                  f"{taille / 1e6:.1f} Mo, pic mémoire {pic / 1e6:.1f} Mo")
+        finally:
+            # Par lots : la suppression en cascade liste tous les ids dans une requête
+            reservations = Reservation.objects.filter(espace=espace)
+            while ids := list(reservations.values_list('id', flat=True)[:5000]):
+                Reservation.objects.filter(id__in=ids).delete()
+            espace.delete()
+            type_espace.delete()
+            membre.delete()
+
+    def exporter(self, format_export, espace, taille_lot):
+        lignes = exports.queryset('reservations', {'espace': espace.id})
+        taille = 0
+        with open(os.devnull, 'wb' if format_export == 'parquet' else 'w') as sortie:
+            for morceau in exports.flux('reservations', format_export, lignes, taille_lot):
+                taille += len(morceau)
+                sortie.write(morceau)
+        return taille
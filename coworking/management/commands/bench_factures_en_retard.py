@@ -0,0 +1,69 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from coworking.factures import marquer_factures_en_retard
+from coworking.models import Facture, Notification
+
+PREFIXE = 'bench_retard_'
+
+
+class Command(BaseCommand):
+    help = "Mesure le passage en retard de factures échues en masse"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factures', type=int, default=1_000_000)
+        parser.add_argument('--membres', type=int, default=10_000)
+        parser.add_argument('--part-echues', type=float, default=0.5,
+                            help='Proportion de factures dont l\'échéance est passée')
+
+    def handle(self, *args, **options):
+        mot_de_passe = make_password(None)
+        User.objects.bulk_create(
+            (User(username=f'{PREFIXE}{i}', password=mot_de_passe) for i in range(options['membres'])),
+            batch_size=5000,
+        )
+        membres = list(User.objects.filter(username__startswith=PREFIXE).values_list('id', flat=True))
+        maintenant = timezone.now()
+        echues = int(options['factures'] * options['part_echues'])
+
+        self.stdout.write(f"Création de {options['factures']:,} factures ({echues:,} échues)...")
+        Facture.objects.bulk_create(
+            (
+                Facture(
+                    membre_id=membres[i % len(membres)],
+                    numero=f'BENCH-{i}',
+                    date_creation=maintenant - timedelta(days=60),
+                    date_echeance=maintenant + (timedelta(days=-1) if i < echues else timedelta(days=30)),
+                    montant_total=100,
+                )
+                for i in range(options['factures'])
+            ),
+            batch_size=5000,
+        )
+
+        try:
+            self.stdout.write(f"Base : {connection.vendor}")
+            depart = time.perf_counter()
+            nombre = marquer_factures_en_retard(maintenant)
+            duree = time.perf_counter() - depart
+            notifications = Notification.objects.filter(destinataire_id__in=membres, type_notification='facture').count()
+            self.stdout.write(f"{nombre:,} factures passées en retard et {notifications:,} notifications "
+                              f"en {duree:.2f} s")
+            if nombre != echues:
+                self.stderr.write(self.style.ERROR(f"Attendu : {echues:,}"))
+
+            depart = time.perf_counter()
+            nombre = marquer_factures_en_retard(maintenant)
+            self.stdout.write(f"Deuxième passage : {nombre} facture(s) en {time.perf_counter() - depart:.2f} s")
+        finally:
+            # Factures créées par bulk_create, jamais comptées dans les cumuls de revenus :
+            # un DELETE direct évite un signal (et une lecture) par facture
+            with connection.cursor() as curseur:
+                curseur.execute(f"DELETE FROM {Facture._meta.db_table} WHERE numero LIKE %s", ['BENCH-%'])
+            User.objects.filter(username__startswith=PREFIXE).delete()
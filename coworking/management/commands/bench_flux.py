@@ -0,0 +1,78 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = ("Test de charge du flux SSE : ouvre des milliers de connexions inactives sur un "
+            "serveur ASGI en cours d'exécution (ex. uvicorn Coworkong_system.asgi:application) "
+            "et vérifie qu'elles restent ouvertes")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Adresse du serveur ASGI')
+        parser.add_argument('--connexions', type=int, default=2000)
+        parser.add_argument('--duree', type=int, default=30, help='Durée de maintien (secondes)')
+        parser.add_argument('--parallele', type=int, default=200, help="Ouvertures simultanées")
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username='bench_flux')
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        try:
+            asyncio.run(self.charger(options, session.session_key))
+        finally:
+            session.delete()
+
+    async def charger(self, options, cle_session):
+        adresse = urlsplit(options['url'])
+        chemin = reverse('flux_notifications')
+        requete = (
+            f"GET {chemin} HTTP/1.1\r\n"
+            f"Host: {adresse.netloc}\r\n"
+            f"Cookie: {settings.SESSION_COOKIE_NAME}={cle_session}\r\n"
+            "Accept: text/event-stream\r\n\r\n"
+        ).encode()
+        semaphore = asyncio.Semaphore(options['parallele'])
+        connexions = []
+        echecs = 0
+
+        async def ouvrir():
+            nonlocal echecs
+            async with semaphore:
+                try:
+                    lecteur, ecrivain = await asyncio.open_connection(adresse.hostname, adresse.port or 80)
+                    ecrivain.write(requete)
+                    await ecrivain.drain()
+                    statut = await asyncio.wait_for(lecteur.readline(), 30)
+                    if b' 200 ' not in statut:
+                        raise ConnectionError(statut)
+                    connexions.append((lecteur, ecrivain))
+                except (OSError, asyncio.TimeoutError, ConnectionError):
+                    echecs += 1
+
+        depart = time.perf_counter()
+        await asyncio.gather(*(ouvrir() for _ in range(options['connexions'])))
+        ouverture = time.perf_counter() - depart
+        self.stdout.write(f"{len(connexions)} connexions ouvertes en {ouverture:.2f} s ({echecs} échec(s))")
+
+        # Les connexions restent inactives ; on vérifie qu'aucune n'est fermée par le serveur
+        await asyncio.sleep(options['duree'])
+        fermees = sum(1 for lecteur, _ in connexions if lecteur.at_eof())
+        self.stdout.write(f"Après {options['duree']} s : {len(connexions) - fermees} toujours ouvertes, {fermees} fermée(s)")
+
+        for _, ecrivain in connexions:
+            ecrivain.close()
+        if fermees or echecs:
+            self.stderr.write(self.style.WARNING('Des connexions ont été perdues'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Toutes les connexions ont été maintenues'))
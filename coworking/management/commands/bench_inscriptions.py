@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.utils import timezone
+
+from coworking.evenements import ResultatInscription, desinscrire, inscrire
+from coworking.models import Evenement, Inscription, ListeAttente
+
+PREFIXE = 'bench_insc_'
+
+
+class Command(BaseCommand):
+    help = "Test de charge : inscriptions concurrentes à un événement, vérifie qu'il n'y a jamais de survente"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--membres', type=int, default=500, help='Nombre de membres qui tentent de s\'inscrire')
+        parser.add_argument('--places', type=int, default=50)
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--annulations', type=int, default=10,
+                            help='Désinscriptions concurrentes après la ruée (promotion de la liste d\'attente)')
+
+    def handle(self, *args, **options):
+        mot_de_passe = make_password(None)
+        User.objects.bulk_create(
+            [User(username=f'{PREFIXE}{i}', password=mot_de_passe) for i in range(options['membres'])],
+            ignore_conflicts=True,
+        )
+        membres = list(User.objects.filter(username__startswith=PREFIXE)[:options['membres']])
+        organisateur = membres[0]
+        evenement = Evenement.objects.create(
+            nom='Benchmark inscriptions', description='Test de charge', lieu='Salle',
+            date_debut=timezone.now() + timedelta(days=30), date_fin=timezone.now() + timedelta(days=30, hours=2),
+            places_max=options['places'], organisateur=organisateur,
+        )
+
+        def executer(fonction):
+            def appel(membre):
+                try:
+                    return fonction(membre, evenement)
+                except OperationalError:
+                    return None
+                finally:
+                    connections.close_all()
+            return appel
+
+        try:
+            depart = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                resultats = list(pool.map(executer(inscrire), membres))
+            duree = time.perf_counter() - depart
+            statuts = [r.statut if r else 'erreur' for r in resultats]
+
+            self.stdout.write(f"Base : {connection.vendor}")
+            self.stdout.write(f"{len(membres)} demandes ({options['threads']} en parallèle) en {duree:.2f} s "
+                              f"({len(membres) / duree:.1f} demandes/s)")
+            self.stdout.write(f"Inscrits : {statuts.count(ResultatInscription.INSCRIT)}, "
+                              f"en attente : {statuts.count(ResultatInscription.EN_ATTENTE)}, "
+                              f"erreurs : {statuts.count('erreur')}")
+            self.verifier(evenement)
+
+            inscrits = [i.membre for i in Inscription.objects.filter(evenement=evenement).select_related('membre')]
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                promotions = list(pool.map(executer(desinscrire), inscrits[:options['annulations']]))
+            self.stdout.write(f"Après {options['annulations']} annulations : "
+                              f"{sum(len(p) for p in promotions if p is not None)} promotion(s), "
+                              f"{promotions.count(None)} erreur(s)")
+            self.verifier(evenement)
+        finally:
+            evenement.delete()
+            User.objects.filter(username__startswith=PREFIXE).delete()
+
+    def verifier(self, evenement):
+        evenement.refresh_from_db()
+        inscriptions = Inscription.objects.filter(evenement=evenement).count()
+        attente = ListeAttente.objects.filter(evenement=evenement).count()
+        self.stdout.write(f"  inscriptions : {inscriptions}/{evenement.places_max}, "
+                          f"nb_inscrits : {evenement.nb_inscrits}, liste d'attente : {attente}")
+        if inscriptions > evenement.places_max:
+            self.stderr.write(self.style.ERROR("  Survente détectée"))
+        elif inscriptions != evenement.nb_inscrits:
+            self.stderr.write(self.style.ERROR("  Compteur désynchronisé"))
+        else:
+            self.stdout.write(self.style.SUCCESS("  Aucune survente"))
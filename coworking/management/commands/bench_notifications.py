@@ -0,0 +1,57 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from coworking.models import Notification
+from coworking.notifications import TAILLE_LOT, diffuser
+
+PREFIXE = 'bench_notif_'
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit (lignes/s) de la diffusion de notifications en masse"
+
+    def add_arguments(self, parser):
+        parser.add_argument('volumes', nargs='*', type=int, default=[10_000, 100_000],
+                            help='Nombres de destinataires à tester')
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT)
+        parser.add_argument('--comparer', type=int, default=1000,
+                            help='Nombre de créations unitaires mesurées pour comparaison (0 pour ignorer)')
+
+    def handle(self, *args, **options):
+        volumes = options['volumes']
+        mot_de_passe = make_password(None)
+        existants = User.objects.filter(username__startswith=PREFIXE).count()
+        manquants = max(volumes) - existants
+        if manquants > 0:
+            self.stdout.write(f"Création de {manquants} utilisateurs de test...")
+            User.objects.bulk_create(
+                (User(username=f'{PREFIXE}{existants + i}', password=mot_de_passe) for i in range(manquants)),
+                batch_size=5000,
+            )
+        self.stdout.write(f"Base : {connection.vendor}, lots de {options['taille_lot']}")
+
+        try:
+            if options['comparer']:
+                destinataires = User.objects.filter(username__startswith=PREFIXE).values_list('id', flat=True)[:options['comparer']]
+                depart = time.perf_counter()
+                for destinataire_id in destinataires:
+                    Notification.objects.create(destinataire_id=destinataire_id, titre='Benchmark', message='Unitaire')
+                duree = time.perf_counter() - depart
+                self.stdout.write(f"create() unitaire : {options['comparer'] / duree:,.0f} lignes/s")
+
+            for volume in volumes:
+                utilisateurs = User.objects.filter(username__startswith=PREFIXE)
+                dernier_id = utilisateurs.order_by('id').values_list('id', flat=True)[volume - 1]
+                depart = time.perf_counter()
+                total = diffuser(utilisateurs.filter(id__lte=dernier_id), 'Benchmark', 'Diffusion en masse',
+                                 taille_lot=options['taille_lot'])
+                duree = time.perf_counter() - depart
+                self.stdout.write(f"{volume:>9,} destinataires : {total:,} lignes en {duree:.2f} s "
+                                  f"({total / duree:,.0f} lignes/s)")
+        finally:
+            Notification.objects.filter(titre='Benchmark', destinataire__username__startswith=PREFIXE).delete()
+            User.objects.filter(username__startswith=PREFIXE).delete()
@@ -0,0 +1,94 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+
+from coworking.models import ProfilMembre, RoleUtilisateur
+from coworking.recherche import index_membres
+from coworking.views import api_recherche_membres
+
+PREFIXE = 'bench_rech_'
+PRENOMS = ['Jean', 'Marie', 'Hélène', 'Luc', 'Sophie', 'Nicolas', 'Camille', 'Julien', 'Émilie', 'Thomas',
+           'Léa', 'Hugo', 'Chloé', 'Louis', 'Manon', 'Arthur', 'Inès', 'Paul', 'Zoé', 'Gabriel']
+NOMS = ['Martin', 'Bernard', 'Dubois', 'Durand', 'Lefèvre', 'Moreau', 'Laurent', 'Simon', 'Michel', 'Garcia',
+        'Roux', 'Fournier', 'Girard', 'Bonnet', 'Dupont', 'Lambert', 'Fontaine', 'Rousseau', 'Vincent', 'Muller']
+ENTREPRISES = ['Atelier Nord', 'Boulangerie Sud', 'Studio Graphique', 'Conseil & Co', 'Data Lab', 'Freelance']
+
+
+def faute(mot, aleatoire):
+    """Inverse deux lettres voisines (faute de frappe)."""
+    if len(mot) < 4:
+        return mot
+    i = aleatoire.randrange(1, len(mot) - 2)
+    return mot[:i] + mot[i + 1] + mot[i] + mot[i + 2:]
+
+
+class Command(BaseCommand):
+    help = "Mesure la latence (p50/p99) de l'autocomplétion des membres"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--membres', type=int, default=100_000)
+        parser.add_argument('--requetes', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        aleatoire = random.Random(42)
+        mot_de_passe = make_password(None)
+        nombre = options['membres']
+        self.stdout.write(f"Création de {nombre:,} membres...")
+        noms = [(aleatoire.choice(PRENOMS), f'{aleatoire.choice(NOMS)}{i % 997}') for i in range(nombre)]
+        User.objects.bulk_create(
+            (User(username=f'{PREFIXE}{i}', first_name=prenom, last_name=nom, email=f'{PREFIXE}{i}@exemple.fr',
+                  password=mot_de_passe) for i, (prenom, nom) in enumerate(noms)),
+            batch_size=5000,
+        )
+        ids = list(User.objects.filter(username__startswith=PREFIXE).order_by('id').values_list('id', flat=True))
+        RoleUtilisateur.objects.bulk_create((RoleUtilisateur(user_id=i, role='membre') for i in ids), batch_size=5000)
+        ProfilMembre.objects.bulk_create(
+            (ProfilMembre(user_id=i, entreprise=aleatoire.choice(ENTREPRISES), telephone=f'06{i:08d}')
+             for i in ids),
+            batch_size=5000,
+        )
+        gestionnaire = User.objects.create(username=f'{PREFIXE}gestionnaire', password=mot_de_passe)
+        RoleUtilisateur.objects.create(user=gestionnaire, role='gestionnaire')
+
+        try:
+            depart = time.perf_counter()
+            index = index_membres()
+            index.reconstruire()
+            self.stdout.write(f"Base : {connection.vendor}, index reconstruit en {time.perf_counter() - depart:.1f} s")
+
+            requetes = []
+            for _ in range(options['requetes']):
+                prenom, nom = aleatoire.choice(noms)
+                requetes.append(aleatoire.choice([
+                    nom[:aleatoire.randint(2, 5)],          # préfixe en cours de frappe
+                    f'{prenom} {nom[:4]}',                  # plusieurs mots
+                    faute(nom.rstrip('0123456789'), aleatoire),  # faute de frappe
+                    f'06{aleatoire.choice(ids):08d}'[:7],  # téléphone partiel
+                ]))
+
+            fabrique = RequestFactory()
+            durees, vides = [], 0
+            for requete in requetes:
+                demande = fabrique.get('/api/membres/recherche/', {'q': requete})
+                demande.user = gestionnaire
+                # Sans middleware : le rôle est donné directement
+                demande.role = 'gestionnaire'
+                depart = time.perf_counter()
+                reponse = api_recherche_membres(demande)
+                durees.append((time.perf_counter() - depart) * 1000)
+                vides += b'"membres": []' in reponse.content
+            durees.sort()
+            self.stdout.write(
+                f"{len(requetes)} requêtes : p50 {statistics.median(durees):.1f} ms, "
+                f"p99 {durees[int(len(durees) * 0.99) - 1]:.1f} ms, max {durees[-1]:.1f} ms, "
+                f"{vides} sans résultat"
+            )
+        finally:
+            User.objects.filter(username__startswith=PREFIXE).delete()
+            index_membres().reconstruire()
@@ -0,0 +1,107 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from coworking.models import EspaceTravail, Evenement, Notification, RoleUtilisateur, TypeEspace
+
+PREFIXE = 'bench_reponses_'
+MOT_DE_PASSE = 'bench-reponses'
+
+
+def octets(reponse):
+    """Octets transférés : ligne de statut, en-têtes et corps."""
+    entetes = sum(len(nom) + len(valeur) + 4 for nom, valeur in reponse.items())
+    corps = b''.join(reponse.streaming_content) if reponse.streaming else reponse.content
+    return len(f'HTTP/1.1 {reponse.status_code} {reponse.reason_phrase}\r\n') + entetes + 2 + len(corps)
+
+
+class Command(BaseCommand):
+    help = "Mesure octets transférés et temps de réponse : brut, gzip, revalidation (304)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repetitions', type=int, default=30)
+
+    def handle(self, *args, **options):
+        membre = User.objects.create_user(f'{PREFIXE}membre', password=MOT_DE_PASSE)
+        gestionnaire = User.objects.create_user(f'{PREFIXE}gestionnaire', password=MOT_DE_PASSE)
+        RoleUtilisateur.objects.create(user=gestionnaire, role='gestionnaire')
+        types = [TypeEspace.objects.create(nom=f'{PREFIXE}type{i}') for i in range(4)]
+        espaces = [
+            EspaceTravail.objects.create(nom=f'{PREFIXE}espace{i}', type_espace=types[i % 4],
+                                         capacite=2 + i % 10, prix_heure=10)
+            for i in range(30)
+        ]
+        maintenant = timezone.now()
+        evenements = [
+            Evenement.objects.create(nom=f'{PREFIXE}evenement{i}', description='Atelier ' * 40, lieu='Salle',
+                                     date_debut=maintenant + timedelta(days=i + 1),
+                                     date_fin=maintenant + timedelta(days=i + 1, hours=2),
+                                     places_max=20, organisateur=membre)
+            for i in range(20)
+        ]
+        for rang in range(30):
+            Notification.objects.create(destinataire=membre, titre=f'Rappel {rang}',
+                                        message='Votre réservation commence bientôt. ' * 3)
+
+        anonyme = Client()
+        connecte = Client()
+        connecte.login(username=membre.username, password=MOT_DE_PASSE)
+        admin = Client()
+        admin.login(username=gestionnaire.username, password=MOT_DE_PASSE)
+        pages = [
+            ('anonyme', anonyme, reverse('accueil')),
+            ('anonyme', anonyme, reverse('liste_espaces')),
+            ('anonyme', anonyme, reverse('liste_evenements')),
+            ('anonyme', anonyme, reverse('detail_espace', args=[espaces[0].id])),
+            ('anonyme', anonyme, reverse('detail_evenement', args=[evenements[0].id])),
+            ('membre', connecte, reverse('detail_evenement', args=[evenements[0].id])),
+            ('membre', connecte, reverse('dashboard')),
+            ('membre', connecte, reverse('api_notifications')),
+            ('gestionnaire', admin, reverse('liste_membres_admin')),
+        ]
+        try:
+            self.stdout.write(f"{'page':<40} {'brut':>14} {'gzip':>14} {'304':>14}")
+            totaux = [0, 0, 0]
+            for role, client, url in pages:
+                # Premier passage : caches, compteurs et cookie CSRF en place
+                client.get(url)
+                client.get(url)
+                colonnes = []
+                for rang, entetes in enumerate(self.modes(client, url)):
+                    taille, duree = self.mesurer(client, url, entetes, options['repetitions'])
+                    totaux[rang] += taille
+                    colonnes.append(f'{taille:>6,}o {duree:5.2f}ms')
+                self.stdout.write(f"{role + ' ' + url:<40} " + ' '.join(f'{c:>14}' for c in colonnes))
+            self.stdout.write(f"{'total (octets)':<40} {totaux[0]:>14,} {totaux[1]:>14,} {totaux[2]:>14,}")
+        finally:
+            Notification.objects.filter(destinataire=membre).delete()
+            Evenement.objects.filter(organisateur=membre).delete()
+            EspaceTravail.objects.filter(nom__startswith=PREFIXE).delete()
+            TypeEspace.objects.filter(nom__startswith=PREFIXE).delete()
+            User.objects.filter(username__startswith=PREFIXE).delete()
+
+    def modes(self, client, url):
+        """En-têtes de requête : sans compression, gzip, puis revalidation par ETag."""
+        yield {}
+        yield {'HTTP_ACCEPT_ENCODING': 'gzip, deflate, br'}
+        etag = client.get(url, HTTP_ACCEPT_ENCODING='gzip').get('ETag')
+        revalidation = {'HTTP_ACCEPT_ENCODING': 'gzip, deflate, br'}
+        if etag:
+            revalidation['HTTP_IF_NONE_MATCH'] = etag
+        yield revalidation
+
+    def mesurer(self, client, url, entetes, repetitions):
+        """(octets de la dernière réponse, médiane en ms du temps jusqu'à la réponse complète)"""
+        durees = []
+        for _ in range(repetitions):
+            depart = time.perf_counter()
+            reponse = client.get(url, **entetes)
+            taille = octets(reponse)
+            durees.append(time.perf_counter() - depart)
+        return taille, statistics.median(durees) * 1000
@@ -0,0 +1,102 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection
+from django.utils import timezone
+
+from coworking.models import EspaceTravail, Reservation, TypeEspace
+from coworking.reservations import ResultatReservation, reserver
+
+
+class Command(BaseCommand):
+    help = ("Test de charge : réservations concurrentes, vérifie l'absence de double réservation. "
+            "Lancer une fois par profil de base (COWORKING_BASE, voir settings) pour comparer les débits")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requetes', type=int, default=300, help='Nombre de réservations tentées')
+        parser.add_argument('--threads', type=int, default=32, help='Nombre de réservations en parallèle')
+        parser.add_argument('--creneaux', type=int, default=50, help="Nombre de créneaux d'une heure disputés")
+        parser.add_argument('--espaces', type=int, default=1,
+                            help="Espaces disputés (1 : tout sur le même verrou ; plus : rush sur plusieurs salles)")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--garder', action='store_true', help='Conserver les données créées')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        type_espace, _ = TypeEspace.objects.get_or_create(nom='Benchmark')
+        espaces = [
+            EspaceTravail.objects.create(
+                nom=f'Bench {timezone.now():%H%M%S} {rang}', type_espace=type_espace,
+                capacite=1, prix_heure=10,
+            )
+            for rang in range(options['espaces'])
+        ]
+        membre, _ = User.objects.get_or_create(username='bench_reservations')
+        origine = (timezone.now() + timedelta(days=365)).replace(minute=0, second=0, microsecond=0)
+
+        # Créneaux de 1 à 3 heures qui se chevauchent volontairement
+        demandes = []
+        for _ in range(options['requetes']):
+            debut = origine + timedelta(hours=rng.randrange(options['creneaux']))
+            demandes.append((rng.choice(espaces), debut, debut + timedelta(hours=rng.randint(1, 3))))
+
+        def tenter(demande):
+            try:
+                return reserver(membre, *demande, statut='confirmee').statut
+            except OperationalError:
+                # SQLite : verrou d'écriture non obtenu dans le délai imparti
+                return 'erreur'
+            finally:
+                # Fin de « requête » : connexion fermée ou gardée selon CONN_MAX_AGE / pool
+                close_old_connections()
+
+        depart = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            statuts = list(pool.map(tenter, demandes))
+        duree = time.perf_counter() - depart
+
+        chevauchements = 0
+        confirmees = list(
+            Reservation.objects.filter(espace__in=espaces, statut='confirmee')
+            .order_by('espace', 'date_debut').values_list('espace', 'date_debut', 'date_fin')
+        )
+        for precedente, suivante in zip(confirmees, confirmees[1:]):
+            if suivante[0] == precedente[0] and suivante[1] < precedente[2]:
+                chevauchements += 1
+
+        self.stdout.write(f"Base : {connection.vendor} ({self.profil()})")
+        self.stdout.write(f"Demandes : {len(demandes)} ({options['threads']} en parallèle) en {duree:.2f} s")
+        self.stdout.write(f"Débit : {len(demandes) / duree:.1f} demandes/s")
+        self.stdout.write(
+            f"Acceptées : {statuts.count(ResultatReservation.OK)}, "
+            f"conflits : {statuts.count(ResultatReservation.CONFLIT)}, "
+            f"erreurs : {statuts.count('erreur')}"
+        )
+        if chevauchements:
+            self.stderr.write(self.style.ERROR(f"{chevauchements} double(s) réservation(s) détectée(s)"))
+        else:
+            self.stdout.write(self.style.SUCCESS('Aucune double réservation'))
+
+        if not options['garder']:
+            for espace in espaces:
+                espace.delete()
+
+    def profil(self):
+        """Réglages de connexion actifs (voir COWORKING_BASE dans settings)."""
+        reglages = connection.settings_dict
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as curseur:
+                pragmas = []
+                for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size'):
+                    curseur.execute(f'PRAGMA {pragma}')
+                    pragmas.append(f'{pragma}={curseur.fetchone()[0]}')
+            mode = reglages['OPTIONS'].get('transaction_mode') or 'DEFERRED'
+            return f"transactions {mode}, {', '.join(pragmas)}"
+        pool = reglages['OPTIONS'].get('pool')
+        if pool:
+            return f"pool {pool.get('min_size', 4)}-{pool.get('max_size', 4)} connexions"
+        return f"CONN_MAX_AGE={reglages['CONN_MAX_AGE']}, CONN_HEALTH_CHECKS={reglages['CONN_HEALTH_CHECKS']}"
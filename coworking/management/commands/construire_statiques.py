@@ -0,0 +1,37 @@
+import os
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from coworking import statiques
+
+
+class Command(BaseCommand):
+    help = "Collecte les fichiers statiques (noms empreintés) et écrit leurs variantes gzip / brotli"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sans-collecte', action='store_true',
+                            help="Compresse seulement le contenu actuel de STATIC_ROOT")
+
+    def handle(self, *args, **options):
+        if not options['sans_collecte']:
+            call_command('collectstatic', interactive=False, verbosity=0)
+        racine = str(settings.STATIC_ROOT)
+        resultats = statiques.compresser(racine)
+        if statiques.brotli is None:
+            self.stdout.write("brotli non installé : variantes .gz seulement (pip install brotli)")
+
+        # Rapport : fichiers empreintés de l'application seulement (pas les copies d'origine)
+        empreintes = set(statiques.StockageStatiques().hashed_files.values())
+        totaux = [0, 0, 0]
+        self.stdout.write(f"{'fichier':<52} {'brut':>8} {'gzip':>7} {'brotli':>7}")
+        for chemin, taille, gz, br in resultats:
+            if chemin.replace(os.sep, '/') not in empreintes or chemin.startswith('admin'):
+                continue
+            totaux[0] += taille
+            totaux[1] += gz
+            totaux[2] += br or 0
+            self.stdout.write(f"{chemin:<52} {taille:>8,} {gz:>7,} {f'{br:,}' if br is not None else '-':>7}")
+        self.stdout.write(f"{'total':<52} {totaux[0]:>8,} {totaux[1]:>7,} {f'{totaux[2]:,}' if totaux[2] else '-':>7}")
+        self.stdout.write(self.style.SUCCESS(f"{len(resultats)} fichier(s) compressé(s) dans {racine}"))
@@ -0,0 +1,81 @@
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from coworking import exports
+
+
+def date_argument(valeur):
+    jour = parse_date(valeur)
+    if jour is None:
+        raise ValueError(valeur)
+    return jour
+
+
+class Command(BaseCommand):
+    help = "Exporte en flux les réservations, factures ou paiements (CSV ou Parquet), éventuellement par partition"
+
+    def add_arguments(self, parser):
+        parser.add_argument('jeu', choices=sorted(exports.JEUX))
+        parser.add_argument('--format', default='csv', choices=exports.FORMATS)
+        parser.add_argument('--du', type=date_argument, help='Date de début incluse (AAAA-MM-JJ)')
+        parser.add_argument('--au', type=date_argument, help='Date de fin incluse (AAAA-MM-JJ)')
+        parser.add_argument('--partition', choices=('jour', 'mois'),
+                            help='Un fichier par jour ou par mois (nécessite --sortie)')
+        parser.add_argument('--sortie', help='Fichier, ou dossier avec --partition (défaut : sortie standard)')
+        parser.add_argument('--statut')
+        parser.add_argument('--espace')
+        parser.add_argument('--taille-lot', type=int, default=exports.TAILLE_LOT)
+
+    def handle(self, *args, **options):
+        try:
+            exports.verifier_format(options['format'])
+        except exports.ExportIndisponible as erreur:
+            raise CommandError(str(erreur))
+        if options['partition'] and not options['sortie']:
+            raise CommandError("--partition écrit un fichier par partition : indiquez un dossier avec --sortie")
+        filtres = {'statut': options['statut'], 'espace': options['espace']}
+        jeu, format_export = options['jeu'], options['format']
+
+        if not options['partition']:
+            lignes = exports.queryset(jeu, filtres, du=options['du'], au=options['au'])
+            if options['sortie']:
+                self.ecrire(Path(options['sortie']), jeu, format_export, lignes, options['taille_lot'])
+            else:
+                sortie = sys.stdout.buffer if format_export == 'parquet' else sys.stdout
+                for morceau in exports.flux(jeu, format_export, lignes, options['taille_lot']):
+                    sortie.write(morceau)
+            return
+
+        du, au = options['du'], options['au']
+        if du is None or au is None:
+            champ_date = exports.JEUX[jeu].champ_date
+            bornes = exports.queryset(jeu, filtres).order_by().aggregate(
+                premier=Min(champ_date), dernier=Max(champ_date),
+            )
+            if bornes['premier'] is None:
+                self.stdout.write("Rien à exporter")
+                return
+            du = du or timezone.localdate(bornes['premier'])
+            au = au or timezone.localdate(bornes['dernier'])
+
+        dossier = Path(options['sortie'])
+        dossier.mkdir(parents=True, exist_ok=True)
+        for etiquette, debut, fin in exports.partitions(du, au, options['partition']):
+            lignes = exports.queryset(jeu, filtres, du=debut, au=fin)
+            self.ecrire(dossier / f'{jeu}_{etiquette}.{format_export}', jeu, format_export, lignes,
+                        options['taille_lot'])
+
+    def ecrire(self, chemin, jeu, format_export, lignes, taille_lot):
+        depart = time.perf_counter()
+        mode = 'wb' if format_export == 'parquet' else 'w'
+        with open(chemin, mode, **({} if mode == 'wb' else {'encoding': 'utf-8', 'newline': ''})) as fichier:
+            for morceau in exports.flux(jeu, format_export, lignes, taille_lot):
+                fichier.write(morceau)
+        duree = time.perf_counter() - depart
+        self.stderr.write(f"{chemin} : {chemin.stat().st_size / 1e6:.1f} Mo en {duree:.2f} s")
@@ -0,0 +1,385 @@
+import bisect
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from coworking import revenus, statistiques, tarifs
+from coworking.factures import DELAI_ECHEANCE, formater_numero
+from coworking.models import (
+    EspaceTravail, Evenement, Facture, HistoriquePaiement, Inscription, Notification, ProfilMembre,
+    Reservation, RoleUtilisateur, SequenceFacture, TypeEspace,
+)
+
+PRENOMS = (
+    'Camille', 'Léa', 'Manon', 'Chloé', 'Inès', 'Sarah', 'Julie', 'Emma', 'Alice', 'Claire',
+    'Lucas', 'Hugo', 'Louis', 'Nathan', 'Thomas', 'Karim', 'Yanis', 'Paul', 'Antoine', 'Mehdi',
+)
+NOMS = (
+    'Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit', 'Durand', 'Leroy', 'Moreau',
+    'Simon', 'Laurent', 'Lefebvre', 'Michel', 'Garcia', 'David', 'Bertrand', 'Roux', 'Vincent', 'Fournier',
+)
+ENTREPRISES = ('', '', 'Indépendant', 'Atelier Nord', 'Studio Delta', 'Conseil & Co', 'Agence Lumen', 'DataSud')
+
+# Type d'espace : (nom, capacités possibles, prix horaire min et max, durée des réservations en minutes, poids)
+TYPES = (
+    ('Bureau privé', (1, 2, 4), (12, 25), (120, 540), 3),
+    ('Open space', (10, 20, 30), (4, 8), (120, 540), 4),
+    ('Salle de réunion', (6, 8, 12), (20, 45), (60, 240), 3),
+    ('Cabine téléphonique', (1,), (3, 6), (30, 90), 2),
+    ('Salle de conférence', (40, 80), (60, 120), (120, 480), 1),
+)
+ABONNEMENTS = (('jour', 40), ('semaine', 25), ('mois', 25), ('annuel', 10))
+FORMATS_EVENEMENT = ('Atelier', 'Meetup', 'Conférence', 'Petit-déjeuner', 'Formation', 'Afterwork')
+THEMES = ('Python', 'design produit', 'financement', 'freelance', 'IA', 'marketing', 'comptabilité', 'réseau')
+NOTIFICATIONS = (
+    ('reservation', 'Réservation confirmée', 'Votre réservation est confirmée.', 5),
+    ('reservation', 'Rappel de réservation', 'Votre réservation commence bientôt.', 4),
+    ('facture', 'Nouvelle facture', 'Une nouvelle facture est disponible dans votre espace.', 3),
+    ('evenement', 'Nouvel événement', 'Un nouvel événement vient d\'être publié.', 2),
+    ('general', 'Information', 'Le coworking sera fermé le jour férié.', 1),
+)
+# Heures d'ouverture : les réservations commencent dans cette plage
+OUVERTURE, FERMETURE = 8, 20
+
+
+def date_argument(valeur):
+    jour = parse_date(valeur)
+    if jour is None:
+        raise ValueError(valeur)
+    return jour
+
+
+def par_lots(objets, taille):
+    """Découpe un itérable en listes de `taille` éléments (bulk_create matérialise tout ce qu'on lui passe)."""
+    objets = iter(objets)
+    while lot := list(islice(objets, taille)):
+        yield lot
+
+
+class Tirage:
+    """Tirage pondéré rapide : sommes cumulées et recherche dichotomique."""
+
+    def __init__(self, rng, valeurs, poids):
+        self.rng = rng
+        self.valeurs = list(valeurs)
+        self.cumul = list(accumulate(poids))
+
+    def __call__(self):
+        return self.valeurs[bisect.bisect_right(self.cumul, self.rng.random() * self.cumul[-1])]
+
+
+class Command(BaseCommand):
+    help = ("Génère un jeu de données synthétique réaliste (membres, espaces, réservations sans chevauchement, "
+            "événements, factures, paiements, notifications) ; déterministe pour une graine et une référence données")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--graine', type=int, default=42)
+        parser.add_argument('--reference', type=date_argument,
+                            help="Jour « aujourd'hui » des données (AAAA-MM-JJ, défaut : aujourd'hui)")
+        parser.add_argument('--jours', type=int, default=365, help='Historique avant la référence')
+        parser.add_argument('--jours-futurs', type=int, default=60, help='Réservations et événements à venir')
+        parser.add_argument('--membres', type=int, default=2000)
+        parser.add_argument('--gestionnaires', type=int, default=5)
+        parser.add_argument('--espaces', type=int, default=60)
+        parser.add_argument('--reservations', type=int, default=100_000)
+        parser.add_argument('--evenements', type=int, default=300)
+        parser.add_argument('--notifications', type=int, default=50_000)
+        parser.add_argument('--prefixe', default='gen_', help='Préfixe des noms d\'utilisateur créés')
+        parser.add_argument('--mot-de-passe', default='coworking', help='Mot de passe de tous les comptes créés')
+        parser.add_argument('--taille-lot', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=options['prefixe']).exists():
+            raise CommandError(f"Des utilisateurs {options['prefixe']}* existent déjà : changer --prefixe")
+        self.options = options
+        self.rng = random.Random(options['graine'])
+        self.lot = options['taille_lot']
+        self.fuseau = timezone.get_current_timezone()
+        reference = options['reference'] or timezone.localdate()
+        self.maintenant = datetime.combine(reference, datetime.min.time()) + timedelta(hours=12)
+        self.debut = datetime.combine(reference - timedelta(days=options['jours']), datetime.min.time())
+        self.fin = datetime.combine(reference + timedelta(days=options['jours_futurs']), datetime.min.time())
+
+        depart = time.perf_counter()
+        for nom, etape in (
+            ('membres', self.generer_membres),
+            ('espaces', self.generer_espaces),
+            ('réservations, factures et paiements', self.generer_reservations),
+            ('événements et inscriptions', self.generer_evenements),
+            ('notifications', self.generer_notifications),
+            ('compteurs, cumuls et index', self.resynchroniser),
+        ):
+            debut_etape = time.perf_counter()
+            resume = etape()
+            self.stdout.write(f"{nom:<38} {time.perf_counter() - debut_etape:7.1f} s  {resume}")
+        self.stdout.write(self.style.SUCCESS(f"Terminé en {time.perf_counter() - depart:.1f} s"))
+
+    def aware(self, moment):
+        """Heure locale naïve -> datetime aware (tout est tiré en heure locale)."""
+        return moment.replace(tzinfo=self.fuseau)
+
+    def moment_aleatoire(self, debut, fin):
+        return debut + timedelta(seconds=self.rng.randrange(int((fin - debut).total_seconds())))
+
+    # === Membres ===
+
+    def generer_membres(self):
+        rng, prefixe = self.rng, self.options['prefixe']
+        mot_de_passe = make_password(self.options['mot_de_passe'])
+        total = self.options['membres'] + self.options['gestionnaires']
+
+        def utilisateurs():
+            for rang in range(total):
+                prenom, nom = rng.choice(PRENOMS), rng.choice(NOMS)
+                username = f'{prefixe}{rang:06d}'
+                yield User(
+                    username=username, first_name=prenom, last_name=nom, email=f'{username}@exemple.fr',
+                    password=mot_de_passe,
+                    date_joined=self.aware(self.moment_aleatoire(self.debut - timedelta(days=365), self.maintenant)),
+                )
+        ids = []
+        for lot in par_lots(utilisateurs(), self.lot):
+            ids.extend(user.pk for user in User.objects.bulk_create(lot))
+        self.gestionnaires, self.membres = ids[:self.options['gestionnaires']], ids[self.options['gestionnaires']:]
+
+        RoleUtilisateur.objects.bulk_create(
+            [RoleUtilisateur(user_id=user_id, role='gestionnaire') for user_id in self.gestionnaires]
+            + [RoleUtilisateur(user_id=user_id, role='membre') for user_id in self.membres],
+            batch_size=self.lot,
+        )
+        abonnement = Tirage(rng, *zip(*ABONNEMENTS))
+        self.abonnements = {}
+        profils = []
+        for user_id in self.membres:
+            type_abonnement, actif = abonnement(), rng.random() < 0.9
+            if actif:
+                self.abonnements[user_id] = type_abonnement
+            profils.append(ProfilMembre(
+                user_id=user_id, type_abonnement=type_abonnement, abonnement_actif=actif,
+                telephone=f'06{rng.randrange(10 ** 8):08d}', entreprise=rng.choice(ENTREPRISES),
+                date_adhesion=self.aware(self.moment_aleatoire(self.debut - timedelta(days=365), self.maintenant)),
+            ))
+        ProfilMembre.objects.bulk_create(profils, batch_size=self.lot)
+
+        # Quelques membres très actifs, une longue traîne d'occasionnels (loi de Zipf)
+        ordre = list(self.membres)
+        rng.shuffle(ordre)
+        self.membre_actif = Tirage(rng, ordre, [1 / (rang + 1) ** 0.8 for rang in range(len(ordre))])
+        return f"{len(self.membres):,} membres, {len(self.gestionnaires)} gestionnaires"
+
+    # === Espaces ===
+
+    def generer_espaces(self):
+        rng = self.rng
+        types = {nom: TypeEspace.objects.get_or_create(nom=nom)[0] for nom, *_ in TYPES}
+        tirage_type = Tirage(rng, TYPES, [poids for *_, poids in TYPES])
+        numeros = dict.fromkeys(types, 0)
+        espaces, durees_espaces = [], []
+        for _ in range(self.options['espaces']):
+            nom, capacites, (prix_min, prix_max), durees, _ = tirage_type()
+            numeros[nom] += 1
+            durees_espaces.append(durees)
+            espaces.append(EspaceTravail(
+                nom=f'{nom} {numeros[nom]}', type_espace=types[nom], capacite=rng.choice(capacites),
+                prix_heure=Decimal(rng.randrange(prix_min * 2, prix_max * 2 + 1)) / 2,
+                equipements=rng.choice(('Wi-Fi, écran', 'Wi-Fi, tableau blanc', 'Wi-Fi, visioconférence', 'Wi-Fi')),
+            ))
+        self.espaces = EspaceTravail.objects.bulk_create(espaces)
+        self.durees = {espace.pk: durees for espace, durees in zip(self.espaces, durees_espaces)}
+        return f"{len(self.espaces)} espaces, {len(types)} types"
+
+    # === Réservations, factures, paiements ===
+
+    def creneaux(self, espace, nombre):
+        """`nombre` créneaux (début, fin) sans chevauchement dans l'espace, heures locales naïves.
+
+        Les débuts tombent au quart d'heure, aux heures d'ouverture ; l'écart
+        moyen étale les réservations sur la période. Un espace très demandé a
+        des réservations plus courtes ; si la période ne suffit toujours pas,
+        les dernières la dépassent.
+        """
+        rng = self.rng
+        duree_min, duree_max = self.durees[espace.pk]
+        # Minutes ouvrées de la période, partagées entre les réservations
+        minutes_jour = (FERMETURE - OUVERTURE) * 60
+        par_creneau = (self.fin - self.debut).days * minutes_jour / max(nombre, 1)
+        # Durées réduites pour que les réservations occupent au plus 60 % du temps ouvert
+        echelle = min(1, 0.6 * par_creneau / ((duree_min + duree_max) / 2))
+        duree_min = max(int(duree_min * echelle) // 15 * 15, 15)
+        duree_max = max(int(duree_max * echelle) // 15 * 15, duree_min)
+        ecart_moyen = max(par_creneau - (duree_min + duree_max) / 2, 1)
+        # Position en minutes ouvrées depuis le début de la période : la minute p
+        # tombe le jour p // minutes_jour, à OUVERTURE + p % minutes_jour. Une
+        # réservation qui finit après la fermeture pousse la suivante au
+        # lendemain, d'autant : l'ordre des positions suit celui des heures.
+        position = 0
+        for _ in range(nombre):
+            position += round(rng.expovariate(1 / ecart_moyen) / 15) * 15
+            jour, minute = divmod(position, minutes_jour)
+            debut = self.debut + timedelta(days=jour, hours=OUVERTURE, minutes=minute)
+            duree = rng.randrange(duree_min, duree_max + 1, 15)
+            position += duree
+            yield debut, debut + timedelta(minutes=duree)
+
+    def generer_reservations(self):
+        rng = self.rng
+        grilles = tarifs.grilles(self.espaces)
+        # Espaces plus ou moins demandés : volume réparti selon une popularité tirée au hasard
+        popularites = [rng.uniform(0.5, 1.5) for _ in self.espaces]
+        total_popularite = sum(popularites)
+        volumes = [int(self.options['reservations'] * p / total_popularite) for p in popularites]
+        volumes[-1] += self.options['reservations'] - sum(volumes)
+        # Numéros de facture : à la suite de ceux déjà attribués (base non vide)
+        self.sequences = dict(SequenceFacture.objects.values_list('jour', 'dernier'))
+        self.rangs_factures = {}
+        compte = {'réservations': 0, 'factures': 0, 'paiements': 0}
+
+        def reservations():
+            for espace, volume in zip(self.espaces, volumes):
+                grille = grilles[espace.pk]
+                for debut, fin in self.creneaux(espace, volume):
+                    membre_id = self.membre_actif()
+                    if debut < self.maintenant:
+                        statut = rng.choices(('confirmee', 'annulee', 'en_attente'), (82, 13, 5))[0]
+                    else:
+                        statut = rng.choices(('confirmee', 'en_attente', 'annulee'), (55, 40, 5))[0]
+                    creation = max(debut - timedelta(hours=rng.expovariate(1 / 72)), self.debut - timedelta(days=30))
+                    yield Reservation(
+                        membre_id=membre_id, espace_id=espace.pk, statut=statut,
+                        date_debut=self.aware(debut), date_fin=self.aware(fin), date_creation=self.aware(creation),
+                        prix_total=grille.prix(debut, fin, self.abonnements.get(membre_id)),
+                    )
+
+        for lot in par_lots(reservations(), self.lot):
+            lot = Reservation.objects.bulk_create(lot)
+            factures = Facture.objects.bulk_create(
+                [facture for facture in map(self.facture, lot) if facture is not None]
+            )
+            paiements = HistoriquePaiement.objects.bulk_create(
+                [self.paiement(facture) for facture in factures if facture.statut == 'payee']
+            )
+            compte['réservations'] += len(lot)
+            compte['factures'] += len(factures)
+            compte['paiements'] += len(paiements)
+        self.enregistrer_sequences()
+        return ', '.join(f"{nombre:,} {nom}" for nom, nombre in compte.items())
+
+    def facture(self, reservation):
+        """Facture de la réservation (créée avec elle), ou None : les demandes en attente ne sont pas facturées."""
+        rng = self.rng
+        if reservation.statut == 'en_attente' or (reservation.statut == 'annulee' and rng.random() < 0.5):
+            return None
+        creation = reservation.date_creation
+        echeance = creation + DELAI_ECHEANCE
+        if reservation.statut == 'annulee':
+            statut = 'annulee'
+        elif reservation.date_debut.replace(tzinfo=None) > self.maintenant:
+            statut = 'payee' if rng.random() < 0.3 else 'en_attente'
+        elif echeance.replace(tzinfo=None) < self.maintenant:
+            statut = 'payee' if rng.random() < 0.93 else 'en_retard'
+        else:
+            statut = 'payee' if rng.random() < 0.7 else 'en_attente'
+        jour = creation.date()
+        self.rangs_factures[jour] = self.rangs_factures.get(jour, self.sequences.get(jour, 0)) + 1
+        return Facture(
+            membre_id=reservation.membre_id, reservation_id=reservation.pk,
+            numero=formater_numero(jour, self.rangs_factures[jour]),
+            date_creation=creation, date_echeance=echeance,
+            montant_total=reservation.prix_total, statut=statut,
+        )
+
+    def paiement(self, facture):
+        limite = min(facture.date_echeance.replace(tzinfo=None), self.maintenant)
+        creation = facture.date_creation.replace(tzinfo=None)
+        return HistoriquePaiement(
+            facture_id=facture.pk, montant=facture.montant_total,
+            date_paiement=self.aware(self.moment_aleatoire(creation, limite) if limite > creation else creation),
+        )
+
+    def enregistrer_sequences(self):
+        """Reprend les compteurs de numérotation après les numéros générés (voir coworking.factures)."""
+        SequenceFacture.objects.bulk_create(
+            [SequenceFacture(jour=jour, dernier=dernier) for jour, dernier in sorted(self.rangs_factures.items())],
+            update_conflicts=True, unique_fields=['jour'], update_fields=['dernier'], batch_size=self.lot,
+        )
+
+    # === Événements ===
+
+    def generer_evenements(self):
+        rng = self.rng
+        jours = (self.fin - self.debut).days
+        evenements = []
+        for _ in range(self.options['evenements']):
+            debut = (self.debut + timedelta(days=rng.randrange(jours), hours=rng.randrange(9, 19)))
+            format_evenement, theme = rng.choice(FORMATS_EVENEMENT), rng.choice(THEMES)
+            evenements.append(Evenement(
+                nom=f'{format_evenement} {theme}', lieu=rng.choice(('Salle de conférence', 'Terrasse', 'Open space')),
+                description=f'{format_evenement} consacré à {theme}, ouvert à tous les membres.',
+                date_debut=self.aware(debut), date_fin=self.aware(debut + timedelta(hours=rng.choice((1, 2, 3)))),
+                places_max=rng.choice((10, 20, 30, 50, 100)),
+                prix=0 if rng.random() < 0.6 else Decimal(rng.randrange(5, 51)),
+                organisateur_id=rng.choice(self.gestionnaires or self.membres),
+            ))
+        evenements = Evenement.objects.bulk_create(evenements)
+
+        def inscriptions():
+            for evenement in evenements:
+                remplissage = min(1.0, rng.betavariate(2, 2) * 1.2)
+                nombre = min(int(evenement.places_max * remplissage), len(self.membres))
+                passe = evenement.date_debut.replace(tzinfo=None) < self.maintenant
+                for membre_id in rng.sample(self.membres, nombre):
+                    inscription = evenement.date_debut - timedelta(hours=rng.uniform(1, 24 * 21))
+                    yield Inscription(
+                        evenement_id=evenement.pk, membre_id=membre_id, date_inscription=inscription,
+                        presente=passe and rng.random() < 0.8,
+                    )
+        total = 0
+        for lot in par_lots(inscriptions(), self.lot):
+            total += len(Inscription.objects.bulk_create(lot))
+        return f"{len(evenements):,} événements, {total:,} inscriptions"
+
+    # === Notifications ===
+
+    def generer_notifications(self):
+        rng = self.rng
+        modele = Tirage(rng, NOTIFICATIONS, [poids for *_, poids in NOTIFICATIONS])
+
+        def notifications():
+            for _ in range(self.options['notifications']):
+                type_notification, titre, message, _ = modele()
+                creation = self.moment_aleatoire(self.debut, self.maintenant)
+                # Les plus anciennes ont presque toutes été lues
+                anciennete = (self.maintenant - creation) / (self.maintenant - self.debut)
+                yield Notification(
+                    destinataire_id=self.membre_actif(), titre=titre, message=message,
+                    type_notification=type_notification, date_creation=self.aware(creation),
+                    lue=rng.random() < 0.3 + 0.7 * anciennete,
+                )
+        total = 0
+        for lot in par_lots(notifications(), self.lot):
+            total += len(Notification.objects.bulk_create(lot))
+        return f"{total:,} notifications"
+
+    # === Données dérivées ===
+
+    def resynchroniser(self):
+        """bulk_create ne déclenche aucun signal : compteurs, cumuls, index et caches sont refaits ici."""
+        call_command('recalculer_compteurs', stdout=self.stdout)
+        lignes = revenus.reconstruire()
+        call_command('reconstruire_recherche', stdout=self.stdout)
+        # Pages, disponibilités, occupation et grilles tarifaires en cache ne connaissent pas ces lignes
+        cache.clear()
+        statistiques.calculer()
+        fin_reservations = Reservation.objects.filter(espace__in=self.espaces).aggregate(fin=Max('date_fin'))['fin']
+        return f"{lignes:,} lignes de revenus, dernière réservation le {fin_reservations:%d/%m/%Y}"
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from coworking.factures import marquer_factures_en_retard
+from coworking.planificateur import executer
+
+
+class Command(BaseCommand):
+    help = "Passe en retard les factures échues et notifie les membres (à lancer par cron, ou en boucle avec --intervalle)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalle', type=int, default=0,
+                            help='Relancer toutes les N secondes au lieu d\'une seule fois')
+        parser.add_argument('--sans-notification', action='store_true')
+
+    def handle(self, *args, **options):
+        while True:
+            metrique = executer('factures_en_retard', marquer_factures_en_retard,
+                                notifier=not options['sans_notification'])
+            if metrique.erreur:
+                self.stderr.write(self.style.ERROR(f"Échec : {metrique.erreur}"))
+            else:
+                self.stdout.write(f"{metrique.lignes} facture(s) passée(s) en retard en {metrique.duree_ms} ms")
+            if not options['intervalle']:
+                break
+            time.sleep(options['intervalle'])
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from coworking import statistiques
+
+
+class Command(BaseCommand):
+    help = "Recalcule les statistiques des tableaux de bord (à lancer par cron, ou en boucle avec --intervalle)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalle', type=int, default=0,
+                            help='Recalculer toutes les N secondes au lieu d\'une seule fois')
+
+    def handle(self, *args, **options):
+        while True:
+            depart = time.perf_counter()
+            snapshot = statistiques.calculer()
+            self.stdout.write(f"Statistiques recalculées en {(time.perf_counter() - depart) * 1000:.0f} ms "
+                              f"({snapshot.date_calcul:%d/%m/%Y %H:%M:%S})")
+            if not options['intervalle']:
+                break
+            time.sleep(options['intervalle'])
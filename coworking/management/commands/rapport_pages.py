@@ -0,0 +1,121 @@
+import gzip
+import re
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from coworking.models import (
+    EspaceTravail, Evenement, Facture, ProfilMembre, Reservation, RoleUtilisateur, TypeEspace,
+)
+
+PREFIXE = 'rapport_pages_'
+STYLES_EN_LIGNE = re.compile(rb'<style[^>]*>.*?</style>', re.S)
+FEUILLES = re.compile(rb'<link[^>]+rel="stylesheet"[^>]+href="([^"]+)"|<link[^>]+href="([^"]+)"[^>]+rel="stylesheet"')
+
+
+class Command(BaseCommand):
+    help = ("Taille (HTML, CSS en ligne, feuilles de style locales) et temps de rendu des pages "
+            "qui portaient des styles en ligne")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repetitions', type=int, default=30)
+
+    def handle(self, *args, **options):
+        donnees = self.creer_donnees()
+        try:
+            pages = [
+                (None, reverse('accueil')),
+                (None, reverse('liste_espaces')),
+                (None, reverse('liste_evenements')),
+                (None, reverse('detail_espace', args=[donnees['espace'].id])),
+                (None, reverse('detail_evenement', args=[donnees['evenement'].id])),
+                (None, reverse('login')),
+                (None, reverse('inscription')),
+                ('membre', reverse('dashboard')),
+                ('membre', reverse('mes_reservations')),
+                ('membre', reverse('reserver_espace')),
+                ('membre', reverse('page_paiement') + '?type=abonnement'),
+                ('gestionnaire', reverse('dashboard')),
+                ('gestionnaire', reverse('liste_reservations_admin')),
+                ('gestionnaire', reverse('liste_membres_admin')),
+                ('gestionnaire', reverse('detail_membre_admin', args=[donnees['membre'].id])),
+                ('gestionnaire', reverse('modifier_type_espace_admin', args=[donnees['type_espace'].id])),
+            ]
+            clients = {None: Client()}
+            for role in ('membre', 'gestionnaire'):
+                clients[role] = Client()
+                clients[role].force_login(donnees[role])
+
+            self.stdout.write(f"{'page':<46} {'HTML':>8} {'gzip':>7} {'styles':>7} {'CSS liée':>9} {'rendu':>8}")
+            totaux = [0, 0, 0]
+            for role, url in pages:
+                client = clients[role]
+                contenu = client.get(url).content
+                durees = []
+                for _ in range(options['repetitions']):
+                    depart = time.perf_counter()
+                    client.get(url)
+                    durees.append((time.perf_counter() - depart) * 1000)
+                en_ligne = sum(len(bloc) for bloc in STYLES_EN_LIGNE.findall(contenu))
+                liee = sum(self.taille_feuille(lien) for lien in FEUILLES.findall(contenu))
+                compresse = len(gzip.compress(contenu, 6))
+                totaux[0] += len(contenu)
+                totaux[1] += compresse
+                totaux[2] += en_ligne
+                self.stdout.write(
+                    f"{(role or 'anonyme') + ' ' + url:<46} {len(contenu):>8,} {compresse:>7,} {en_ligne:>7,} "
+                    f"{liee:>9,} {statistics.median(durees):>6.2f}ms"
+                )
+            self.stdout.write(f"{'total':<46} {totaux[0]:>8,} {totaux[1]:>7,} {totaux[2]:>7,}")
+        finally:
+            Reservation.objects.filter(espace__nom__startswith=PREFIXE).delete()
+            Evenement.objects.filter(nom__startswith=PREFIXE).delete()
+            EspaceTravail.objects.filter(nom__startswith=PREFIXE).delete()
+            TypeEspace.objects.filter(nom__startswith=PREFIXE).delete()
+            User.objects.filter(username__startswith=PREFIXE).delete()
+
+    def taille_feuille(self, lien):
+        """Taille d'une feuille de style servie par l'application (0 pour un CDN)."""
+        href = (lien[0] or lien[1]).decode()
+        if not href.startswith(settings.STATIC_URL) and not href.startswith('/' + settings.STATIC_URL):
+            return 0
+        nom = href.split(settings.STATIC_URL, 1)[1]
+        chemin = finders.find(nom)
+        if chemin is None:
+            # Nom empreinté : fichier du manifeste dans STATIC_ROOT
+            chemin = f'{settings.STATIC_ROOT}/{nom}'
+        try:
+            with open(chemin, 'rb') as fichier:
+                return len(fichier.read())
+        except OSError:
+            return 0
+
+    def creer_donnees(self):
+        mot_de_passe = make_password(None)
+        gestionnaire = User.objects.create(username=f'{PREFIXE}gestionnaire', password=mot_de_passe)
+        RoleUtilisateur.objects.create(user=gestionnaire, role='gestionnaire')
+        membre = User.objects.create(username=f'{PREFIXE}membre', password=mot_de_passe, first_name='Léa')
+        RoleUtilisateur.objects.create(user=membre, role='membre')
+        ProfilMembre.objects.create(user=membre, entreprise='Atelier')
+        type_espace = TypeEspace.objects.create(nom=f'{PREFIXE}type')
+        espace = EspaceTravail.objects.create(nom=f'{PREFIXE}espace', type_espace=type_espace,
+                                              capacite=4, prix_heure=10)
+        debut = timezone.now() + timedelta(days=1)
+        reservation = Reservation.objects.create(membre=membre, espace=espace, prix_total=20, statut='confirmee',
+                                                 date_debut=debut, date_fin=debut + timedelta(hours=2))
+        Facture.objects.create(membre=membre, reservation=reservation, numero=f'{PREFIXE}1', montant_total=20,
+                               date_echeance=debut + timedelta(days=30))
+        evenement = Evenement.objects.create(nom=f'{PREFIXE}evenement', description='Atelier', lieu='Salle',
+                                             date_debut=debut, date_fin=debut + timedelta(hours=2), places_max=10,
+                                             organisateur=gestionnaire)
+        return {'gestionnaire': gestionnaire, 'membre': membre, 'type_espace': type_espace, 'espace': espace,
+                'evenement': evenement}
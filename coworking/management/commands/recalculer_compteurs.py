@@ -0,0 +1,26 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from coworking.models import CompteurNotifications, Evenement, Notification
+from coworking.notifications import cle_version
+
+
+class Command(BaseCommand):
+    help = "Resynchronise les compteurs dénormalisés (inscrits par événement, notifications non lues)"
+
+    def handle(self, *args, **options):
+        evenements = Evenement.recalculer_inscrits()
+        self.stdout.write(f"{evenements} événement(s) : nb_inscrits recalculé")
+
+        non_lues = Notification.objects.filter(destinataire=OuterRef('user'), lue=False).order_by().values(
+            'destinataire'
+        ).annotate(n=Count('id')).values('n')
+        compteurs = CompteurNotifications.objects.update(
+            non_lues=Coalesce(Subquery(non_lues), 0),
+            version=F('version') + 1,
+        )
+        cache.delete_many([cle_version(user_id) for user_id in
+                           CompteurNotifications.objects.values_list('user_id', flat=True)])
+        self.stdout.write(f"{compteurs} compteur(s) de notifications recalculé(s)")
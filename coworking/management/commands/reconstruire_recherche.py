@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from coworking.recherche import index_membres
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche des membres (après un import en masse, par exemple)"
+
+    def handle(self, *args, **options):
+        depart = time.perf_counter()
+        index = index_membres()
+        index.reconstruire()
+        self.stdout.write(f"Index des membres reconstruit en {time.perf_counter() - depart:.2f} s "
+                          f"({type(index).__name__})")
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from coworking import revenus
+
+
+class Command(BaseCommand):
+    help = "Recalcule les cumuls journaliers de revenus depuis les factures et paiements (reprise de l'existant)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', help='Premier jour à recalculer (AAAA-MM-JJ) ; par défaut, depuis le début')
+        parser.add_argument('--fin', help='Dernier jour à recalculer (AAAA-MM-JJ) ; par défaut, jusqu\'à la fin')
+
+    def handle(self, *args, **options):
+        bornes = []
+        for nom in ('debut', 'fin'):
+            valeur = options[nom] and parse_date(options[nom])
+            if options[nom] and not valeur:
+                raise CommandError(f"Date invalide pour --{nom} : {options[nom]}")
+            bornes.append(valeur)
+        depart = time.perf_counter()
+        lignes = revenus.reconstruire(*bornes)
+        self.stdout.write(f"{lignes} ligne(s) de cumul écrite(s) en {(time.perf_counter() - depart) * 1000:.0f} ms")
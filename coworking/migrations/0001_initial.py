@@ -0,0 +1,317 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EspaceTravail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('capacite', models.IntegerField()),
+                ('prix_heure', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('equipements', models.TextField(blank=True)),
+                ('disponible', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SequenceFacture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField(unique=True)),
+                ('dernier', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatistiquesSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_calcul', models.DateTimeField(default=django.utils.timezone.now)),
+                ('total_membres', models.IntegerField(default=0)),
+                ('total_profils', models.IntegerField(default=0)),
+                ('total_espaces', models.IntegerField(default=0)),
+                ('reservations_aujourd_hui', models.IntegerField(default=0)),
+                ('reservations_jour', models.IntegerField(default=0)),
+                ('revenus_mois', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('factures_en_attente', models.IntegerField(default=0)),
+                ('evenements_a_venir', models.IntegerField(default=0)),
+                ('reservations_recentes', models.JSONField(default=list)),
+                ('prochains_evenements', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TypeEspace',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=50)),
+                ('description', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CompteurNotifications',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('non_lues', models.IntegerField(default=0)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='compteur_notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Evenement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('description', models.TextField()),
+                ('date_debut', models.DateTimeField()),
+                ('date_fin', models.DateTimeField()),
+                ('lieu', models.CharField(max_length=100)),
+                ('prix', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('places_max', models.IntegerField()),
+                ('nb_inscrits', models.PositiveIntegerField(default=0, editable=False)),
+                ('organisateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evenements_organises', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Inscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_inscription', models.DateTimeField(default=django.utils.timezone.now)),
+                ('presente', models.BooleanField(default=False)),
+                ('evenement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='coworking.evenement')),
+                ('membre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('membre', 'evenement')},
+            },
+        ),
+        migrations.AddField(
+            model_name='evenement',
+            name='participants',
+            field=models.ManyToManyField(related_name='evenements_participes', through='coworking.Inscription', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.CreateModel(
+            name='ListeAttente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_demande', models.DateTimeField(default=django.utils.timezone.now)),
+                ('evenement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='liste_attente', to='coworking.evenement')),
+                ('membre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['date_demande', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MetriqueTache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('debut', models.DateTimeField(default=django.utils.timezone.now)),
+                ('duree_ms', models.PositiveIntegerField(default=0)),
+                ('lignes', models.PositiveIntegerField(default=0)),
+                ('erreur', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-debut'],
+                'indexes': [models.Index(fields=['nom', 'debut'], name='metrique_tache_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titre', models.CharField(max_length=100)),
+                ('message', models.TextField()),
+                ('type_notification', models.CharField(choices=[('reservation', 'Réservation'), ('evenement', 'Événement'), ('facture', 'Facture'), ('general', 'Général')], default='general', max_length=15)),
+                ('date_creation', models.DateTimeField(default=django.utils.timezone.now)),
+                ('lue', models.BooleanField(default=False)),
+                ('destinataire', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProfilMembre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telephone', models.CharField(blank=True, max_length=15)),
+                ('entreprise', models.CharField(blank=True, max_length=100)),
+                ('type_abonnement', models.CharField(choices=[('jour', 'Journalier'), ('semaine', 'Hebdomadaire'), ('mois', 'Mensuel'), ('annuel', 'Annuel')], default='jour', max_length=10)),
+                ('date_adhesion', models.DateTimeField(default=django.utils.timezone.now)),
+                ('abonnement_actif', models.BooleanField(default=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_debut', models.DateTimeField()),
+                ('date_fin', models.DateTimeField()),
+                ('statut', models.CharField(choices=[('confirmee', 'Confirmée'), ('en_attente', 'En attente'), ('annulee', 'Annulée')], default='en_attente', max_length=15)),
+                ('prix_total', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('date_creation', models.DateTimeField(default=django.utils.timezone.now)),
+                ('espace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='coworking.espacetravail')),
+                ('membre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HistoriqueReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_action', models.DateTimeField(default=django.utils.timezone.now)),
+                ('action', models.CharField(max_length=50)),
+                ('reservation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='coworking.reservation')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Facture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.CharField(max_length=20, unique=True)),
+                ('date_creation', models.DateTimeField(default=django.utils.timezone.now)),
+                ('date_echeance', models.DateTimeField()),
+                ('montant_total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('payee', 'Payée'), ('en_retard', 'En retard'), ('annulee', 'Annulée')], default='en_attente', max_length=15)),
+                ('membre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('reservation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='coworking.reservation')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RoleUtilisateur',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('membre', 'Membre'), ('gestionnaire', 'Gestionnaire')], default='membre', max_length=20)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SerieReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequence', models.CharField(choices=[('quotidienne', 'Tous les jours'), ('hebdomadaire', 'Toutes les semaines'), ('mensuelle', 'Tous les mois')], default='hebdomadaire', max_length=15)),
+                ('intervalle', models.PositiveSmallIntegerField(default=1)),
+                ('date_debut', models.DateTimeField()),
+                ('date_fin', models.DateTimeField()),
+                ('nombre_occurrences', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('jusqu_au', models.DateField(blank=True, null=True)),
+                ('exceptions', models.JSONField(blank=True, default=list)),
+                ('date_creation', models.DateTimeField(default=django.utils.timezone.now)),
+                ('espace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='coworking.espacetravail')),
+                ('membre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='serie',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations', to='coworking.seriereservation'),
+        ),
+        migrations.CreateModel(
+            name='RevenuJournalier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('type_abonnement', models.CharField(blank=True, max_length=10)),
+                ('nombre_factures', models.IntegerField(default=0)),
+                ('montant_emis', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('nombre_payees', models.IntegerField(default=0)),
+                ('montant_paye', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('nombre_paiements', models.IntegerField(default=0)),
+                ('montant_encaisse', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('type_espace', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='coworking.typeespace')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RegleTarif',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('genre', models.CharField(choices=[('pointe', 'Heures de pointe'), ('plafond_jour', 'Plafond journalier'), ('remise', 'Remise abonnement')], max_length=15)),
+                ('jours', models.CharField(blank=True, default='01234', max_length=7)),
+                ('heure_debut', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('heure_fin', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('coefficient', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('plafond', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('type_abonnement', models.CharField(blank=True, choices=[('jour', 'Journalier'), ('semaine', 'Hebdomadaire'), ('mois', 'Mensuel'), ('annuel', 'Annuel')], max_length=10)),
+                ('pourcentage', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('actif', models.BooleanField(default=True)),
+                ('espace', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='coworking.espacetravail')),
+                ('type_espace', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='coworking.typeespace')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='espacetravail',
+            name='type_espace',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='coworking.typeespace'),
+        ),
+        migrations.CreateModel(
+            name='HistoriquePaiement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_paiement', models.DateTimeField(default=django.utils.timezone.now)),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('facture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='coworking.facture')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date_paiement', 'id'], name='paiement_export_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='evenement',
+            index=models.Index(fields=['date_debut', 'id'], name='evenement_pagination_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='listeattente',
+            unique_together={('membre', 'evenement')},
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['destinataire', 'lue', 'date_creation'], name='notification_boite_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['statut', 'date_echeance'], name='facture_echeance_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['date_creation', 'id'], name='facture_pagination_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['statut', 'date_creation', 'id'], name='facture_statut_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['espace', 'statut', 'date_debut', 'date_fin'], name='reservation_dispo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['date_creation', 'id'], name='reservation_pagination_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['statut', 'date_creation', 'id'], name='reservation_statut_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['date_debut', 'id'], name='reservation_export_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='revenujournalier',
+            constraint=models.UniqueConstraint(condition=models.Q(('type_espace__isnull', False)), fields=('jour', 'type_espace', 'type_abonnement'), name='revenu_jour_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='revenujournalier',
+            constraint=models.UniqueConstraint(condition=models.Q(('type_espace__isnull', True)), fields=('jour', 'type_abonnement'), name='revenu_jour_sans_type_unique'),
+        ),
+    ]
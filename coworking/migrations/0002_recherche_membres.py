@@ -0,0 +1,67 @@
+"""
+Tables de l'index de recherche des membres (voir coworking.recherche).
+
+Elles sont propres à chaque base : table FTS5 et table des variantes sous
+SQLite, extension pg_trgm, table et index GIN sous PostgreSQL. Les autres
+bases n'ont pas d'index dédié. L'index est rempli à la fin de la migration
+pour les utilisateurs déjà présents.
+"""
+from django.db import migrations
+
+
+class RunSQLBase(migrations.RunSQL):
+    """RunSQL exécuté seulement sur les bases `vendor` (« sqlite », « postgresql »)."""
+
+    def __init__(self, vendor, *args, **kwargs):
+        self.vendor = vendor
+        super().__init__(*args, **kwargs)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def remplir_index(apps, schema_editor):
+    from coworking.recherche import index_membres
+
+    index_membres(schema_editor.connection.alias).reconstruire()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coworking', '0001_initial'),
+    ]
+
+    operations = [
+        RunSQLBase(
+            'sqlite',
+            [
+                "CREATE VIRTUAL TABLE IF NOT EXISTS coworking_recherche_membre USING fts5(document, tokenize='trigram')",
+                "CREATE TABLE IF NOT EXISTS coworking_recherche_variante ("
+                "variante TEXT NOT NULL, mot TEXT NOT NULL, PRIMARY KEY (variante, mot)) WITHOUT ROWID",
+            ],
+            [
+                "DROP TABLE IF EXISTS coworking_recherche_variante",
+                "DROP TABLE IF EXISTS coworking_recherche_membre",
+            ],
+        ),
+        RunSQLBase(
+            'postgresql',
+            [
+                "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+                "CREATE TABLE IF NOT EXISTS coworking_recherche_membre ("
+                "user_id integer PRIMARY KEY REFERENCES auth_user(id) ON DELETE CASCADE, "
+                "document text NOT NULL)",
+                "CREATE INDEX IF NOT EXISTS coworking_recherche_membre_trgm "
+                "ON coworking_recherche_membre USING gin (document gin_trgm_ops)",
+            ],
+            # L'extension peut servir à d'autres : elle reste
+            ["DROP TABLE IF EXISTS coworking_recherche_membre"],
+        ),
+        migrations.RunPython(remplir_index, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 
 class TypeEspace(models.Model):
@@ -20,12 +23,8 @@ class EspaceTravail(models.Model):
     
     
     def est_disponible(self, date_debut, date_fin):
-        return not Reservation.objects.filter(
-            espace=self,
-            statut='confirmee',
-            date_debut__lt=date_fin,
-            date_fin__gt=date_debut
-        ).exists()
+        from .disponibilite import est_disponible
+        return est_disponible(self, date_debut, date_fin)
         
     def __str__(self):
         return self.nom
@@ -52,6 +51,57 @@ class ProfilMembre(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.get_type_abonnement_display()}"
 
+class RegleTarif(models.Model):
+    """Règle de tarification (voir coworking.tarifs).
+
+    Une règle vaut pour un espace, pour un type d'espace, ou pour tous les
+    espaces quand ni l'un ni l'autre n'est renseigné. Pour chaque genre, les
+    règles de l'espace remplacent celles de son type, qui remplacent les
+    règles générales.
+    """
+    GENRES = [
+        ('pointe', 'Heures de pointe'),
+        ('plafond_jour', 'Plafond journalier'),
+        ('remise', 'Remise abonnement'),
+    ]
+
+    nom = models.CharField(max_length=100)
+    genre = models.CharField(max_length=15, choices=GENRES)
+    espace = models.ForeignKey(EspaceTravail, on_delete=models.CASCADE, null=True, blank=True)
+    type_espace = models.ForeignKey(TypeEspace, on_delete=models.CASCADE, null=True, blank=True)
+    # Heures de pointe : jours (chiffres, 0 = lundi), plage [heure_debut, heure_fin) et coefficient du prix horaire
+    jours = models.CharField(max_length=7, blank=True, default='01234')
+    heure_debut = models.PositiveSmallIntegerField(null=True, blank=True)
+    heure_fin = models.PositiveSmallIntegerField(null=True, blank=True)
+    coefficient = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    # Plafond journalier : montant maximal facturé par jour calendaire
+    plafond = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    # Remise : pourcentage retiré du prix pour les membres de cet abonnement
+    type_abonnement = models.CharField(max_length=10, choices=ProfilMembre.TYPES_ABONNEMENT, blank=True)
+    pourcentage = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    actif = models.BooleanField(default=True)
+
+    def clean(self):
+        if self.espace_id and self.type_espace_id:
+            raise ValidationError("Une règle vaut pour un espace ou pour un type d'espace, pas les deux.")
+        if self.genre == 'pointe':
+            if self.heure_debut is None or self.heure_fin is None or self.coefficient is None:
+                raise ValidationError("Heures de pointe : plage horaire et coefficient requis.")
+            if not 0 <= self.heure_debut < self.heure_fin <= 24:
+                raise ValidationError("La plage horaire va de 0 à 24 h, début avant fin.")
+            if not self.jours or set(self.jours) - set('0123456'):
+                raise ValidationError("Jours : chiffres de 0 (lundi) à 6 (dimanche).")
+        elif self.genre == 'plafond_jour' and self.plafond is None:
+            raise ValidationError("Plafond journalier : montant requis.")
+        elif self.genre == 'remise':
+            if not self.type_abonnement or self.pourcentage is None:
+                raise ValidationError("Remise : abonnement et pourcentage requis.")
+            if not 0 <= self.pourcentage <= 100:
+                raise ValidationError("Le pourcentage de remise va de 0 à 100.")
+
+    def __str__(self):
+        return f"{self.nom} ({self.get_genre_display()})"
+
 class Reservation(models.Model):
     STATUTS = [
         ('confirmee', 'Confirmée'),
@@ -66,10 +116,50 @@ class Reservation(models.Model):
     statut = models.CharField(max_length=15, choices=STATUTS, default='en_attente')
     prix_total = models.DecimalField(max_digits=8, decimal_places=2)
     date_creation = models.DateTimeField(default=timezone.now)
+    # Occurrence d'une série récurrente (coworking.reservations.reserver_serie)
+    serie = models.ForeignKey(
+        'SerieReservation', on_delete=models.SET_NULL, null=True, blank=True, related_name='reservations'
+    )
+    
+    class Meta:
+        indexes = [
+            # Détection des conflits : espace + statut puis chevauchement de dates
+            models.Index(fields=['espace', 'statut', 'date_debut', 'date_fin'], name='reservation_dispo_idx'),
+            # Pagination par clé de liste_reservations_admin, avec ou sans filtre de statut
+            models.Index(fields=['date_creation', 'id'], name='reservation_pagination_idx'),
+            models.Index(fields=['statut', 'date_creation', 'id'], name='reservation_statut_page_idx'),
+            # Exports par plage de dates (coworking.exports)
+            models.Index(fields=['date_debut', 'id'], name='reservation_export_idx'),
+        ]
     
     def __str__(self):
         return f"{self.membre.username} - {self.espace.nom} - {self.date_debut.strftime('%d/%m/%Y')}"
 
+class SerieReservation(models.Model):
+    """Règle de récurrence d'une série de réservations (un même créneau répété)."""
+    FREQUENCES = [
+        ('quotidienne', 'Tous les jours'),
+        ('hebdomadaire', 'Toutes les semaines'),
+        ('mensuelle', 'Tous les mois'),
+    ]
+    
+    membre = models.ForeignKey(User, on_delete=models.CASCADE)
+    espace = models.ForeignKey(EspaceTravail, on_delete=models.CASCADE)
+    frequence = models.CharField(max_length=15, choices=FREQUENCES, default='hebdomadaire')
+    # Toutes les `intervalle` périodes (2 + hebdomadaire : une semaine sur deux)
+    intervalle = models.PositiveSmallIntegerField(default=1)
+    # Première occurrence ; les suivantes gardent les mêmes heures locales
+    date_debut = models.DateTimeField()
+    date_fin = models.DateTimeField()
+    nombre_occurrences = models.PositiveSmallIntegerField(null=True, blank=True)
+    jusqu_au = models.DateField(null=True, blank=True)
+    # Dates (AAAA-MM-JJ) sautées : jours fériés, congés
+    exceptions = models.JSONField(default=list, blank=True)
+    date_creation = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.membre.username} - {self.espace.nom} - {self.get_frequence_display()}"
+
 class Evenement(models.Model):
     nom = models.CharField(max_length=100)
     description = models.TextField()
@@ -80,13 +170,30 @@ class Evenement(models.Model):
     places_max = models.IntegerField()
     organisateur = models.ForeignKey(User, on_delete=models.CASCADE, related_name='evenements_organises')
     participants = models.ManyToManyField(User, through='Inscription', related_name='evenements_participes')
+    # Nombre d'inscriptions, tenu à jour par les signaux d'Inscription
+    nb_inscrits = models.PositiveIntegerField(default=0, editable=False)
+    
+    class Meta:
+        indexes = [
+            # Pagination par clé de liste_evenements_admin
+            models.Index(fields=['date_debut', 'id'], name='evenement_pagination_idx'),
+        ]
     
     def __str__(self):
         return self.nom
     
     @property
     def places_restantes(self):
-        return self.places_max - self.participants.count()
+        return max(self.places_max - self.nb_inscrits, 0)
+    
+    @classmethod
+    def recalculer_inscrits(cls, queryset=None):
+        """Resynchronise nb_inscrits avec la table Inscription (une seule requête UPDATE)"""
+        compte = Inscription.objects.filter(evenement=OuterRef('pk')).order_by().values('evenement').annotate(
+            n=Count('id')
+        ).values('n')
+        queryset = cls.objects.all() if queryset is None else queryset
+        return queryset.update(nb_inscrits=Coalesce(Subquery(compte), 0))
 
 class Inscription(models.Model):
     membre = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -97,6 +204,19 @@ class Inscription(models.Model):
     class Meta:
         unique_together = ['membre', 'evenement']
 
+class ListeAttente(models.Model):
+    """Demande d'inscription à un événement complet, promue dans l'ordre d'arrivée"""
+    membre = models.ForeignKey(User, on_delete=models.CASCADE)
+    evenement = models.ForeignKey(Evenement, on_delete=models.CASCADE, related_name='liste_attente')
+    date_demande = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        unique_together = ['membre', 'evenement']
+        ordering = ['date_demande', 'id']
+    
+    def __str__(self):
+        return f"{self.membre.username} - {self.evenement.nom} (attente)"
+
 class Facture(models.Model):
     STATUTS_FACTURE = [
         ('en_attente', 'En attente'),
@@ -112,15 +232,33 @@ class Facture(models.Model):
     montant_total = models.DecimalField(max_digits=10, decimal_places=2)
     statut = models.CharField(max_length=15, choices=STATUTS_FACTURE, default='en_attente')
     reservation = models.ForeignKey(Reservation, on_delete=models.SET_NULL, null=True, blank=True)
-    
-    
+
+    class Meta:
+        indexes = [
+            # Balayage des factures échues (coworking.factures.marquer_factures_en_retard)
+            models.Index(fields=['statut', 'date_echeance'], name='facture_echeance_idx'),
+            # Pagination par clé de liste_factures_admin, avec ou sans filtre de statut
+            models.Index(fields=['date_creation', 'id'], name='facture_pagination_idx'),
+            models.Index(fields=['statut', 'date_creation', 'id'], name='facture_statut_page_idx'),
+        ]
+
     def mise_a_jour_statut(self):
-        if self.statut != 'payee' and timezone.now() > self.date_echeance:
+        """Passe cette facture en retard si elle est échue (le balayage en masse est dans coworking.factures)"""
+        if Facture.objects.filter(
+            pk=self.pk, statut='en_attente', date_echeance__lt=timezone.now()
+        ).update(statut='en_retard'):
             self.statut = 'en_retard'
-            self.save()
     def __str__(self):
         return f"Facture {self.numero} - {self.membre.username}"
 
+class SequenceFacture(models.Model):
+    """Dernier numéro de facture attribué pour un jour (voir coworking.factures)"""
+    jour = models.DateField(unique=True)
+    dernier = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.jour:%Y%m%d} : {self.dernier}"
+
 class Notification(models.Model):
     TYPES = [
         ('reservation', 'Réservation'),
@@ -136,14 +274,66 @@ class Notification(models.Model):
     date_creation = models.DateTimeField(default=timezone.now)
     lue = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            # Boîte de réception : non lues d'un destinataire, les plus récentes d'abord
+            models.Index(fields=['destinataire', 'lue', 'date_creation'], name='notification_boite_idx'),
+        ]
+    
     def marquer_comme_lue(self):
-        self.lue = True
-        self.save()
+        from .notifications import marquer_lue
+        marquer_lue(self)
 
     def __str__(self):
         return f"{self.titre} - {self.destinataire.username}"
     
     
+class CompteurNotifications(models.Model):
+    """Nombre de notifications non lues par utilisateur, tenu à jour par coworking.notifications"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='compteur_notifications')
+    non_lues = models.IntegerField(default=0)
+    # Incrémentée à chaque changement de la boîte : sert d'ETag à api_notifications
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.non_lues} non lue(s)"
+
+
+class StatistiquesSnapshot(models.Model):
+    """Chiffres des tableaux de bord précalculés (une seule ligne, voir coworking.statistiques)"""
+    date_calcul = models.DateTimeField(default=timezone.now)
+    total_membres = models.IntegerField(default=0)
+    total_profils = models.IntegerField(default=0)
+    total_espaces = models.IntegerField(default=0)
+    reservations_aujourd_hui = models.IntegerField(default=0)
+    reservations_jour = models.IntegerField(default=0)
+    revenus_mois = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    factures_en_attente = models.IntegerField(default=0)
+    evenements_a_venir = models.IntegerField(default=0)
+    # Listes affichées telles quelles par dashboard_admin
+    reservations_recentes = models.JSONField(default=list)
+    prochains_evenements = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"Statistiques du {self.date_calcul:%d/%m/%Y %H:%M}"
+
+
+class MetriqueTache(models.Model):
+    """Durée et volume d'une exécution de tâche planifiée (voir coworking.planificateur)"""
+    nom = models.CharField(max_length=100)
+    debut = models.DateTimeField(default=timezone.now)
+    duree_ms = models.PositiveIntegerField(default=0)
+    lignes = models.PositiveIntegerField(default=0)
+    erreur = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-debut']
+        indexes = [models.Index(fields=['nom', 'debut'], name='metrique_tache_idx')]
+
+    def __str__(self):
+        return f"{self.nom} ({self.debut:%d/%m/%Y %H:%M}) : {self.lignes} ligne(s) en {self.duree_ms} ms"
+
+
 class HistoriqueReservation(models.Model):
     reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE)
     date_action = models.DateTimeField(default=timezone.now)
@@ -154,6 +344,49 @@ class HistoriquePaiement(models.Model):
     date_paiement = models.DateTimeField(default=timezone.now)
     montant = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # Exports par plage de dates (coworking.exports)
+            models.Index(fields=['date_paiement', 'id'], name='paiement_export_idx'),
+        ]
+
+
+class RevenuJournalier(models.Model):
+    """Cumul journalier des factures et paiements (tenu à jour par coworking.revenus).
+
+    Une ligne par (jour, type d'espace, type d'abonnement) : les factures y
+    comptent au jour de leur création, les paiements au jour du paiement.
+    type_espace est vide pour une facture sans réservation, type_abonnement
+    pour un membre sans profil.
+    """
+    jour = models.DateField()
+    type_espace = models.ForeignKey(TypeEspace, on_delete=models.SET_NULL, null=True, blank=True)
+    type_abonnement = models.CharField(max_length=10, blank=True)
+    # Factures non annulées, dont payées
+    nombre_factures = models.IntegerField(default=0)
+    montant_emis = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    nombre_payees = models.IntegerField(default=0)
+    montant_paye = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # HistoriquePaiement
+    nombre_paiements = models.IntegerField(default=0)
+    montant_encaisse = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # Deux contraintes partielles : NULL n'entre pas dans l'unicité d'un index ordinaire
+            models.UniqueConstraint(
+                fields=['jour', 'type_espace', 'type_abonnement'],
+                condition=models.Q(type_espace__isnull=False), name='revenu_jour_unique',
+            ),
+            models.UniqueConstraint(
+                fields=['jour', 'type_abonnement'],
+                condition=models.Q(type_espace__isnull=True), name='revenu_jour_sans_type_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.jour} - {self.type_espace_id or '-'} - {self.type_abonnement or '-'}"
+
 
 
 class RoleUtilisateur(models.Model):
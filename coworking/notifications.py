@@ -0,0 +1,252 @@
+"""
+Diffusion de notifications et compteurs de notifications non lues.
+
+Les identifiants des destinataires sont lus en flux (values_list + iterator)
+et les notifications écrites par lots avec bulk_create. Au-delà d'un seuil,
+l'envoi est confié à un thread de fond pour ne pas bloquer la requête.
+
+Chaque utilisateur possède un CompteurNotifications (non lues + version) tenu
+à jour ici et par les signaux ; la version, mise en cache, sert d'ETag à
+api_notifications.
+"""
+import base64
+import logging
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import CompteurNotifications, Notification
+from .temps_reel import publier_notifications
+
+logger = logging.getLogger(__name__)
+
+# Durée de vie (secondes) de la version mise en cache : borne le retard vu par
+# un processus dont le cache local n'a pas reçu l'invalidation.
+DUREE_CACHE_VERSION = getattr(settings, 'NOTIFICATIONS_DUREE_CACHE_VERSION', 60)
+
+TAILLE_LOT = getattr(settings, 'NOTIFICATIONS_TAILLE_LOT', 1000)
+# Nombre de destinataires à partir duquel l'envoi passe en arrière-plan
+SEUIL_ARRIERE_PLAN = getattr(settings, 'NOTIFICATIONS_SEUIL_ARRIERE_PLAN', 2000)
+
+_executeur = None
+_verrou_executeur = threading.Lock()
+
+
+def _executeur_fond():
+    global _executeur
+    with _verrou_executeur:
+        if _executeur is None:
+            _executeur = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notifications')
+        return _executeur
+
+
+def diffuser(destinataires, titre, message, type_notification='general', taille_lot=TAILLE_LOT):
+    """Crée une notification par destinataire, par lots ; retourne le nombre de lignes écrites.
+
+    `destinataires` est un queryset de User (ou une liste d'identifiants).
+    """
+    if hasattr(destinataires, 'values_list'):
+        ids = destinataires.order_by().values_list('id', flat=True).iterator(chunk_size=taille_lot)
+    else:
+        ids = iter(destinataires)
+    date_creation = timezone.now()
+    return creer_par_lots(
+        (
+            Notification(
+                destinataire_id=destinataire_id,
+                titre=titre,
+                message=message,
+                type_notification=type_notification,
+                date_creation=date_creation,
+            )
+            for destinataire_id in ids
+        ),
+        taille_lot=taille_lot,
+    )
+
+
+def creer_par_lots(notifications, taille_lot=TAILLE_LOT):
+    """Écrit un flux de Notification (non enregistrées) par lots ; retourne le nombre de lignes."""
+    total = 0
+    lot = []
+    for notification in notifications:
+        lot.append(notification)
+        if len(lot) >= taille_lot:
+            total += _ecrire_lot(lot)
+            lot = []
+    if lot:
+        total += _ecrire_lot(lot)
+    return total
+
+
+def _ecrire_lot(lot):
+    ids = {notification.destinataire_id for notification in lot}
+    with transaction.atomic():
+        assurer_compteurs(ids)
+        Notification.objects.bulk_create(lot, batch_size=len(lot))
+        # Un même destinataire peut apparaître plusieurs fois dans une liste
+        par_nombre = defaultdict(list)
+        for destinataire_id, nombre in Counter(n.destinataire_id for n in lot).items():
+            par_nombre[nombre].append(destinataire_id)
+        for nombre, destinataire_ids in par_nombre.items():
+            modifier_compteurs(destinataire_ids, nombre)
+        transaction.on_commit(lambda: publier_notifications(lot))
+    return len(lot)
+
+
+# === Compteurs de notifications non lues ===
+
+def cle_version(user_id):
+    return f'notifications:version:{user_id}'
+
+
+def assurer_compteurs(user_ids):
+    """Crée les compteurs manquants à partir des non lues existantes ; retourne les ids créés."""
+    user_ids = set(user_ids)
+    existants = set(
+        CompteurNotifications.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True)
+    )
+    manquants = user_ids - existants
+    if not manquants:
+        return set()
+    comptes = dict(
+        Notification.objects.filter(destinataire_id__in=manquants, lue=False)
+        .values_list('destinataire_id').annotate(n=Count('id')).order_by()
+    )
+    CompteurNotifications.objects.bulk_create(
+        [CompteurNotifications(user_id=user_id, non_lues=comptes.get(user_id, 0)) for user_id in manquants],
+        ignore_conflicts=True,
+    )
+    return manquants
+
+
+def modifier_compteurs(user_ids, delta):
+    """Ajoute delta aux non lues des utilisateurs et change la version de leur boîte."""
+    CompteurNotifications.objects.filter(user_id__in=user_ids).update(
+        non_lues=F('non_lues') + delta,
+        version=F('version') + 1,
+    )
+    cles = [cle_version(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(cles))
+
+
+def compteur(user_id):
+    """Retourne le CompteurNotifications de l'utilisateur, créé au besoin."""
+    try:
+        return CompteurNotifications.objects.get(user_id=user_id)
+    except CompteurNotifications.DoesNotExist:
+        try:
+            with transaction.atomic():
+                assurer_compteurs([user_id])
+        except IntegrityError:
+            pass
+        return CompteurNotifications.objects.get(user_id=user_id)
+
+
+def nombre_non_lues(user):
+    return compteur(user.pk).non_lues
+
+
+def version_en_cache(user_id):
+    """Version de la boîte lue dans le cache uniquement (None si absente)."""
+    return cache.get(cle_version(user_id))
+
+
+def mettre_version_en_cache(user_id, version):
+    cache.set(cle_version(user_id), version, DUREE_CACHE_VERSION)
+
+
+def marquer_lue(notification):
+    """Marque une notification comme lue ; ne décrémente que si elle ne l'était pas déjà."""
+    with transaction.atomic():
+        if Notification.objects.filter(pk=notification.pk, lue=False).update(lue=True):
+            assurer_compteurs([notification.destinataire_id])
+            modifier_compteurs([notification.destinataire_id], -1)
+    notification.lue = True
+
+
+def recalculer_compteur(user_id):
+    """Resynchronise le compteur avec la table (après une modification hors de ce module)."""
+    non_lues = Notification.objects.filter(destinataire_id=user_id, lue=False).count()
+    with transaction.atomic():
+        assurer_compteurs([user_id])
+        CompteurNotifications.objects.filter(user_id=user_id).update(
+            non_lues=non_lues, version=F('version') + 1,
+        )
+    transaction.on_commit(lambda: cache.delete(cle_version(user_id)))
+
+
+def _diffuser_en_fond(destinataires, titre, message, type_notification):
+    try:
+        total = diffuser(destinataires, titre, message, type_notification)
+        logger.info("Notification « %s » envoyée à %d destinataire(s)", titre, total)
+    except Exception:
+        logger.exception("Échec de l'envoi de la notification « %s »", titre)
+    finally:
+        # Le thread garde sinon sa propre connexion ouverte indéfiniment
+        connection.close()
+
+
+def envoyer(destinataires, titre, message, type_notification='general'):
+    """Envoie une notification ; retourne (nombre de destinataires, envoi différé ou non)."""
+    if hasattr(destinataires, 'values_list'):
+        nombre = destinataires.count()
+    else:
+        destinataires = list(destinataires)
+        nombre = len(destinataires)
+    if nombre < SEUIL_ARRIERE_PLAN:
+        diffuser(destinataires, titre, message, type_notification)
+        return nombre, False
+    # Le thread de fond ne doit lire qu'après validation de la transaction en cours
+    transaction.on_commit(lambda: _executeur_fond().submit(
+        _diffuser_en_fond, destinataires, titre, message, type_notification
+    ))
+    return nombre, True
+
+
+# === Pagination par curseur de la boîte de réception ===
+
+def encoder_curseur(date_creation, notification_id):
+    brut = f'{date_creation.isoformat()}|{notification_id}'
+    return base64.urlsafe_b64encode(brut.encode()).decode()
+
+
+def decoder_curseur(curseur):
+    """Retourne (date_creation, id) ou None si le curseur est invalide."""
+    try:
+        date_brute, notification_id = base64.urlsafe_b64decode(curseur.encode()).decode().split('|')
+        date_creation = parse_datetime(date_brute)
+        return (date_creation, int(notification_id)) if date_creation else None
+    except (ValueError, UnicodeError):
+        return None
+
+
+def page_non_lues(user_id, curseur=None, limite=20):
+    """Une page de notifications non lues, des plus récentes aux plus anciennes.
+
+    Retourne (notifications, curseur de la page suivante ou None).
+    """
+    notifications = Notification.objects.filter(
+        destinataire_id=user_id,
+        lue=False,
+    ).order_by('-date_creation', '-id')
+    position = decoder_curseur(curseur) if curseur else None
+    if position:
+        date_creation, notification_id = position
+        notifications = notifications.filter(
+            Q(date_creation__lt=date_creation) |
+            Q(date_creation=date_creation, id__lt=notification_id)
+        )
+    page = list(notifications.values('id', 'titre', 'message', 'type_notification', 'date_creation')[:limite + 1])
+    suivant = None
+    if len(page) > limite:
+        page = page[:limite]
+        suivant = encoder_curseur(page[-1]['date_creation'], page[-1]['id'])
+    return page, suivant
@@ -0,0 +1,200 @@
+"""
+Occupation des espaces : cartes de chaleur jour de la semaine × heure.
+
+Une matrice par (espace, semaine) : 168 cases, du lundi 0 h au dimanche
+23 h en heure locale, chacune la fraction de l'heure couverte par des
+réservations confirmées. Les réservations de toutes les semaines à calculer
+sont lues en une requête puis réparties par tableaux de différences : +1 /
+-1 aux bornes des heures pleines, fractions aux heures entamées, puis somme
+cumulée (itertools.accumulate). Le coût est en O(réservations + heures),
+quelle que soit la durée des réservations.
+
+Chaque matrice est gardée en cache sous (espace, lundi). Les signaux de
+Reservation, et reserver_serie pour ses bulk_create, effacent celles des
+semaines touchées : seules ces semaines sont recalculées à la lecture
+suivante. Une réservation déplacée d'une semaine à une autre, ou modifiée
+par update(), n'efface pas l'ancienne semaine : OCCUPATION_DUREE borne ce
+retard.
+"""
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Reservation
+
+HEURES_SEMAINE = 7 * 24
+MINUTES_SEMAINE = HEURES_SEMAINE * 60
+
+DUREE = getattr(settings, 'OCCUPATION_DUREE', 24 * 3600)
+# Plage horaire (heure de début, heure de fin) sur laquelle se calcule le taux d'occupation
+HEURES_OUVERTURE = getattr(settings, 'OCCUPATION_HEURES_OUVERTURE', (8, 20))
+# Au-delà, une demande couvrirait plus d'un an de matrices
+MAX_SEMAINES = 53
+
+
+def lundi(jour):
+    return jour - timedelta(days=jour.weekday())
+
+
+def semaines(debut, fin):
+    """Lundis des semaines qui couvrent les dates [debut, fin]."""
+    semaine, derniere = lundi(debut), lundi(fin)
+    liste = []
+    while semaine <= derniere:
+        liste.append(semaine)
+        semaine += timedelta(weeks=1)
+    return liste
+
+
+def cle(espace_id, semaine):
+    return f'occupation:{espace_id}:{semaine.isoformat()}'
+
+
+def invalider(espace_id, date_debut, date_fin):
+    """Efface les matrices de l'espace pour les semaines de [date_debut, date_fin]."""
+    cache.delete_many([
+        cle(espace_id, semaine)
+        for semaine in semaines(timezone.localdate(date_debut), timezone.localdate(date_fin))
+    ])
+
+
+def heure_locale(moment, fuseau):
+    """Heure naïve de `moment` dans `fuseau` (lu une fois par l'appelant pour toute une boucle)."""
+    return moment.astimezone(fuseau).replace(tzinfo=None)
+
+
+def _repartir(differences, partiels, debut, fin):
+    """Ajoute l'intervalle [debut, fin) (minutes depuis lundi 0 h) à la matrice."""
+    heure_debut, heure_fin = int(debut // 60), int(fin // 60)
+    if heure_debut == heure_fin:
+        if heure_debut < HEURES_SEMAINE:
+            partiels[heure_debut] += (fin - debut) / 60
+        return
+    partiels[heure_debut] += (60 * (heure_debut + 1) - debut) / 60
+    # Heures pleines : heure_debut + 1 .. heure_fin - 1
+    differences[heure_debut + 1] += 1
+    differences[heure_fin] -= 1
+    if heure_fin < HEURES_SEMAINE:
+        partiels[heure_fin] += (fin - 60 * heure_fin) / 60
+
+
+def calculer(paires):
+    """Matrices {(espace_id, lundi): [168 fractions]} des paires demandées, en une requête."""
+    paires = set(paires)
+    if not paires:
+        return {}
+    premiere = min(semaine for _, semaine in paires)
+    apres_derniere = max(semaine for _, semaine in paires) + timedelta(weeks=1)
+    differences = {paire: [0] * (HEURES_SEMAINE + 1) for paire in paires}
+    partiels = {paire: [0.0] * HEURES_SEMAINE for paire in paires}
+    lignes = Reservation.objects.filter(
+        espace_id__in={espace_id for espace_id, _ in paires},
+        statut='confirmee',
+        date_debut__lt=timezone.make_aware(datetime.combine(apres_derniere, time())),
+        date_fin__gt=timezone.make_aware(datetime.combine(premiere, time())),
+    ).values_list('espace_id', 'date_debut', 'date_fin')
+    # Fuseau lu une fois : timezone.localtime() le relit à chaque appel
+    fuseau = timezone.get_current_timezone()
+    for espace_id, date_debut, date_fin in lignes.iterator():
+        debut, fin = heure_locale(date_debut, fuseau), heure_locale(date_fin, fuseau)
+        semaine = lundi(debut.date())
+        origine = datetime.combine(semaine, time())
+        # Une réservation à cheval sur deux semaines est coupée au lundi 0 h
+        while origine < fin:
+            paire = (espace_id, semaine)
+            if paire in paires:
+                _repartir(
+                    differences[paire], partiels[paire],
+                    max(0, (debut - origine).total_seconds() / 60),
+                    min(MINUTES_SEMAINE, (fin - origine).total_seconds() / 60),
+                )
+            semaine += timedelta(weeks=1)
+            origine += timedelta(weeks=1)
+    return {
+        paire: [
+            min(1.0, round(pleines + partiel, 4))
+            for pleines, partiel in zip(accumulate(differences[paire][:HEURES_SEMAINE]), partiels[paire])
+        ]
+        for paire in paires
+    }
+
+
+def matrices(espace_ids, debut, fin):
+    """{espace_id: {lundi: [168 fractions]}} pour les semaines de [debut, fin] (dates).
+
+    Les matrices en cache sont lues en un get_many ; les manquantes sont
+    calculées ensemble (une requête) puis mises en cache.
+    """
+    liste = semaines(debut, fin)
+    if len(liste) > MAX_SEMAINES:
+        raise ValueError(f"Période trop longue : au plus {MAX_SEMAINES} semaines")
+    paires = {cle(espace_id, semaine): (espace_id, semaine) for espace_id in espace_ids for semaine in liste}
+    trouvees = cache.get_many(paires)
+    manquantes = [paire for nom, paire in paires.items() if nom not in trouvees]
+    calculees = calculer(manquantes)
+    if calculees:
+        cache.set_many({cle(*paire): matrice for paire, matrice in calculees.items()}, DUREE)
+    resultat = {espace_id: {} for espace_id in espace_ids}
+    for nom, (espace_id, semaine) in paires.items():
+        resultat[espace_id][semaine] = trouvees[nom] if nom in trouvees else calculees[(espace_id, semaine)]
+    return resultat
+
+
+def moyenne(liste):
+    """Moyenne case par case d'une liste de matrices (168 zéros si la liste est vide)."""
+    if not liste:
+        return [0.0] * HEURES_SEMAINE
+    return [round(sum(cases) / len(liste), 4) for cases in zip(*liste)]
+
+
+@dataclass(frozen=True)
+class Occupation:
+    """Occupation moyenne d'un espace (ou de plusieurs) sur une période."""
+    heures: list
+
+    @property
+    def jours(self):
+        """7 listes de 24 fractions (lundi d'abord)."""
+        return [self.heures[jour * 24:(jour + 1) * 24] for jour in range(7)]
+
+    @property
+    def taux(self):
+        """Part des heures d'ouverture occupées, de 0 à 1."""
+        ouverture, fermeture = HEURES_OUVERTURE
+        cases = [heures[ouverture:fermeture] for heures in self.jours]
+        return round(sum(map(sum, cases)) / sum(map(len, cases)), 4)
+
+
+def occupation(espace_ids, debut, fin):
+    """{espace_id: Occupation} sur les semaines de [debut, fin] (dates)."""
+    return {
+        espace_id: Occupation(moyenne(list(par_semaine.values())))
+        for espace_id, par_semaine in matrices(espace_ids, debut, fin).items()
+    }
+
+
+def taux_periode(espace_ids, debut, fin):
+    """{espace_id: taux} sur les seuls jours de [debut, fin] (dates), de 0 à 1.
+
+    occupation() moyenne des semaines entières : ici les jours de ces semaines
+    hors de la période ne comptent pas.
+    """
+    ouverture, fermeture = HEURES_OUVERTURE
+    jours = [debut + timedelta(days=rang) for rang in range((fin - debut).days + 1)]
+    resultat = {}
+    for espace_id, par_semaine in matrices(espace_ids, debut, fin).items():
+        cases = [
+            par_semaine[lundi(jour)][jour.weekday() * 24 + ouverture:jour.weekday() * 24 + fermeture]
+            for jour in jours
+        ]
+        resultat[espace_id] = round(sum(map(sum, cases)) / sum(map(len, cases)), 4) if cases else 0.0
+    return resultat
+
+
+def occupation_globale(occupations):
+    """Occupation moyenne de tous les espaces de `occupations`."""
+    return Occupation(moyenne([valeur.heures for valeur in occupations.values()]))
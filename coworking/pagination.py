@@ -0,0 +1,154 @@
+"""
+Pagination par clé (keyset) des listes de l'espace gestionnaire.
+
+Une page est lue par « WHERE (cle, id) < (dernière valeur vue) ORDER BY cle
+DESC, id DESC LIMIT n » : la base descend directement dans l'index au lieu de
+sauter OFFSET lignes, donc la page 10 000 coûte autant que la première. Les
+curseurs (?apres= / ?avant=) sont opaques et encodent la clé de la dernière
+(ou première) ligne affichée.
+
+Le total est optionnel : COUNT exact avec ?compte=exact, sinon estimation du
+planificateur sous PostgreSQL et COUNT plafonné ailleurs.
+"""
+import base64
+import json
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+TAILLE_PAGE = getattr(settings, 'PAGINATION_TAILLE_PAGE', 50)
+# Au-delà, le total est donné comme approché (« ~N »)
+PLAFOND_COMPTE = getattr(settings, 'PAGINATION_PLAFOND_COMPTE', 10_000)
+
+
+@dataclass(frozen=True)
+class Compte:
+    total: int
+    approximatif: bool = False
+
+    def __str__(self):
+        return f"~{self.total}" if self.approximatif else str(self.total)
+
+
+@dataclass
+class Page:
+    elements: list
+    suivant: str = None
+    precedent: str = None
+    total: Compte = None
+    # Paramètres GET courants sans les curseurs, pour construire les liens
+    parametres: str = ''
+
+    def __iter__(self):
+        return iter(self.elements)
+
+    def __len__(self):
+        return len(self.elements)
+
+    def __bool__(self):
+        return bool(self.elements)
+
+    @property
+    def a_autres_pages(self):
+        return bool(self.suivant or self.precedent)
+
+
+def encoder_curseur(valeurs):
+    brut = json.dumps([str(valeur) for valeur in valeurs])
+    return base64.urlsafe_b64encode(brut.encode()).decode()
+
+
+def decoder_curseur(curseur, champs):
+    """Retourne les valeurs typées de la clé, ou None si le curseur est invalide."""
+    try:
+        valeurs = json.loads(base64.urlsafe_b64decode(curseur.encode()).decode())
+        if len(valeurs) != len(champs):
+            return None
+        return [champ.to_python(valeur) for champ, valeur in zip(champs, valeurs)]
+    except (ValueError, TypeError, UnicodeError, ValidationError):
+        return None
+
+
+def _apres(noms, valeurs, sens):
+    """Condition « (noms) < (valeurs) » (sens='lt') ou « > » (sens='gt') sur une clé composée."""
+    condition = Q()
+    egalites = {}
+    for nom, valeur in zip(noms, valeurs):
+        condition |= Q(**egalites, **{f'{nom}__{sens}': valeur})
+        egalites[nom] = valeur
+    return condition
+
+
+def compter(queryset, approximatif=True):
+    """Nombre de lignes du queryset, exact ou approché (Compte)."""
+    if not approximatif:
+        return Compte(queryset.count())
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return Compte(int(plan[0]['Plan']['Plan Rows']), approximatif=True)
+    total = queryset.order_by()[:PLAFOND_COMPTE + 1].count()
+    return Compte(min(total, PLAFOND_COMPTE), approximatif=total > PLAFOND_COMPTE)
+
+
+def compte_demande_exact(request):
+    return request.GET.get('compte') == 'exact'
+
+
+def paginer(request, queryset, cle=('-id',), taille=TAILLE_PAGE, compte=True):
+    """Page de `queryset` ordonnée par `cle` (champs uniques ensemble, '-' pour décroissant).
+
+    Lit ?apres=, ?avant= et ?compte=exact dans request.GET.
+    """
+    noms = [nom.lstrip('-') for nom in cle]
+    descendant = cle[0].startswith('-')
+    if any(nom.startswith('-') != descendant for nom in cle):
+        raise ValueError("Tous les champs de la clé doivent avoir le même sens")
+    champs = [queryset.model._meta.get_field(nom) for nom in noms]
+
+    position, recule = None, False
+    if request.GET.get('avant'):
+        position = decoder_curseur(request.GET['avant'], champs)
+        recule = position is not None
+    if position is None and request.GET.get('apres'):
+        position = decoder_curseur(request.GET['apres'], champs)
+
+    lignes = queryset
+    if position is not None:
+        # En avançant, on cherche les lignes qui suivent la position dans l'ordre d'affichage
+        sens = 'lt' if descendant != recule else 'gt'
+        # La borne sur le premier champ seul aide le planificateur à utiliser l'index
+        lignes = lignes.filter(**{f'{noms[0]}__{sens}e': position[0]}).filter(_apres(noms, position, sens))
+    ordre = [nom.lstrip('-') if descendant else f'-{nom}' for nom in cle] if recule else cle
+    elements = list(lignes.order_by(*ordre)[:taille + 1])
+
+    encore = len(elements) > taille
+    elements = elements[:taille]
+    if recule:
+        elements.reverse()
+
+    def curseur(element):
+        return encoder_curseur([getattr(element, champ.attname) for champ in champs])
+
+    suivant = precedent = None
+    if elements:
+        if recule:
+            suivant = curseur(elements[-1])
+            precedent = curseur(elements[0]) if encore else None
+        else:
+            suivant = curseur(elements[-1]) if encore else None
+            precedent = curseur(elements[0]) if position is not None else None
+
+    parametres = request.GET.copy()
+    for nom in ('apres', 'avant'):
+        parametres.pop(nom, None)
+
+    return Page(
+        elements=elements,
+        suivant=suivant,
+        precedent=precedent,
+        total=compter(queryset, approximatif=not compte_demande_exact(request)) if compte else None,
+        parametres=parametres.urlencode(),
+    )
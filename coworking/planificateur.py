@@ -0,0 +1,89 @@
+"""
+Tâches périodiques exécutées dans le processus web.
+
+Si PLANIFICATEUR_ACTIF est vrai, CoworkingConfig.ready() démarre un thread
+qui lance chaque tâche enregistrée à son intervalle. Chaque exécution est
+chronométrée et enregistrée dans MetriqueTache. Les tâches doivent rester
+idempotentes : avec plusieurs processus, chacun a son planificateur.
+Sans planificateur, les mêmes tâches se lancent par cron via leurs commandes.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import MetriqueTache
+
+logger = logging.getLogger(__name__)
+
+ACTIF = getattr(settings, 'PLANIFICATEUR_ACTIF', False)
+# Intervalle (secondes) du passage des factures échues en retard
+INTERVALLE_FACTURES_EN_RETARD = getattr(settings, 'PLANIFICATEUR_INTERVALLE_FACTURES_EN_RETARD', 3600)
+
+
+def executer(nom, fonction, *args, **kwargs):
+    """Lance une tâche, enregistre sa durée et son nombre de lignes ; retourne la MetriqueTache.
+
+    `fonction` retourne le nombre de lignes traitées.
+    """
+    debut = timezone.now()
+    depart = time.perf_counter()
+    lignes, erreur = 0, ''
+    try:
+        lignes = fonction(*args, **kwargs) or 0
+    except Exception as exc:
+        logger.exception("Échec de la tâche %s", nom)
+        erreur = repr(exc)
+    duree_ms = int((time.perf_counter() - depart) * 1000)
+    logger.info("Tâche %s : %s ligne(s) en %s ms", nom, lignes, duree_ms)
+    return MetriqueTache.objects.create(nom=nom, debut=debut, duree_ms=duree_ms, lignes=lignes, erreur=erreur)
+
+
+class Planificateur:
+    """Lance des tâches à intervalle fixe depuis un thread démon."""
+
+    def __init__(self):
+        self._taches = {}
+        self._arret = threading.Event()
+        self._thread = None
+
+    def ajouter(self, nom, fonction, intervalle):
+        self._taches[nom] = (fonction, intervalle)
+
+    def _boucle(self):
+        prochaines = {nom: time.monotonic() for nom in self._taches}
+        while not self._arret.is_set():
+            maintenant = time.monotonic()
+            for nom, (fonction, intervalle) in self._taches.items():
+                if maintenant >= prochaines[nom]:
+                    close_old_connections()
+                    executer(nom, fonction)
+                    prochaines[nom] = time.monotonic() + intervalle
+            close_old_connections()
+            self._arret.wait(max(min(prochaines.values()) - time.monotonic(), 1))
+
+    def demarrer(self):
+        if self._thread is None and self._taches:
+            self._arret.clear()
+            self._thread = threading.Thread(target=self._boucle, name='planificateur', daemon=True)
+            self._thread.start()
+
+    def arreter(self):
+        self._arret.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+planificateur = Planificateur()
+
+
+def configurer():
+    """Enregistre les tâches de l'application et démarre le planificateur."""
+    from .factures import marquer_factures_en_retard
+
+    planificateur.ajouter('factures_en_retard', marquer_factures_en_retard, INTERVALLE_FACTURES_EN_RETARD)
+    planificateur.demarrer()
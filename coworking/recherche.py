@@ -0,0 +1,283 @@
+"""
+Index de recherche des membres (nom, email, entreprise, téléphone).
+
+Chaque utilisateur a un « document » normalisé (minuscules, sans accents)
+dans une table d'index créée par la migration 0002_recherche_membres :
+
+- SQLite : table virtuelle FTS5 avec le tokenizer trigram, plus une table
+  des variantes de chaque mot du vocabulaire privé d'une lettre, qui
+  retrouve les mots à une faute de frappe près ;
+- PostgreSQL : table ordinaire avec un index GIN pg_trgm, dont la
+  similarité de mot (<%) sert aux fautes de frappe.
+
+Une recherche cherche d'abord les documents contenant chaque mot (préfixe ou
+sous-chaîne), puis, s'il manque des résultats, les documents où un mot est
+remplacé par un mot proche. Les signaux de User et ProfilMembre tiennent
+l'index à jour.
+"""
+import re
+import threading
+import unicodedata
+
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.db.models import Q
+
+TABLE = 'coworking_recherche_membre'
+TABLE_VARIANTES = 'coworking_recherche_variante'
+TAILLE_LOT = 2000
+# Les mots plus courts ne sont pas corrigés : trop de voisins
+LONGUEUR_MIN_CORRECTION = 4
+CORRECTIONS_PAR_MOT = 5
+
+
+def normaliser(texte):
+    """Minuscules sans accents."""
+    texte = texte or ''
+    if texte.isascii():
+        return texte.lower()
+    decompose = unicodedata.normalize('NFKD', texte)
+    return ''.join(c for c in decompose if not unicodedata.combining(c)).lower()
+
+
+def termes(requete):
+    """Mots normalisés de la requête, sans guillemets (syntaxe FTS5)."""
+    return [mot for mot in normaliser(requete).replace('"', ' ').split() if mot]
+
+
+def echapper_like(mot):
+    """Mot cherché littéralement par LIKE ... ESCAPE '\\' : % et _ ne sont pas des jokers."""
+    return mot.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def vocabulaire(document):
+    """Mots alphabétiques du document assez longs pour être corrigés."""
+    return {mot for mot in re.findall(r'[a-z]+', document) if len(mot) >= LONGUEUR_MIN_CORRECTION}
+
+
+def variantes(mot):
+    """Le mot et ses formes privées d'une lettre."""
+    return {mot} | {mot[:i] + mot[i + 1:] for i in range(len(mot))}
+
+
+def distance(a, b):
+    """Distance d'édition comptant une transposition de lettres voisines pour 1."""
+    avant, precedente = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        ligne = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            ligne[j] = min(precedente[j] + 1, ligne[j - 1] + 1, precedente[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                ligne[j] = min(ligne[j], avant[j - 2] + 1)
+        avant, precedente = precedente, ligne
+    return precedente[-1]
+
+
+def pertinence(mots, document):
+    """Clé de tri : d'abord les mots trouvés en début de mot, puis les documents courts."""
+    debuts = sum(1 for mot in mots if re.search(rf'(?<![a-z0-9]){re.escape(mot)}', document))
+    return -debuts, len(document)
+
+
+def documents(user_ids=None):
+    """(user_id, document) pour les utilisateurs donnés (tous par défaut), en flux."""
+    utilisateurs = User.objects.order_by()
+    if user_ids is not None:
+        utilisateurs = utilisateurs.filter(id__in=user_ids)
+    lignes = utilisateurs.values_list(
+        'id', 'username', 'first_name', 'last_name', 'email',
+        'profilmembre__entreprise', 'profilmembre__telephone',
+    )
+    for user_id, username, prenom, nom, email, entreprise, telephone in lignes.iterator(chunk_size=TAILLE_LOT):
+        telephone = telephone or ''
+        chiffres = ''.join(c for c in telephone if c.isdigit())
+        yield user_id, normaliser(' '.join(filter(None, (
+            username, prenom, nom, email, entreprise, telephone, chiffres,
+        ))))
+
+
+def _par_lots(elements, taille=TAILLE_LOT):
+    lot = []
+    for element in elements:
+        lot.append(element)
+        if len(lot) >= taille:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+class IndexMembres:
+    """Recherche sans index dédié (autres bases) : icontains sur les champs."""
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def connexion(self):
+        return connections[self.alias]
+
+    def reconstruire(self):
+        self.indexer(None)
+
+    def indexer(self, user_ids):
+        """Met à jour les documents des utilisateurs donnés (tous si None)."""
+
+    def retirer(self, user_ids):
+        """Supprime les documents des utilisateurs donnés."""
+
+    def rechercher(self, requete, limite=10):
+        """Identifiants des utilisateurs correspondant à la requête, les meilleurs d'abord."""
+        filtre = Q()
+        for mot in requete.split():
+            filtre &= (
+                Q(username__icontains=mot) | Q(first_name__icontains=mot) | Q(last_name__icontains=mot)
+                | Q(email__icontains=mot) | Q(profilmembre__entreprise__icontains=mot)
+                | Q(profilmembre__telephone__icontains=mot)
+            )
+        return list(User.objects.filter(filtre).values_list('id', flat=True)[:limite])
+
+    def _courts(self, mots, limite):
+        """Mots de moins de 3 lettres (sans trigramme) : recherche sans index."""
+        return IndexMembres.rechercher(self, ' '.join(mots), limite)
+
+    @staticmethod
+    def _trier(mots, candidats, limite, exclus=()):
+        """Identifiants des `limite` meilleurs candidats (user_id, document)."""
+        tries = sorted(
+            (pertinence(mots, document), user_id) for user_id, document in candidats if user_id not in exclus
+        )
+        return [user_id for _, user_id in tries[:limite]]
+
+
+class IndexSQLite(IndexMembres):
+
+    def indexer(self, user_ids):
+        # Une seule transaction : sinon chaque ligne insérée est validée séparément
+        with transaction.atomic(using=self.alias), self.connexion.cursor() as curseur:
+            if user_ids is None:
+                curseur.execute(f"DELETE FROM {TABLE}")
+                curseur.execute(f"DELETE FROM {TABLE_VARIANTES}")
+            else:
+                self.retirer(user_ids)
+            for lot in _par_lots(documents(user_ids)):
+                curseur.executemany(f"INSERT INTO {TABLE}(rowid, document) VALUES (%s, %s)", lot)
+                # Le vocabulaire ne fait que grandir (jusqu'à la prochaine
+                # reconstruction) : un mot disparu ne produit qu'une correction sans résultat.
+                mots = set().union(*(vocabulaire(document) for _, document in lot))
+                curseur.executemany(
+                    f"INSERT OR IGNORE INTO {TABLE_VARIANTES}(variante, mot) VALUES (%s, %s)",
+                    [(variante, mot) for mot in mots for variante in variantes(mot)],
+                )
+
+    def retirer(self, user_ids):
+        with self.connexion.cursor() as curseur:
+            for morceau in _par_lots(user_ids, 500):
+                curseur.execute(
+                    f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join(['%s'] * len(morceau))})", morceau
+                )
+
+    def _correspondances(self, curseur, groupes, limite):
+        """(rowid, document) contenant, pour chaque groupe, l'un de ses mots."""
+        expression = ' AND '.join('(' + ' OR '.join(f'"{mot}"' for mot in groupe) + ')' for groupe in groupes)
+        # Pas de ORDER BY rank : classer toutes les correspondances d'un mot
+        # fréquent coûte bien plus cher que trier les premières en Python.
+        curseur.execute(
+            f"SELECT rowid, document FROM {TABLE} WHERE {TABLE} MATCH %s LIMIT %s", [expression, limite * 5]
+        )
+        return curseur.fetchall()
+
+    def _corrections(self, curseur, mot):
+        """Mots du vocabulaire à une faute de frappe de `mot` (suppression, ajout, substitution, inversion)."""
+        if len(mot) < LONGUEUR_MIN_CORRECTION:
+            return []
+        cherchees = sorted(variantes(mot))
+        curseur.execute(
+            f"SELECT DISTINCT mot FROM {TABLE_VARIANTES} "
+            f"WHERE variante IN ({', '.join(['%s'] * len(cherchees))})",
+            cherchees,
+        )
+        # Deux mots partageant une variante peuvent être à distance 2 : on filtre
+        proches = sorted(
+            (distance(mot, candidat), candidat) for (candidat,) in curseur.fetchall() if candidat != mot
+        )
+        return [candidat for ecart, candidat in proches if ecart <= 1][:CORRECTIONS_PAR_MOT]
+
+    def rechercher(self, requete, limite=10):
+        mots = termes(requete)
+        longs = [mot for mot in mots if len(mot) >= 3]
+        if not longs:
+            return self._courts(mots, limite) if mots else []
+        with self.connexion.cursor() as curseur:
+            ids = self._trier(longs, self._correspondances(curseur, [[mot] for mot in longs], limite), limite)
+            if len(ids) >= limite:
+                return ids
+            groupes = [[mot, *self._corrections(curseur, mot)] for mot in longs]
+            if all(len(groupe) == 1 for groupe in groupes):
+                return ids
+            candidats = self._correspondances(curseur, groupes, limite)
+            corriges = [mot for groupe in groupes for mot in groupe]
+            return ids + self._trier(corriges, candidats, limite - len(ids), exclus=set(ids))
+
+
+class IndexPostgres(IndexMembres):
+
+    def indexer(self, user_ids):
+        requete = (
+            f"INSERT INTO {TABLE} (user_id, document) VALUES (%s, %s) "
+            f"ON CONFLICT (user_id) DO UPDATE SET document = EXCLUDED.document"
+        )
+        with transaction.atomic(using=self.alias), self.connexion.cursor() as curseur:
+            if user_ids is None:
+                curseur.execute(f"TRUNCATE {TABLE}")
+            for lot in _par_lots(documents(user_ids)):
+                curseur.executemany(requete, lot)
+
+    def retirer(self, user_ids):
+        with self.connexion.cursor() as curseur:
+            curseur.execute(f"DELETE FROM {TABLE} WHERE user_id = ANY(%s)", [list(user_ids)])
+
+    def rechercher(self, requete, limite=10):
+        mots = termes(requete)
+        longs = [mot for mot in mots if len(mot) >= 3]
+        if not longs:
+            return self._courts(mots, limite) if mots else []
+        with self.connexion.cursor() as curseur:
+            # Sous-chaînes : LIKE '%mot%' est servi par l'index trigramme ;
+            # les premières correspondances sont triées en Python, comme sous SQLite.
+            conditions = ' AND '.join(["document LIKE %s ESCAPE '\\'"] * len(longs))
+            curseur.execute(
+                f"SELECT user_id, document FROM {TABLE} WHERE {conditions} LIMIT %s",
+                [f'%{echapper_like(mot)}%' for mot in longs] + [limite * 5],
+            )
+            ids = self._trier(longs, curseur.fetchall(), limite)
+            if len(ids) >= limite:
+                return ids
+            # Fautes de frappe : opérateur <% de pg_trgm (similarité de mot), servi par l'index
+            texte = ' '.join(longs)
+            curseur.execute(
+                f"SELECT user_id FROM {TABLE} WHERE %s <%% document "
+                f"ORDER BY word_similarity(%s, document) DESC LIMIT %s",
+                [texte, texte, limite + len(ids)],
+            )
+            vus = set(ids)
+            return ids + [user_id for (user_id,) in curseur.fetchall() if user_id not in vus][:limite - len(ids)]
+
+
+_index = {}
+_verrou_index = threading.Lock()
+
+
+def index_membres(alias='default'):
+    """Index adapté à la base `alias` (une instance par base)."""
+    with _verrou_index:
+        if alias not in _index:
+            classe = {'sqlite': IndexSQLite, 'postgresql': IndexPostgres}.get(
+                connections[alias].vendor, IndexMembres
+            )
+            _index[alias] = classe(alias)
+        return _index[alias]
+
+
+def rechercher_membres(requete, limite=10):
+    return index_membres().rechercher(requete, limite)
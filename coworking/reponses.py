@@ -0,0 +1,109 @@
+"""
+Optimisation des réponses : compression et requêtes conditionnelles.
+
+CompressionMiddleware compresse en gzip les réponses texte (HTML, JSON, CSV,
+CSS/JS) à partir de COMPRESSION_TAILLE_MIN octets ; en dessous, ou pour un
+type déjà compressé ou un flux d'événements, la réponse part telle quelle.
+
+condition_modeles() rend une vue conditionnelle sans calculer son corps :
+l'ETag faible est tiré des versions des modèles dont dépend la page (voir
+coworking.cache_modeles), de ses arguments et de l'utilisateur de la session ;
+Last-Modified, envoyé aux seuls anonymes, est la dernière invalidation de ces
+modèles. Comme les entrées de cache_modeles, l'un et l'autre changent aussi
+toutes les CACHE_MODELES_DUREE secondes (pages qui dépendent de l'heure,
+écritures hors signaux). Un navigateur qui revalide une page inchangée
+reçoit un 304 avant que la vue ne s'exécute. Les autres pages passent par
+ConditionalGetMiddleware, qui hache leur corps et ne leur épargne que les
+octets transférés.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import cache_modeles
+from .roles import version_role
+
+# En dessous, le gain ne compense ni l'en-tête gzip ni le temps de compression
+TAILLE_MIN = getattr(settings, 'COMPRESSION_TAILLE_MIN', 1024)
+TYPES_COMPRESSIBLES = frozenset(getattr(settings, 'COMPRESSION_TYPES', (
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+)))
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware limité aux réponses texte d'au moins TAILLE_MIN octets."""
+
+    def process_response(self, request, response):
+        type_contenu = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if type_contenu not in TYPES_COMPRESSIBLES:
+            return response
+        if not response.streaming and len(response.content) < TAILLE_MIN:
+            return response
+        return super().process_response(request, response)
+
+
+def _periode():
+    """Début (timestamp) de la période de CACHE_MODELES_DUREE secondes en cours."""
+    return int(time.time() // cache_modeles.DUREE * cache_modeles.DUREE)
+
+
+def etag_page(nom, modeles, request, *args, **kwargs):
+    """ETag faible de la page `nom` pour cette requête, sans requête SQL.
+
+    Le gabarit de base affiche l'utilisateur connecté et un jeton CSRF : l'ETag
+    dépend donc aussi de la session (utilisateur, rôle) et du cookie CSRF.
+    Aucun ETag quand des messages attendent d'être affichés, ni quand le cache
+    ne garde pas les versions (DummyCache) : la page ne serait jamais invalidée.
+    """
+    if len(messages.get_messages(request)):
+        return None
+    versions = cache_modeles.versions(modeles)
+    if None in versions:
+        return None
+    user_id = request.session.get(SESSION_KEY)
+    empreinte = hashlib.md5(repr((
+        versions, _periode(), args, sorted(kwargs.items()),
+        sorted(request.GET.lists()),
+        user_id, request.session.get(HASH_SESSION_KEY), user_id and version_role(user_id),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+    )).encode()).hexdigest()
+    return f'W/"{nom}-{empreinte}"'
+
+
+def condition_modeles(nom, modeles):
+    """Décorateur : ETag / Last-Modified de la vue tirés des versions de `modeles`.
+
+    Les pages restent à revalider à chaque visite (Cache-Control: private,
+    no-cache) : le 304 coûte une lecture du cache au lieu de la vue entière.
+    """
+    def etag(request, *args, **kwargs):
+        return etag_page(nom, modeles, request, *args, **kwargs)
+
+    def derniere_modification(request, *args, **kwargs):
+        # Le contenu dépend de l'utilisateur connecté : la date seule ne suffit pas
+        if request.session.get(SESSION_KEY):
+            return None
+        modification = cache_modeles.derniere_modification(modeles)
+        if modification is None:
+            return None
+        return max(modification, datetime.fromtimestamp(_periode(), tz=timezone.utc))
+
+    def decorateur(vue):
+        vue_conditionnelle = condition(etag_func=etag, last_modified_func=derniere_modification)(vue)
+
+        @wraps(vue)
+        def enveloppe(request, *args, **kwargs):
+            reponse = vue_conditionnelle(request, *args, **kwargs)
+            patch_cache_control(reponse, private=True, no_cache=True)
+            return reponse
+        return enveloppe
+    return decorateur
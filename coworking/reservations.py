@@ -0,0 +1,251 @@
+"""
+Service de réservation atomique.
+
+La vérification des conflits et l'écriture se font dans une même transaction,
+après avoir verrouillé la ligne de l'espace : deux demandes concurrentes sur un
+même espace sont donc traitées l'une après l'autre, et jamais deux
+réservations confirmées ne se chevauchent.
+
+Une série récurrente (reserver_serie) suit le même schéma : toutes ses
+occurrences sont confrontées aux réservations existantes en une requête,
+puis les occurrences libres sont insérées en un bulk_create.
+"""
+import calendar
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import cache_modeles, occupation, tarifs
+from .disponibilite import STATUTS_BLOQUANTS, conflits_en_base, moteur
+from .models import EspaceTravail, HistoriqueReservation, Reservation, SerieReservation
+
+# Nombre maximal d'occurrences d'une série (un an de réservations quotidiennes)
+MAX_OCCURRENCES = getattr(settings, 'RESERVATION_SERIE_MAX_OCCURRENCES', 366)
+
+
+@dataclass(frozen=True)
+class ResultatReservation:
+    """Résultat d'une demande de réservation ou de changement de statut."""
+    OK = 'ok'
+    CONFLIT = 'conflit'
+    INDISPONIBLE = 'indisponible'
+
+    statut: str
+    reservation: Reservation = None
+    conflits: list = field(default_factory=list)
+
+    @property
+    def succes(self):
+        return self.statut == self.OK
+
+
+def verrouiller_espace(espace_id):
+    """Verrouille la ligne de l'espace jusqu'à la fin de la transaction en cours.
+
+    SELECT ... FOR UPDATE quand la base le permet ; sinon (SQLite) une mise à
+    jour neutre, qui prend le verrou d'écriture avant toute lecture.
+    """
+    if connection.features.has_select_for_update:
+        return EspaceTravail.objects.select_for_update().filter(pk=espace_id).values_list('disponible', flat=True).first()
+    if EspaceTravail.objects.filter(pk=espace_id).update(disponible=F('disponible')):
+        return EspaceTravail.objects.filter(pk=espace_id).values_list('disponible', flat=True).first()
+    return None
+
+
+def reserver(membre, espace, date_debut, date_fin, statut='en_attente'):
+    """Crée une réservation si le créneau est libre ; retourne un ResultatReservation."""
+    with transaction.atomic():
+        disponible = verrouiller_espace(espace.pk)
+        if not disponible:
+            return ResultatReservation(ResultatReservation.INDISPONIBLE)
+        if statut in STATUTS_BLOQUANTS:
+            conflits = conflits_en_base(espace.pk, date_debut, date_fin)
+            if conflits:
+                return ResultatReservation(ResultatReservation.CONFLIT, conflits=conflits)
+        reservation = Reservation.objects.create(
+            membre=membre,
+            espace=espace,
+            date_debut=date_debut,
+            date_fin=date_fin,
+            statut=statut,
+            prix_total=tarifs.prix(espace, date_debut, date_fin, tarifs.abonnement(membre)),
+        )
+    return ResultatReservation(ResultatReservation.OK, reservation=reservation)
+
+
+def changer_statut(reservation, nouveau_statut):
+    """Change le statut d'une réservation ; la confirmation vérifie les conflits sous verrou."""
+    with transaction.atomic():
+        verrouiller_espace(reservation.espace_id)
+        if nouveau_statut in STATUTS_BLOQUANTS:
+            conflits = conflits_en_base(
+                reservation.espace_id, reservation.date_debut, reservation.date_fin,
+                exclure=reservation.pk,
+            )
+            if conflits:
+                return ResultatReservation(ResultatReservation.CONFLIT, reservation=reservation, conflits=conflits)
+        ancien_statut = reservation.statut
+        reservation.statut = nouveau_statut
+        reservation.save(update_fields=['statut'])
+        HistoriqueReservation.objects.create(
+            reservation=reservation,
+            action=f'Statut changé de "{ancien_statut}" à "{nouveau_statut}"'
+        )
+    return ResultatReservation(ResultatReservation.OK, reservation=reservation)
+
+
+@dataclass(frozen=True)
+class ResultatSerie:
+    """Résultat d'une demande de série : réservations créées et occurrences en conflit.
+
+    `conflits` liste les occurrences non créées : (début, fin, identifiants
+    des réservations qui les chevauchent).
+    """
+    OK = ResultatReservation.OK
+    CONFLIT = ResultatReservation.CONFLIT
+    INDISPONIBLE = ResultatReservation.INDISPONIBLE
+
+    statut: str
+    serie: SerieReservation = None
+    reservations: list = field(default_factory=list)
+    conflits: list = field(default_factory=list)
+
+    @property
+    def succes(self):
+        return self.statut == self.OK
+
+
+def _decaler(moment, frequence, periodes):
+    """`moment` (heure locale naïve) décalé de `periodes` jours, semaines ou mois.
+
+    None quand le mois visé n'a pas ce jour (un 31 en avril) : l'occurrence est sautée.
+    """
+    if frequence == 'quotidienne':
+        return moment + timedelta(days=periodes)
+    if frequence == 'hebdomadaire':
+        return moment + timedelta(weeks=periodes)
+    annee, mois = divmod(moment.month - 1 + periodes, 12)
+    annee += moment.year
+    if moment.day > calendar.monthrange(annee, mois + 1)[1]:
+        return None
+    return moment.replace(year=annee, month=mois + 1)
+
+
+def creneaux_serie(date_debut, date_fin, frequence, intervalle=1, nombre=None, jusqu_au=None, exceptions=()):
+    """Créneaux (début, fin) d'une série, dans l'ordre, dates d'`exceptions` retirées.
+
+    La série s'arrête après `nombre` occurrences (exceptions comprises) ou au
+    jour `jusqu_au`. Les occurrences gardent l'heure locale de la première :
+    une réunion de 9 h reste à 9 h après un changement d'heure.
+    """
+    if not nombre and not jusqu_au:
+        raise ValueError("Une série demande un nombre d'occurrences ou une date de fin")
+    if intervalle < 1:
+        raise ValueError("L'intervalle d'une série vaut au moins 1")
+    duree = date_fin - date_debut
+    premiere = timezone.localtime(date_debut).replace(tzinfo=None)
+    exceptions = set(exceptions)
+    creneaux = []
+    generees = 0
+    rang = 0
+    while not nombre or generees < nombre:
+        moment = _decaler(premiere, frequence, rang * intervalle)
+        rang += 1
+        if moment is None:
+            continue
+        if jusqu_au and moment.date() > jusqu_au:
+            break
+        generees += 1
+        if generees > MAX_OCCURRENCES:
+            raise ValueError(f"Une série compte au plus {MAX_OCCURRENCES} occurrences")
+        if moment.date() in exceptions:
+            continue
+        debut = timezone.make_aware(moment)
+        creneaux.append((debut, debut + duree))
+    return creneaux
+
+
+def conflits_creneaux(espace_id, creneaux):
+    """{rang du créneau: [identifiants]} des réservations bloquantes qui chevauchent
+    chacun des `creneaux` (triés, disjoints), en une requête.
+    """
+    if not creneaux:
+        return {}
+    chevauchements = Q()
+    for debut, fin in creneaux:
+        chevauchements |= Q(date_debut__lt=fin, date_fin__gt=debut)
+    lignes = Reservation.objects.filter(
+        chevauchements, espace_id=espace_id, statut__in=STATUTS_BLOQUANTS,
+    ).values_list('id', 'date_debut', 'date_fin')
+    fins = [fin for _, fin in creneaux]
+    conflits = {}
+    for pk, debut, fin in lignes:
+        # Premier créneau qui finit après le début de la réservation, puis les suivants qu'elle recouvre
+        rang = bisect_right(fins, debut)
+        while rang < len(creneaux) and creneaux[rang][0] < fin:
+            conflits.setdefault(rang, []).append(pk)
+            rang += 1
+    return conflits
+
+
+def _invalider_reservations(espace_id, date_debut, date_fin):
+    """Ce que font les signaux de Reservation, que bulk_create ne déclenche pas."""
+    def invalider():
+        moteur.invalider(espace_id)
+        cache_modeles.invalider(Reservation)
+        occupation.invalider(espace_id, date_debut, date_fin)
+    invalider()
+    transaction.on_commit(invalider)
+
+
+def reserver_serie(membre, espace, date_debut, date_fin, frequence, intervalle=1, nombre=None,
+                   jusqu_au=None, exceptions=(), statut='en_attente', tout_ou_rien=False):
+    """Crée une série et ses occurrences libres ; retourne un ResultatSerie.
+
+    Quel que soit le statut demandé, une occurrence qui chevauche une
+    réservation confirmée n'est pas créée et figure dans `conflits` ; avec
+    `tout_ou_rien`, un seul conflit annule toute la série. Une série dont
+    toutes les occurrences sont en conflit n'est pas créée.
+    """
+    creneaux = creneaux_serie(date_debut, date_fin, frequence, intervalle, nombre, jusqu_au, exceptions)
+    with transaction.atomic():
+        if not verrouiller_espace(espace.pk):
+            return ResultatSerie(ResultatSerie.INDISPONIBLE)
+        en_conflit = conflits_creneaux(espace.pk, creneaux)
+        conflits = [(*creneaux[rang], ids) for rang, ids in sorted(en_conflit.items())]
+        if en_conflit and (tout_ou_rien or len(en_conflit) == len(creneaux)):
+            return ResultatSerie(ResultatSerie.CONFLIT, conflits=conflits)
+        serie = SerieReservation.objects.create(
+            membre=membre,
+            espace=espace,
+            frequence=frequence,
+            intervalle=intervalle,
+            date_debut=date_debut,
+            date_fin=date_fin,
+            nombre_occurrences=nombre,
+            jusqu_au=jusqu_au,
+            exceptions=sorted(jour.isoformat() for jour in exceptions),
+        )
+        maintenant = timezone.now()
+        libres = [creneau for rang, creneau in enumerate(creneaux) if rang not in en_conflit]
+        prix = tarifs.devis([(espace, debut, fin) for debut, fin in libres], tarifs.abonnement(membre))
+        reservations = Reservation.objects.bulk_create([
+            Reservation(
+                membre=membre,
+                espace=espace,
+                serie=serie,
+                date_debut=debut,
+                date_fin=fin,
+                statut=statut,
+                prix_total=prix_total,
+                date_creation=maintenant,
+            )
+            for (debut, fin), prix_total in zip(libres, prix)
+        ])
+        _invalider_reservations(espace.pk, creneaux[0][0], creneaux[-1][1])
+    return ResultatSerie(ResultatSerie.OK, serie=serie, reservations=reservations, conflits=conflits)
@@ -0,0 +1,205 @@
+"""
+Revenus : cumuls journaliers tenus à jour au fil des écritures.
+
+RevenuJournalier garde, par jour, type d'espace et type d'abonnement, le
+nombre et le montant des factures émises (non annulées), de celles qui sont
+payées, et des paiements reçus (HistoriquePaiement). Un rapport sur une
+période quelconque additionne quelques centaines de ces lignes au lieu de
+parcourir les factures.
+
+Chaque écriture passe par une différence : l'état de la facture (ou du
+paiement) est lu avant et après l'enregistrement, et seul l'écart est
+ajouté aux lignes concernées par UPDATE ... SET x = x + écart. Les signaux
+couvrent save() et delete() ; facturer_reservations_en_attente, qui passe
+par bulk_create, appelle ajouter_factures(). marquer_factures_en_retard ne
+change aucun cumul (en attente et en retard comptent de la même façon).
+
+Le type d'espace et l'abonnement d'une facture sont lus au moment de
+l'écriture : si le membre change d'abonnement, ou si la réservation est
+supprimée, les écritures suivantes sur ses anciennes factures sont rangées
+sous la nouvelle ventilation. Les totaux restent exacts ; la commande
+reconstruire_revenus recalcule les cumuls depuis les tables.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Facture, HistoriquePaiement, RevenuJournalier
+
+MESURES = (
+    'nombre_factures', 'montant_emis', 'nombre_payees', 'montant_paye',
+    'nombre_paiements', 'montant_encaisse',
+)
+
+# Regroupements possibles d'un rapport : nom -> expression sur RevenuJournalier
+REGROUPEMENTS = {
+    'jour': F('jour'),
+    'mois': TruncMonth('jour'),
+    'type_espace': F('type_espace__nom'),
+    'abonnement': F('type_abonnement'),
+}
+
+CHAMPS_FACTURE = (
+    'date_creation', 'statut', 'montant_total',
+    'reservation__espace__type_espace_id', 'membre__profilmembre__type_abonnement',
+)
+CHAMPS_PAIEMENT = (
+    'date_paiement', 'montant',
+    'facture__reservation__espace__type_espace_id', 'facture__membre__profilmembre__type_abonnement',
+)
+
+
+def _ajouter(cumuls, cle, mesures):
+    ligne = cumuls.setdefault(cle, dict.fromkeys(MESURES, 0))
+    for nom, valeur in mesures.items():
+        ligne[nom] += valeur
+
+
+def _contributions_factures(factures, cumuls=None):
+    """Ajoute à `cumuls` ({(jour, type_espace_id, abonnement): {mesure: valeur}}) la part des factures."""
+    cumuls = {} if cumuls is None else cumuls
+    # Fuseau lu une fois : timezone.localdate() le relit à chaque appel
+    fuseau = timezone.get_current_timezone()
+    for date_creation, statut, montant, type_espace_id, abonnement in (
+        factures.values_list(*CHAMPS_FACTURE).iterator()
+    ):
+        if statut == 'annulee':
+            continue
+        payee = statut == 'payee'
+        _ajouter(cumuls, (date_creation.astimezone(fuseau).date(), type_espace_id, abonnement or ''), {
+            'nombre_factures': 1, 'montant_emis': montant,
+            'nombre_payees': int(payee), 'montant_paye': montant if payee else 0,
+        })
+    return cumuls
+
+
+def _contributions_paiements(paiements, cumuls=None):
+    cumuls = {} if cumuls is None else cumuls
+    fuseau = timezone.get_current_timezone()
+    for date_paiement, montant, type_espace_id, abonnement in paiements.values_list(*CHAMPS_PAIEMENT).iterator():
+        _ajouter(cumuls, (date_paiement.astimezone(fuseau).date(), type_espace_id, abonnement or ''), {
+            'nombre_paiements': 1, 'montant_encaisse': montant,
+        })
+    return cumuls
+
+
+def etat_facture(facture_id):
+    """Part actuelle de la facture dans les cumuls (une requête ; {} si elle n'existe pas)."""
+    return _contributions_factures(Facture.objects.filter(pk=facture_id))
+
+
+def etat_paiement(paiement_id):
+    return _contributions_paiements(HistoriquePaiement.objects.filter(pk=paiement_id))
+
+
+def difference(avant, apres):
+    """Écarts {cle: {mesure: écart}} entre deux états ; les clés sans écart sont omises."""
+    ecarts = {}
+    for cle in set(avant) | set(apres):
+        ligne = {
+            nom: apres.get(cle, {}).get(nom, 0) - avant.get(cle, {}).get(nom, 0)
+            for nom in MESURES
+        }
+        if any(ligne.values()):
+            ecarts[cle] = ligne
+    return ecarts
+
+
+def appliquer(ecarts):
+    """Ajoute les écarts aux lignes de cumul, créées au besoin."""
+    # Ordre fixe : deux transactions concurrentes verrouillent les lignes dans le même ordre
+    for (jour, type_espace_id, abonnement), ligne in sorted(
+        ecarts.items(), key=lambda item: (item[0][0], item[0][1] or 0, item[0][2])
+    ):
+        lignes = RevenuJournalier.objects.filter(jour=jour, type_espace_id=type_espace_id, type_abonnement=abonnement)
+        increments = {nom: F(nom) + valeur for nom, valeur in ligne.items() if valeur}
+        if lignes.update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                RevenuJournalier.objects.create(
+                    jour=jour, type_espace_id=type_espace_id, type_abonnement=abonnement, **ligne
+                )
+        except IntegrityError:
+            # Créée entre-temps par une transaction concurrente
+            lignes.update(**increments)
+
+
+def ajouter_factures(facture_ids):
+    """Compte des factures créées sans signal (bulk_create) ; une requête de lecture."""
+    if facture_ids:
+        appliquer(_contributions_factures(Facture.objects.filter(pk__in=facture_ids)))
+
+
+def detacher_type_espace(type_espace_id):
+    """Range sous « sans type » les cumuls d'un type d'espace sur le point d'être supprimé."""
+    lignes = RevenuJournalier.objects.filter(type_espace_id=type_espace_id)
+    with transaction.atomic():
+        appliquer({
+            (ligne['jour'], None, ligne['type_abonnement']): {nom: ligne[nom] for nom in MESURES}
+            for ligne in lignes.values('jour', 'type_abonnement', *MESURES)
+        })
+        lignes.delete()
+
+
+def _bornes(debut, fin):
+    """Filtres sur une date de création / de paiement pour les jours locaux [debut, fin]."""
+    filtres = {}
+    if debut:
+        filtres['gte'] = timezone.make_aware(datetime.combine(debut, time()))
+    if fin:
+        filtres['lt'] = timezone.make_aware(datetime.combine(fin + timedelta(days=1), time()))
+    return filtres
+
+
+def reconstruire(debut=None, fin=None):
+    """Recalcule depuis les tables les cumuls des jours [debut, fin] (tout, par défaut).
+
+    Retourne le nombre de lignes écrites.
+    """
+    bornes = _bornes(debut, fin)
+    factures = Facture.objects.filter(**{f'date_creation__{op}': v for op, v in bornes.items()})
+    paiements = HistoriquePaiement.objects.filter(**{f'date_paiement__{op}': v for op, v in bornes.items()})
+    lignes = RevenuJournalier.objects.all()
+    if debut:
+        lignes = lignes.filter(jour__gte=debut)
+    if fin:
+        lignes = lignes.filter(jour__lte=fin)
+    with transaction.atomic():
+        # Suppression d'abord : sous SQLite, le verrou d'écriture est pris avant les lectures
+        lignes.delete()
+        cumuls = _contributions_paiements(paiements, _contributions_factures(factures))
+        RevenuJournalier.objects.bulk_create([
+            RevenuJournalier(jour=jour, type_espace_id=type_espace_id, type_abonnement=abonnement, **mesures)
+            for (jour, type_espace_id, abonnement), mesures in cumuls.items()
+        ], batch_size=1000)
+    return len(cumuls)
+
+
+def _sommes():
+    return {nom: Sum(nom, default=0) for nom in MESURES}
+
+
+def totaux(debut, fin):
+    """{mesure: total} sur les jours [debut, fin] (une requête)."""
+    return RevenuJournalier.objects.filter(jour__range=(debut, fin)).aggregate(**_sommes())
+
+
+def rapport(debut, fin, par='mois'):
+    """Totaux des jours [debut, fin] regroupés selon `par` (clé de REGROUPEMENTS).
+
+    Retourne [{'groupe': valeur, mesure: total, ...}] trié par groupe.
+    """
+    if par not in REGROUPEMENTS:
+        raise ValueError(f"Regroupement inconnu : {par} (choix : {', '.join(REGROUPEMENTS)})")
+    return list(
+        RevenuJournalier.objects.filter(jour__range=(debut, fin))
+        .annotate(groupe=REGROUPEMENTS[par])
+        .values('groupe')
+        .annotate(**_sommes())
+        .order_by(F('groupe').asc(nulls_first=True))
+    )
+
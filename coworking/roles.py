@@ -0,0 +1,86 @@
+"""
+Rôle de l'utilisateur connecté (membre / gestionnaire), résolu une fois par requête.
+
+RoleMiddleware expose request.role, évalué à la première lecture : les vues
+qui ne s'en servent pas ne chargent ni la session ni l'utilisateur. Le rôle
+est gardé dans la session avec la version du rôle de l'utilisateur ; les
+signaux de RoleUtilisateur changent cette version (dans le cache), ce qui
+force une relecture à la requête suivante de toutes ses sessions. Le cache
+n'étant pas forcément partagé entre processus, et les update() en masse ne
+passant pas par les signaux, une entrée de session n'est de toute façon
+gardée que ROLE_DUREE_SESSION secondes.
+"""
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .models import RoleUtilisateur
+
+ROLE_DEFAUT = 'membre'
+CLE_SESSION = 'coworking_role'
+ROLE_DUREE_SESSION = getattr(settings, 'ROLE_DUREE_SESSION', 300)
+
+
+def cle_version(user_id):
+    return f'roles:version:{user_id}'
+
+
+def version_role(user_id):
+    """Version courante du rôle ; une nouvelle est tirée si le cache l'a perdue."""
+    cle = cle_version(user_id)
+    version = cache.get(cle)
+    if version is None:
+        cache.add(cle, uuid.uuid4().hex, None)
+        version = cache.get(cle)
+    return version
+
+
+def invalider_role(user_id):
+    cache.delete(cle_version(user_id))
+
+
+def role_de(request):
+    """Rôle de request.user (None si anonyme), lu dans la session tant qu'il est à jour."""
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    version = version_role(user.pk)
+    garde = request.session.get(CLE_SESSION)
+    if (
+        garde and garde['user'] == user.pk and garde['version'] == version
+        and time.time() - garde['lu'] < ROLE_DUREE_SESSION
+    ):
+        return garde['role']
+    role = RoleUtilisateur.objects.filter(user=user).values_list('role', flat=True).first() or ROLE_DEFAUT
+    request.session[CLE_SESSION] = {'user': user.pk, 'role': role, 'version': version, 'lu': time.time()}
+    return role
+
+
+class RoleMiddleware:
+    """Ajoute request.role (après AuthenticationMiddleware)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.role = SimpleLazyObject(lambda: role_de(request))
+        return self.get_response(request)
+
+
+def est_gestionnaire(request):
+    return request.user.is_authenticated and request.role == 'gestionnaire'
+
+
+def gestionnaire_requis(vue):
+    """Réserve la vue aux gestionnaires ; les autres sont renvoyés vers la connexion."""
+    @wraps(vue)
+    def enveloppe(request, *args, **kwargs):
+        if est_gestionnaire(request):
+            return vue(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path())
+    return enveloppe
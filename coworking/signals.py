@@ -0,0 +1,157 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .disponibilite import moteur
+from . import occupation, revenus
+from .cache_modeles import invalider
+from .models import (
+    EspaceTravail, Evenement, Facture, HistoriquePaiement, Inscription, ListeAttente, Notification,
+    ProfilMembre, RegleTarif, Reservation, RoleUtilisateur, TypeEspace,
+)
+from .notifications import assurer_compteurs, modifier_compteurs
+from .recherche import index_membres
+from .roles import invalider_role
+from .temps_reel import publier_notifications
+
+
+@receiver([post_save, post_delete], sender=Reservation)
+def invalider_disponibilite(sender, instance, **kwargs):
+    """Reconstruit l'arbre d'intervalles de l'espace au prochain accès"""
+    espace_id = instance.espace_id
+    moteur.invalider(espace_id)
+    # Une lecture concurrente a pu recharger l'arbre avant la validation
+    transaction.on_commit(lambda: moteur.invalider(espace_id))
+
+
+@receiver([post_save, post_delete], sender=Reservation)
+def invalider_occupation(sender, instance, **kwargs):
+    """Les matrices d'occupation des semaines de la réservation seront recalculées"""
+    espace_id, debut, fin = instance.espace_id, instance.date_debut, instance.date_fin
+    occupation.invalider(espace_id, debut, fin)
+    transaction.on_commit(lambda: occupation.invalider(espace_id, debut, fin))
+
+
+ETATS_REVENUS = {Facture: revenus.etat_facture, HistoriquePaiement: revenus.etat_paiement}
+
+
+@receiver([pre_save, pre_delete], sender=Facture)
+@receiver([pre_save, pre_delete], sender=HistoriquePaiement)
+def lire_revenus_avant(sender, instance, **kwargs):
+    """Part de la facture (du paiement) dans les cumuls de revenus avant l'écriture"""
+    instance._revenus_avant = {} if instance._state.adding else ETATS_REVENUS[sender](instance.pk)
+
+
+@receiver(post_save, sender=Facture)
+@receiver(post_save, sender=HistoriquePaiement)
+def cumuler_revenus(sender, instance, **kwargs):
+    """Reporte sur les cumuls journaliers l'écart entre avant et après (coworking.revenus)"""
+    revenus.appliquer(revenus.difference(
+        getattr(instance, '_revenus_avant', {}), ETATS_REVENUS[sender](instance.pk),
+    ))
+
+
+@receiver(post_delete, sender=Facture)
+@receiver(post_delete, sender=HistoriquePaiement)
+def retirer_revenus(sender, instance, **kwargs):
+    revenus.appliquer(revenus.difference(getattr(instance, '_revenus_avant', {}), {}))
+
+
+@receiver(pre_delete, sender=TypeEspace)
+def detacher_revenus_type_espace(sender, instance, **kwargs):
+    revenus.detacher_type_espace(instance.pk)
+
+
+@receiver(pre_save, sender=Notification)
+def lire_notification_avant(sender, instance, update_fields=None, **kwargs):
+    """Destinataire de la notification si elle était non lue avant l'écriture (None sinon)"""
+    if instance._state.adding or not _compteur_concerne(update_fields):
+        instance._non_lue_avant = None
+        return
+    instance._non_lue_avant = Notification.objects.filter(pk=instance.pk, lue=False).values_list(
+        'destinataire_id', flat=True
+    ).first()
+
+
+def _compteur_concerne(update_fields):
+    return update_fields is None or bool({'lue', 'destinataire', 'destinataire_id'} & set(update_fields))
+
+
+@receiver(post_save, sender=Notification)
+def compter_notification(sender, instance, created, update_fields=None, **kwargs):
+    """Reporte sur les compteurs le passage lue / non lue (ou le changement de destinataire).
+
+    Les créations unitaires (Notification.objects.create) et les modifications
+    par save() passent par ici ; la diffusion en masse et marquer_lue mettent
+    les compteurs à jour eux-mêmes.
+    """
+    avant = getattr(instance, '_non_lue_avant', None)
+    apres = None if instance.lue else instance.destinataire_id
+    if avant != apres and (created or _compteur_concerne(update_fields)):
+        if avant is not None:
+            modifier_compteurs([avant], -1)
+        # Un compteur créé maintenant inclut déjà cette notification
+        if apres is not None and apres not in assurer_compteurs([apres]):
+            modifier_compteurs([apres], 1)
+    if created and not instance.lue:
+        transaction.on_commit(lambda: publier_notifications([instance]))
+
+
+@receiver(post_delete, sender=Notification)
+def decompter_notification_supprimee(sender, instance, **kwargs):
+    if not instance.lue:
+        modifier_compteurs([instance.destinataire_id], -1)
+
+
+@receiver(post_save, sender=Inscription)
+def compter_inscription(sender, instance, created, **kwargs):
+    # coworking.evenements réserve la place avant de créer l'inscription
+    if created and not getattr(instance, '_place_reservee', False):
+        Evenement.objects.filter(pk=instance.evenement_id).update(nb_inscrits=F('nb_inscrits') + 1)
+
+
+@receiver(post_delete, sender=Inscription)
+def decompter_inscription(sender, instance, **kwargs):
+    Evenement.objects.filter(pk=instance.evenement_id, nb_inscrits__gt=0).update(nb_inscrits=F('nb_inscrits') - 1)
+
+
+@receiver(post_save, sender=User)
+@receiver([post_save, post_delete], sender=ProfilMembre)
+def indexer_membre(sender, instance, update_fields=None, **kwargs):
+    """Met à jour le document de recherche du membre après validation"""
+    # La connexion ne change que last_login
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    user_id = instance.pk if sender is User else instance.user_id
+    transaction.on_commit(lambda: index_membres().indexer([user_id]))
+
+
+@receiver(post_delete, sender=User)
+def retirer_membre(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: index_membres().retirer([user_id]))
+
+
+@receiver([post_save, post_delete], sender=RoleUtilisateur)
+def invalider_role_utilisateur(sender, instance, **kwargs):
+    """Les sessions de l'utilisateur relisent son rôle à la prochaine requête"""
+    user_id = instance.user_id
+    invalider_role(user_id)
+    # Une requête concurrente a pu relire l'ancien rôle avant la validation
+    transaction.on_commit(lambda: invalider_role(user_id))
+
+
+@receiver([post_save, post_delete], sender=EspaceTravail)
+@receiver([post_save, post_delete], sender=TypeEspace)
+@receiver([post_save, post_delete], sender=Evenement)
+@receiver([post_save, post_delete], sender=Inscription)
+@receiver([post_save, post_delete], sender=ListeAttente)
+@receiver([post_save, post_delete], sender=Reservation)
+@receiver([post_save, post_delete], sender=RegleTarif)
+@receiver([post_save, post_delete], sender=ProfilMembre)
+def invalider_cache_modeles(sender, **kwargs):
+    """Les entrées de cache qui dépendent du modèle ne sont plus lues (coworking.cache_modeles)"""
+    invalider(sender)
+    transaction.on_commit(lambda: invalider(sender))
@@ -0,0 +1,80 @@
+"""
+Fichiers statiques empreintés et précompressés.
+
+collectstatic copie les fichiers dans STATIC_ROOT sous un nom qui contient
+l'empreinte de leur contenu (css/pages/accueil.1a2b3c4d5e6f.css) : le
+serveur web peut les déclarer en cache pour un an, une modification change
+l'URL. {% static %} lit la correspondance dans le manifeste.
+
+compresser() écrit ensuite à côté de chaque fichier texte une variante .gz
+et, si le paquet brotli est installé (optionnel), une variante .br, que le
+serveur web sert telles quelles (gzip_static / brotli_static sous nginx).
+La commande construire_statiques enchaîne les deux.
+"""
+import gzip
+import logging
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, StaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # dépendance optionnelle
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS_COMPRESSIBLES = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+# En dessous, l'en-tête de compression coûte plus qu'il ne rapporte
+TAILLE_MIN = 256
+
+
+class StockageStatiques(ManifestStaticFilesStorage):
+    """Stockage à manifeste qui retombe sur les noms d'origine sans manifeste.
+
+    Sans collectstatic (tests, serveur de développement sans DEBUG), l'URL
+    non empreintée est servie au lieu de lever une erreur à chaque page.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._absents = set()
+
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force)
+        except ValueError:
+            if name not in self._absents:
+                self._absents.add(name)
+                logger.warning("Pas d'entrée de manifeste pour %s : lancer construire_statiques", name)
+            return StaticFilesStorage.url(self, name)
+
+
+def compresser(racine, niveau_gzip=9, niveau_brotli=11):
+    """Écrit les variantes .gz (et .br) des fichiers texte sous `racine`.
+
+    Retourne [(chemin relatif, taille, taille gzip, taille brotli ou None)].
+    Une variante qui ne serait pas plus petite que l'original n'est pas écrite.
+    """
+    resultats = []
+    for dossier, _, fichiers in os.walk(racine):
+        for nom in sorted(fichiers):
+            if not nom.endswith(EXTENSIONS_COMPRESSIBLES):
+                continue
+            chemin = os.path.join(dossier, nom)
+            with open(chemin, 'rb') as fichier:
+                contenu = fichier.read()
+            if len(contenu) < TAILLE_MIN:
+                continue
+            variantes = {'.gz': gzip.compress(contenu, niveau_gzip, mtime=0)}
+            if brotli is not None:
+                variantes['.br'] = brotli.compress(contenu, quality=niveau_brotli)
+            for suffixe, compresse in variantes.items():
+                if len(compresse) < len(contenu):
+                    with open(chemin + suffixe, 'wb') as fichier:
+                        fichier.write(compresse)
+            resultats.append((
+                os.path.relpath(chemin, racine), len(contenu), len(variantes['.gz']),
+                len(variantes['.br']) if '.br' in variantes else None,
+            ))
+    return resultats
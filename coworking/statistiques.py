@@ -0,0 +1,117 @@
+"""
+Statistiques des tableaux de bord précalculées.
+
+Les deux tableaux de bord (gestionnaire et admin) lisent une seule ligne
+StatistiquesSnapshot. Elle est recalculée au plus tard quand elle dépasse
+STATISTIQUES_FRAICHEUR secondes ou que le jour a changé, et peut aussi être
+rafraîchie à intervalle régulier par la commande rafraichir_statistiques.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import revenus
+from .models import (
+    EspaceTravail, Evenement, Facture, ProfilMembre, Reservation, StatistiquesSnapshot,
+)
+
+# Âge maximal (secondes) des chiffres affichés
+FRAICHEUR = getattr(settings, 'STATISTIQUES_FRAICHEUR', 60)
+
+SNAPSHOT_ID = 1
+
+
+def calculer():
+    """Recalcule tous les chiffres et enregistre le snapshot."""
+    maintenant = timezone.now()
+    aujourd_hui = timezone.localdate(maintenant)
+
+    reservations_recentes = [
+        {
+            'id': r.id,
+            'membre': {
+                'first_name': r.membre.first_name,
+                'last_name': r.membre.last_name,
+                'username': r.membre.username,
+            },
+            'espace': {'nom': r.espace.nom},
+            'date_debut': r.date_debut.isoformat(),
+            'statut': r.statut,
+            'statut_display': r.get_statut_display(),
+            'prix_total': str(r.prix_total),
+        }
+        for r in Reservation.objects.select_related('membre', 'espace').order_by('-date_creation')[:5]
+    ]
+    prochains_evenements = [
+        {
+            'id': e.id,
+            'nom': e.nom,
+            'lieu': e.lieu,
+            'date_debut': e.date_debut.isoformat(),
+            'places_restantes': e.places_restantes,
+        }
+        for e in Evenement.objects.filter(date_debut__gte=maintenant).order_by('date_debut')[:3]
+    ]
+
+    snapshot, _ = StatistiquesSnapshot.objects.update_or_create(pk=SNAPSHOT_ID, defaults={
+        'date_calcul': maintenant,
+        'total_membres': User.objects.filter(roleutilisateur__role='membre').count(),
+        'total_profils': ProfilMembre.objects.count(),
+        'total_espaces': EspaceTravail.objects.count(),
+        'reservations_aujourd_hui': Reservation.objects.filter(
+            date_debut__date=aujourd_hui, statut='confirmee'
+        ).count(),
+        'reservations_jour': Reservation.objects.filter(date_debut__date=aujourd_hui).count(),
+        # Cumuls journaliers (coworking.revenus) : au plus 31 jours de lignes
+        'revenus_mois': revenus.totaux(aujourd_hui.replace(day=1), aujourd_hui)['montant_paye'],
+        'factures_en_attente': Facture.objects.filter(statut='en_attente').count(),
+        'evenements_a_venir': Evenement.objects.filter(date_debut__gte=maintenant).count(),
+        'reservations_recentes': reservations_recentes,
+        'prochains_evenements': prochains_evenements,
+    })
+    return snapshot
+
+
+def snapshot(fraicheur=None):
+    """Retourne le snapshot courant (une requête), recalculé s'il est périmé."""
+    fraicheur = FRAICHEUR if fraicheur is None else fraicheur
+    snapshot = StatistiquesSnapshot.objects.filter(pk=SNAPSHOT_ID).first()
+    maintenant = timezone.now()
+    if (
+        snapshot is None
+        or maintenant - snapshot.date_calcul > timedelta(seconds=fraicheur)
+        or timezone.localdate(snapshot.date_calcul) != timezone.localdate(maintenant)
+    ):
+        snapshot = calculer()
+    return snapshot
+
+
+def _avec_dates(elements):
+    return [dict(element, date_debut=parse_datetime(element['date_debut'])) for element in elements]
+
+
+def contexte_admin(snapshot):
+    """Contexte de admin/dashboard_admin.html à partir du snapshot."""
+    return {
+        'total_membres': snapshot.total_membres,
+        'total_espaces': snapshot.total_espaces,
+        'reservations_aujourd_hui': snapshot.reservations_aujourd_hui,
+        'revenus_mois': snapshot.revenus_mois,
+        'reservations_recentes': _avec_dates(snapshot.reservations_recentes),
+        'factures_en_attente': snapshot.factures_en_attente,
+        'evenements_a_venir': _avec_dates(snapshot.prochains_evenements),
+        'date_statistiques': snapshot.date_calcul,
+    }
+
+
+def stats_gestionnaire(snapshot):
+    """Dictionnaire `stats` de coworking/dashboard_gestionnaire.html."""
+    return {
+        'membres_total': snapshot.total_profils,
+        'reservations_jour': snapshot.reservations_jour,
+        'evenements_a_venir': snapshot.evenements_a_venir,
+        'factures_impayees': snapshot.factures_en_attente,
+    }
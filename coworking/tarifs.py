@@ -0,0 +1,210 @@
+"""
+Tarification des réservations.
+
+Les règles (RegleTarif) de chaque espace sont compilées en une grille : le
+prix de chacune des 168 heures de la semaine (lundi 0 h d'abord, heure
+locale), le prix horaire de l'espace multiplié par le coefficient de la
+plage de pointe qui la couvre, plus le plafond journalier et les remises
+par abonnement. Les sommes cumulées de la grille donnent le prix d'une
+plage quelconque de la semaine en deux lectures, quelle que soit sa durée.
+
+Un créneau est découpé par jour calendaire local : chaque jour est
+plafonné, les jours sont additionnés, puis la remise de l'abonnement du
+membre est appliquée et le total arrondi au centime. Tout le calcul est en
+Decimal. Le prix suit les heures affichées à l'horloge locale : la nuit
+d'un changement d'heure compte 24 heures.
+
+Les grilles sont gardées en cache par espace sous les versions des modèles
+dont elles dépendent (voir coworking.cache_modeles) ; devis() chiffre un
+lot de créneaux sur plusieurs espaces avec une lecture du cache, et deux
+requêtes pour les grilles manquantes. Le calcul parcourt le créneau jour
+par jour : erreur_creneau() borne la durée et les dates des créneaux reçus
+de l'extérieur.
+"""
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from functools import cached_property
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from . import cache_modeles
+from .models import EspaceTravail, ProfilMembre, RegleTarif, TypeEspace
+from .occupation import HEURES_SEMAINE, heure_locale, lundi
+
+MODELES_TARIFS = (EspaceTravail, TypeEspace, RegleTarif)
+
+# Créneaux acceptés par erreur_creneau() : durée et écart à maintenant
+DUREE_MAX_CRENEAU = timedelta(days=getattr(settings, 'TARIFS_DUREE_MAX_JOURS', 31))
+HORIZON = timedelta(days=getattr(settings, 'TARIFS_HORIZON_JOURS', 2 * 365))
+
+CENTIME = Decimal('0.01')
+SECONDES_HEURE = 3600
+
+
+@dataclass(frozen=True)
+class Grille:
+    """Tarif compilé d'un espace."""
+    # Prix de chacune des 168 heures de la semaine
+    taux: tuple
+    plafond_jour: Decimal = None
+    # {type_abonnement: pourcentage}
+    remises: tuple = ()
+
+    @cached_property
+    def cumul(self):
+        """cumul[h] : prix des heures 0 .. h - 1 de la semaine."""
+        return (Decimal(0), *accumulate(self.taux))
+
+    def _jusqu_a(self, seconde):
+        """Prix × 3600 de lundi 0 h jusqu'à `seconde` (secondes depuis lundi 0 h)."""
+        heure, reste = divmod(seconde, SECONDES_HEURE)
+        if heure >= HEURES_SEMAINE:
+            return self.cumul[HEURES_SEMAINE] * SECONDES_HEURE
+        return self.cumul[heure] * SECONDES_HEURE + self.taux[heure] * reste
+
+    def prix(self, debut, fin, type_abonnement=None):
+        """Prix exact (Decimal au centime) de [debut, fin), heures locales naïves."""
+        total = Decimal(0)
+        moment = debut
+        while moment < fin:
+            jour = moment.date()
+            borne = min(fin, datetime.combine(jour + timedelta(days=1), time()))
+            origine = datetime.combine(lundi(jour), time())
+            montant = (
+                self._jusqu_a((borne - origine) // timedelta(seconds=1))
+                - self._jusqu_a((moment - origine) // timedelta(seconds=1))
+            ) / SECONDES_HEURE
+            if self.plafond_jour is not None:
+                montant = min(montant, self.plafond_jour)
+            total += montant
+            moment = borne
+        remise = dict(self.remises).get(type_abonnement)
+        if remise:
+            total = total * (100 - remise) / 100
+        return total.quantize(CENTIME, rounding=ROUND_HALF_UP)
+
+
+def _portee(regles, espace_id, type_espace_id):
+    """Règles qui s'appliquent à l'espace : les siennes, sinon celles de son type, sinon les générales."""
+    for filtre in (
+        lambda regle: regle.espace_id == espace_id,
+        lambda regle: regle.type_espace_id == type_espace_id and regle.espace_id is None,
+        lambda regle: regle.espace_id is None and regle.type_espace_id is None,
+    ):
+        retenues = [regle for regle in regles if filtre(regle)]
+        if retenues:
+            return retenues
+    return []
+
+
+def compiler(espaces, regles):
+    """Grille de chaque espace ; `espaces` : [(id, type_espace_id, prix_heure)]."""
+    par_genre = {}
+    for regle in regles:
+        par_genre.setdefault(regle.genre, []).append(regle)
+    grilles = {}
+    for espace_id, type_espace_id, prix_heure in espaces:
+        coefficients = [Decimal(1)] * HEURES_SEMAINE
+        for regle in _portee(par_genre.get('pointe', []), espace_id, type_espace_id):
+            for jour in map(int, regle.jours):
+                for heure in range(jour * 24 + regle.heure_debut, jour * 24 + regle.heure_fin):
+                    # Plages qui se recouvrent : la plus chère l'emporte
+                    coefficients[heure] = max(coefficients[heure], regle.coefficient)
+        plafonds = [regle.plafond for regle in _portee(par_genre.get('plafond_jour', []), espace_id, type_espace_id)]
+        remises = {}
+        for regle in _portee(par_genre.get('remise', []), espace_id, type_espace_id):
+            remises[regle.type_abonnement] = max(remises.get(regle.type_abonnement, 0), regle.pourcentage)
+        grilles[espace_id] = Grille(
+            taux=tuple(Decimal(prix_heure) * coefficient for coefficient in coefficients),
+            plafond_jour=min(plafonds) if plafonds else None,
+            remises=tuple(sorted(remises.items())),
+        )
+    return grilles
+
+
+def _regles(type_espace_ids, espace_ids):
+    return list(RegleTarif.objects.filter(actif=True).filter(
+        Q(espace_id__in=espace_ids)
+        | Q(espace__isnull=True, type_espace_id__in=type_espace_ids)
+        | Q(espace__isnull=True, type_espace__isnull=True)
+    ))
+
+
+def grilles(espaces):
+    """{espace_id: Grille} ; `espaces` : identifiants ou instances d'EspaceTravail.
+
+    Une lecture du cache ; pour les grilles manquantes, une requête pour les
+    espaces donnés par identifiant, une pour les règles.
+    """
+    instances = {espace.pk: espace for espace in espaces if isinstance(espace, EspaceTravail)}
+    ids = {espace.pk if isinstance(espace, EspaceTravail) else espace for espace in espaces}
+    prefixe = cache_modeles.cle('tarifs', MODELES_TARIFS)
+    trouvees = cache.get_many([f'{prefixe}:{espace_id}' for espace_id in ids])
+    resultat = {espace_id: trouvees[f'{prefixe}:{espace_id}'] for espace_id in ids
+                if f'{prefixe}:{espace_id}' in trouvees}
+    manquants = ids - set(resultat)
+    if manquants:
+        lignes = [(pk, instances[pk].type_espace_id, instances[pk].prix_heure)
+                  for pk in manquants if pk in instances]
+        autres = manquants - set(instances)
+        if autres:
+            lignes += list(EspaceTravail.objects.filter(pk__in=autres).values_list('id', 'type_espace_id', 'prix_heure'))
+        if lignes:
+            compilees = compiler(lignes, _regles({ligne[1] for ligne in lignes}, [ligne[0] for ligne in lignes]))
+            cache.set_many({f'{prefixe}:{espace_id}': grille for espace_id, grille in compilees.items()},
+                           cache_modeles.DUREE)
+            resultat.update(compilees)
+    return resultat
+
+
+def abonnement(user):
+    """Type d'abonnement actif du membre (une requête), None sans profil actif ou anonyme."""
+    if not user or not user.is_authenticated:
+        return None
+    return ProfilMembre.objects.filter(user=user, abonnement_actif=True).values_list(
+        'type_abonnement', flat=True
+    ).first()
+
+
+def erreur_creneau(debut, fin):
+    """Motif de refus du créneau [debut, fin) (dates avec fuseau), None s'il peut être chiffré.
+
+    Seule borne des chiffrages à la demande : api_devis, RechercheEspaceForm
+    et creneaux.chiffrer l'appliquent.
+    """
+    if not debut < fin:
+        return 'Créneau invalide'
+    if fin - debut > DUREE_MAX_CRENEAU:
+        return f'Créneau de plus de {DUREE_MAX_CRENEAU.days} jours'
+    maintenant = timezone.now()
+    if debut < maintenant - HORIZON or fin > maintenant + HORIZON:
+        return f'Créneau à plus de {HORIZON.days} jours d\'aujourd\'hui'
+    return None
+
+
+def devis(creneaux, type_abonnement=None):
+    """Prix de chaque (espace, début, fin) de `creneaux`, dans l'ordre.
+
+    `espace` est un identifiant ou une instance ; None pour un espace inconnu.
+    """
+    creneaux = list(creneaux)
+    tables = grilles({espace for espace, _, _ in creneaux})
+    # Fuseau lu une fois : timezone.localtime() le relit à chaque appel
+    fuseau = timezone.get_current_timezone()
+    prix = []
+    for espace, debut, fin in creneaux:
+        grille = tables.get(espace.pk if isinstance(espace, EspaceTravail) else espace)
+        prix.append(grille and grille.prix(
+            heure_locale(debut, fuseau), heure_locale(fin, fuseau), type_abonnement,
+        ))
+    return prix
+
+
+def prix(espace, date_debut, date_fin, type_abonnement=None):
+    """Prix d'un créneau d'un espace (instance ou identifiant)."""
+    return devis([(espace, date_debut, date_fin)], type_abonnement)[0]
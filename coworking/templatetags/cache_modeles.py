@@ -0,0 +1,45 @@
+"""
+{% en_cache "nom" "app.Modele app.AutreModele" variante... %} ... {% fin_en_cache %}
+
+Met en cache le rendu du bloc jusqu'à la prochaine modification d'un des
+modèles cités (voir coworking.cache_modeles). Les variantes (utilisateur
+connecté, paramètres GET...) distinguent les rendus d'un même bloc. Les
+querysets évalués dans le bloc ne sont pas exécutés quand il est en cache.
+"""
+from django import template
+
+from coworking import cache_modeles
+
+register = template.Library()
+
+
+class NoeudEnCache(template.Node):
+
+    def __init__(self, nodelist, nom, modeles, variantes):
+        self.nodelist = nodelist
+        self.nom = nom
+        self.modeles = modeles
+        self.variantes = variantes
+
+    def render(self, context):
+        nom = self.nom.resolve(context)
+        modeles = self.modeles.resolve(context).split()
+        variantes = tuple(variante.resolve(context) for variante in self.variantes)
+        return cache_modeles.lire(nom, modeles, lambda: self.nodelist.render(context), variantes)
+
+
+@register.tag
+def en_cache(parser, token):
+    morceaux = token.split_contents()
+    if len(morceaux) < 3:
+        raise template.TemplateSyntaxError(
+            f"{morceaux[0]} attend un nom et une liste de modèles : {{% en_cache \"nom\" \"app.Modele\" %}}"
+        )
+    nodelist = parser.parse(('fin_en_cache',))
+    parser.delete_first_token()
+    return NoeudEnCache(
+        nodelist,
+        parser.compile_filter(morceaux[1]),
+        parser.compile_filter(morceaux[2]),
+        [parser.compile_filter(morceau) for morceau in morceaux[3:]],
+    )
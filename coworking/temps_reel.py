@@ -0,0 +1,91 @@
+"""
+Courtier de publication/abonnement en mémoire pour les notifications poussées.
+
+Chaque connexion SSE ouverte sur le processus s'abonne avec sa propre file
+asyncio ; le code synchrone (vues, signaux, thread de diffusion) publie depuis
+n'importe quel thread. Le courtier ne dépasse pas le processus : derrière
+plusieurs workers, un client ne reçoit que ce qui est publié sur le sien.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Événements en attente au-delà desquels un client trop lent perd les suivants
+TAILLE_FILE = 100
+
+
+class Courtier:
+
+    def __init__(self):
+        self._abonnes = defaultdict(set)
+        self._verrou = threading.Lock()
+
+    def abonner(self, user_id):
+        """À appeler depuis la boucle asyncio de la connexion ; retourne l'abonnement."""
+        abonnement = (asyncio.get_running_loop(), asyncio.Queue(maxsize=TAILLE_FILE))
+        with self._verrou:
+            self._abonnes[user_id].add(abonnement)
+        return abonnement
+
+    def desabonner(self, user_id, abonnement):
+        with self._verrou:
+            abonnements = self._abonnes.get(user_id)
+            if abonnements is not None:
+                abonnements.discard(abonnement)
+                if not abonnements:
+                    del self._abonnes[user_id]
+
+    def abonnes(self, user_ids):
+        """Sous-ensemble des utilisateurs ayant au moins une connexion ouverte."""
+        with self._verrou:
+            return {user_id for user_id in user_ids if user_id in self._abonnes}
+
+    def nombre_connexions(self):
+        with self._verrou:
+            return sum(len(abonnements) for abonnements in self._abonnes.values())
+
+    def publier(self, user_id, evenement):
+        with self._verrou:
+            abonnements = list(self._abonnes.get(user_id, ()))
+        for boucle, file in abonnements:
+            try:
+                boucle.call_soon_threadsafe(_deposer, file, evenement)
+            except RuntimeError:
+                # Boucle fermée : la connexion est en train de se terminer
+                pass
+
+
+def _deposer(file, evenement):
+    try:
+        file.put_nowait(evenement)
+    except asyncio.QueueFull:
+        pass
+
+
+courtier = Courtier()
+
+
+def publier_notifications(notifications):
+    """Pousse des Notification aux destinataires connectés à ce processus."""
+    connectes = courtier.abonnes({notification.destinataire_id for notification in notifications})
+    for notification in notifications:
+        if notification.destinataire_id in connectes:
+            courtier.publier(notification.destinataire_id, {
+                'id': notification.id,
+                'titre': notification.titre,
+                'message': notification.message,
+                'type_notification': notification.type_notification,
+                'date_creation': notification.date_creation,
+            })
+
+
+def format_sse(donnees, evenement=None):
+    """Encode un message Server-Sent Events."""
+    lignes = []
+    if evenement:
+        lignes.append(f'event: {evenement}')
+    lignes.append('data: ' + json.dumps(donnees, cls=DjangoJSONEncoder))
+    return '\n'.join(lignes) + '\n\n'
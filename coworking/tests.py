@@ -1,3 +1,1498 @@
-from django.test import TestCase
+import asyncio
+import os
+import runpy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import QuerySet, Sum
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    cache_modeles, exports, notifications, occupation, pagination, revenus, statistiques, tarifs, temps_reel, views,
+)
+from .budget_requetes import BudgetRequetesMixin, compter_requetes
+from .creneaux import chiffrer, rechercher_creneaux
+from .disponibilite import DUREE_VALIDITE, ArbreIntervalles, conflits_en_base, est_disponible, moteur
+from .evenements import ResultatInscription, desinscrire, inscrire, promouvoir
+from .forms import ReservationForm
+from .factures import (
+    allouer_numeros, enregistrer_facture, facturer_reservations_en_attente, formater_numero, marquer_factures_en_retard,
+)
+from .models import (
+    CompteurNotifications, EspaceTravail, Evenement, Facture, HistoriquePaiement, HistoriqueReservation,
+    Inscription, ListeAttente, Notification, ProfilMembre, RegleTarif, Reservation, RevenuJournalier, RoleUtilisateur,
+    SequenceFacture, StatistiquesSnapshot, TypeEspace,
+)
+from .recherche import echapper_like, index_membres, rechercher_membres
+from .reservations import ResultatReservation, ResultatSerie, changer_statut, creneaux_serie, reserver, reserver_serie
+
+
+class NumerotationFacturesTests(TestCase):
+
+    def setUp(self):
+        self.membre = User.objects.create_user('membre', password='x')
+
+    def nouvelle_facture(self):
+        return Facture(
+            membre=self.membre,
+            date_echeance=timezone.now() + timedelta(days=30),
+            montant_total=10,
+        )
+
+    def test_numeros_consecutifs(self):
+        jour = timezone.localdate()
+        numeros = [enregistrer_facture(self.nouvelle_facture()).numero for _ in range(3)]
+        self.assertEqual(numeros, [formater_numero(jour, rang) for rang in (1, 2, 3)])
+
+    def test_bloc_prealloue(self):
+        premier = allouer_numeros(1)
+        bloc = allouer_numeros(5)
+        self.assertEqual(len(set(premier + bloc)), 6)
+        self.assertTrue(bloc[-1].endswith('0006'))
+
+    def test_reprise_apres_numeros_existants(self):
+        jour = timezone.localdate()
+        facture = self.nouvelle_facture()
+        facture.numero = formater_numero(jour, 7)
+        facture.save()
+        self.assertEqual(allouer_numeros(1), [formater_numero(jour, 8)])
+
+    def test_facturation_des_reservations_en_attente(self):
+        type_espace = TypeEspace.objects.create(nom='Bureau')
+        espace = EspaceTravail.objects.create(nom='B1', type_espace=type_espace, capacite=2, prix_heure=10)
+        debut = timezone.now() + timedelta(days=1)
+        for i in range(3):
+            Reservation.objects.create(
+                membre=self.membre, espace=espace, prix_total=20,
+                date_debut=debut + timedelta(hours=2 * i), date_fin=debut + timedelta(hours=2 * i + 1),
+            )
+        factures = facturer_reservations_en_attente()
+        self.assertEqual(len(factures), 3)
+        self.assertEqual(len({f.numero for f in factures}), 3)
+        # Les réservations déjà facturées ne le sont pas deux fois
+        self.assertEqual(facturer_reservations_en_attente(), [])
+
+
+class NumerotationConcurrenteTests(TransactionTestCase):
+
+    def test_creations_concurrentes_sans_doublon(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("base SQLite en mémoire : non partagée entre threads")
+        membre = User.objects.create_user('membre', password='x')
+
+        def creer(_):
+            try:
+                return enregistrer_facture(Facture(
+                    membre=membre,
+                    date_echeance=timezone.now() + timedelta(days=30),
+                    montant_total=10,
+                )).numero
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            numeros = list(pool.map(creer, range(40)))
+
+        jour = timezone.localdate()
+        self.assertEqual(sorted(numeros), [formater_numero(jour, rang) for rang in range(1, 41)])
+        self.assertEqual(Facture.objects.count(), 40)
+
+
+class FacturesEnRetardTests(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bruno = User.objects.create_user('bruno', password='x')
+        self.maintenant = timezone.now()
+        self.rang = 0
+
+    def facture(self, membre, jours, montant, statut='en_attente'):
+        self.rang += 1
+        return Facture.objects.create(
+            membre=membre, numero=f'T-{self.rang:04d}', montant_total=montant, statut=statut,
+            date_echeance=self.maintenant + timedelta(days=jours),
+        )
+
+    def test_passage_en_retard_et_recapitulatif(self):
+        echues = [self.facture(self.alice, -3, 10), self.facture(self.alice, -1, 15), self.facture(self.bruno, -2, 7)]
+        payee = self.facture(self.alice, -5, 20, statut='payee')
+        a_venir = self.facture(self.bruno, 4, 30)
+
+        self.assertEqual(marquer_factures_en_retard(self.maintenant), 3)
+
+        for facture in echues:
+            facture.refresh_from_db()
+            self.assertEqual(facture.statut, 'en_retard')
+        payee.refresh_from_db()
+        a_venir.refresh_from_db()
+        self.assertEqual(payee.statut, 'payee')
+        self.assertEqual(a_venir.statut, 'en_attente')
+
+        # Une seule notification par membre, avec le nombre et le total de ses factures
+        alice = Notification.objects.get(destinataire=self.alice)
+        self.assertEqual(alice.titre, '2 factures en retard')
+        self.assertIn('25.00 €', alice.message)
+        bruno = Notification.objects.get(destinataire=self.bruno)
+        self.assertEqual(bruno.titre, 'Facture en retard')
+        self.assertIn('7.00 €', bruno.message)
+        self.assertEqual(CompteurNotifications.objects.get(user=self.alice).non_lues, 1)
+        self.assertEqual(CompteurNotifications.objects.get(user=self.bruno).non_lues, 1)
+        # Le verrou porte sur les factures, pas sur la séquence de numérotation
+        self.assertFalse(SequenceFacture.objects.exists())
+
+        # Un second passage ne trouve plus rien et ne notifie personne
+        self.assertEqual(marquer_factures_en_retard(self.maintenant), 0)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_sans_notification(self):
+        self.facture(self.alice, -1, 10)
+        self.assertEqual(marquer_factures_en_retard(self.maintenant, notifier=False), 1)
+        self.assertEqual(Facture.objects.get().statut, 'en_retard')
+        self.assertFalse(Notification.objects.exists())
+
+
+# Sans cache : les budgets valent pour une page calculée entièrement
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class BudgetRequetesVuesTests(BudgetRequetesMixin, TestCase):
+    """Le nombre de requêtes des pages ne dépend pas du volume de données."""
+
+    def setUp(self):
+        self.gestionnaire = User.objects.create_user('gestionnaire', password='x')
+        RoleUtilisateur.objects.create(user=self.gestionnaire, role='gestionnaire')
+        self.membre = self.creer_membre('membre')
+        self.espace = self.creer_espace('Bureau 1')
+        self.reservation = self.creer_reservation(self.espace)
+        self.facture = enregistrer_facture(Facture(
+            membre=self.membre, reservation=self.reservation, montant_total=20,
+            date_echeance=timezone.now() + timedelta(days=30),
+        ))
+        self.rang = 0
+
+    def creer_membre(self, nom):
+        membre = User.objects.create_user(nom, password='x', first_name=nom.title())
+        RoleUtilisateur.objects.create(user=membre, role='membre')
+        ProfilMembre.objects.create(user=membre, entreprise='Atelier')
+        return membre
+
+    def creer_espace(self, nom):
+        type_espace = TypeEspace.objects.create(nom=f'Type {nom}')
+        return EspaceTravail.objects.create(nom=nom, type_espace=type_espace, capacite=4, prix_heure=10)
+
+    def creer_reservation(self, espace, statut='en_attente', jours=1):
+        debut = timezone.now() + timedelta(days=jours)
+        return Reservation.objects.create(
+            membre=self.membre, espace=espace, statut=statut, prix_total=20,
+            date_debut=debut, date_fin=debut + timedelta(hours=2),
+        )
+
+    def ajouter_donnees(self):
+        """Plusieurs lignes de chaque sorte, sur des espaces et types distincts."""
+        for _ in range(3):
+            self.rang += 1
+            espace = self.creer_espace(f'Salle {self.rang}')
+            self.creer_reservation(espace, jours=self.rang + 1)
+            self.creer_reservation(espace, statut='confirmee', jours=self.rang + 20)
+            enregistrer_facture(Facture(
+                membre=self.membre, montant_total=10, date_echeance=timezone.now() + timedelta(days=30),
+            ))
+            self.creer_membre(f'autre{self.rang}')
+            HistoriqueReservation.objects.create(reservation=self.reservation, action=f'Action {self.rang}')
+            HistoriquePaiement.objects.create(facture=self.facture, montant=5)
+            debut = timezone.now() + timedelta(days=self.rang)
+            evenement = Evenement.objects.create(
+                nom=f'Atelier {self.rang}', description='', lieu='Salle', places_max=10,
+                organisateur=self.gestionnaire, date_debut=debut, date_fin=debut + timedelta(hours=2),
+            )
+            Inscription.objects.create(membre=self.membre, evenement=evenement)
+
+    def test_pages_membre(self):
+        self.client.force_login(self.membre)
+        for url in (
+            reverse('dashboard'),
+            reverse('mes_reservations'),
+            reverse('choisir_paiement'),
+            reverse('detail_espace', args=[self.espace.id]),
+        ):
+            with self.subTest(url=url):
+                self.assertBudgetRequetes(url, self.ajouter_donnees)
+
+    def test_pages_gestionnaire(self):
+        self.client.force_login(self.gestionnaire)
+        for url in (
+            reverse('liste_membres_admin'),
+            reverse('detail_membre_admin', args=[self.membre.id]),
+            reverse('liste_reservations_admin'),
+            reverse('detail_reservation_admin', args=[self.reservation.id]),
+            reverse('detail_facture_admin', args=[self.facture.id]),
+        ):
+            with self.subTest(url=url):
+                self.assertBudgetRequetes(url, self.ajouter_donnees)
+
+
+class RoleMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('utilisateur', password='x')
+        self.role = RoleUtilisateur.objects.create(user=self.user, role='membre')
+        self.client.force_login(self.user)
+
+    def test_changement_de_role_pris_en_compte(self):
+        url = reverse('dashboard_admin')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.role.role = 'gestionnaire'
+        self.role.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.role.delete()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_role_lu_une_fois_puis_garde_en_session(self):
+        url = reverse('dashboard')
+        for attendu in (1, 0):
+            with compter_requetes() as compteur:
+                self.client.get(url)
+            lectures = [sql for sql in compteur.requetes if 'coworking_roleutilisateur' in sql]
+            self.assertEqual(len(lectures), attendu)
+
+
+class CacheModelesTests(TestCase):
+
+    def setUp(self):
+        cache_modeles.cache.clear()
+        cache_modeles.compteurs.remettre_a_zero()
+        self.type_espace = TypeEspace.objects.create(nom='Bureau')
+        self.espace = EspaceTravail.objects.create(nom='B1', type_espace=self.type_espace, capacite=2, prix_heure=10)
+
+    def test_lecture_puis_succes(self):
+        calculs = []
+        for _ in range(3):
+            cache_modeles.lire('essai', (EspaceTravail,), lambda: calculs.append(1) or 'valeur')
+        self.assertEqual(len(calculs), 1)
+        self.assertEqual(cache_modeles.ratios()['essai'], (2, 1, 2 / 3))
+
+    def test_modification_invalide_la_page(self):
+        url = reverse('detail_espace', args=[self.espace.id])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        self.espace.nom = 'Salle Renommée'
+        self.espace.save()
+        self.assertContains(self.client.get(url), 'Salle Renommée')
+
+    def test_fragment_sans_requete_quand_en_cache(self):
+        url = reverse('liste_evenements')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            reponse = self.client.get(url)
+        self.assertContains(reponse, 'Aucun événement programmé')
+
+
+class ReponsesConditionnellesTests(TestCase):
+
+    def setUp(self):
+        cache_modeles.cache.clear()
+        self.type_espace = TypeEspace.objects.create(nom='Bureau')
+        self.espace = EspaceTravail.objects.create(nom='B1', type_espace=self.type_espace, capacite=2, prix_heure=10)
+        self.url = reverse('detail_espace', args=[self.espace.id])
+
+    def test_revalidation_sans_requete_puis_invalidation(self):
+        reponse = self.client.get(self.url)
+        self.assertTrue(reponse['ETag'].startswith('W/"espace-'))
+        self.assertIn('Last-Modified', reponse)
+        self.assertIn('no-cache', reponse['Cache-Control'])
+        with self.assertNumQueries(0):
+            revalidation = self.client.get(self.url, HTTP_IF_NONE_MATCH=reponse['ETag'])
+        self.assertEqual(revalidation.status_code, 304)
+        self.espace.nom = 'Salle Renommée'
+        self.espace.save()
+        self.assertContains(self.client.get(self.url, HTTP_IF_NONE_MATCH=reponse['ETag']), 'Salle Renommée')
+
+    def test_etag_par_utilisateur_sans_last_modified(self):
+        anonyme = self.client.get(self.url)['ETag']
+        User.objects.create_user('membre', password='mdp')
+        self.client.login(username='membre', password='mdp')
+        reponse = self.client.get(self.url)
+        self.assertNotEqual(reponse['ETag'], anonyme)
+        self.assertNotIn('Last-Modified', reponse)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_etag_du_corps_sans_cache(self):
+        # Versions non gardées : ConditionalGetMiddleware hache le corps à la place
+        reponse = self.client.get(self.url)
+        self.assertFalse(reponse['ETag'].startswith('W/"espace-'))
+        self.assertNotIn('Last-Modified', reponse)
+
+    def test_compression_au_dela_du_seuil(self):
+        for rang in range(30):
+            EspaceTravail.objects.create(nom=f'Bureau {rang}', type_espace=self.type_espace, capacite=2, prix_heure=10)
+        reponse = self.client.get(reverse('liste_espaces'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(reponse['Content-Encoding'], 'gzip')
+        petite = self.client.get(reverse('api_creneaux'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertLess(len(petite.content), 1024)
+        self.assertNotIn('Content-Encoding', petite)
+
+
+class ReservationTests(TestCase):
+
+    def setUp(self):
+        moteur.invalider()
+        self.membre = User.objects.create_user('membre', password='x')
+        type_espace = TypeEspace.objects.create(nom='Bureau')
+        self.espace = EspaceTravail.objects.create(nom='B1', type_espace=type_espace, capacite=2, prix_heure=10)
+        self.debut = timezone.make_aware(datetime(2030, 1, 7, 9))
+        self.fin = self.debut + timedelta(hours=2)
+
+    def test_confirmation_refusee_en_cas_de_chevauchement(self):
+        existante = reserver(self.membre, self.espace, self.debut, self.fin, statut='confirmee').reservation
+        # Une demande en attente ne bloque rien et n'est pas bloquée
+        self.assertTrue(reserver(self.membre, self.espace, self.debut, self.fin).succes)
+        resultat = reserver(self.membre, self.espace, self.debut + timedelta(hours=1), self.fin + timedelta(hours=1),
+                            statut='confirmee')
+        self.assertEqual(resultat.statut, ResultatReservation.CONFLIT)
+        self.assertEqual(resultat.conflits, [existante.id])
+        # Créneaux semi-ouverts : commencer à la fin de l'existante est permis
+        self.assertTrue(reserver(self.membre, self.espace, self.fin, self.fin + timedelta(hours=1),
+                                 statut='confirmee').succes)
+        self.assertEqual(Reservation.objects.filter(statut='confirmee').count(), 2)
+
+    def test_espace_indisponible(self):
+        self.espace.disponible = False
+        self.espace.save()
+        resultat = reserver(self.membre, self.espace, self.debut, self.fin)
+        self.assertEqual(resultat.statut, ResultatReservation.INDISPONIBLE)
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_changer_statut(self):
+        premiere = reserver(self.membre, self.espace, self.debut, self.fin).reservation
+        seconde = reserver(self.membre, self.espace, self.debut, self.fin).reservation
+        self.assertTrue(changer_statut(premiere, 'confirmee').succes)
+        # Reconfirmer ne se heurte pas à soi-même
+        self.assertTrue(changer_statut(premiere, 'confirmee').succes)
+
+        resultat = changer_statut(seconde, 'confirmee')
+        self.assertEqual(resultat.statut, ResultatReservation.CONFLIT)
+        self.assertEqual(resultat.conflits, [premiere.id])
+        seconde.refresh_from_db()
+        self.assertEqual(seconde.statut, 'en_attente')
+        self.assertFalse(HistoriqueReservation.objects.filter(reservation=seconde).exists())
+
+        self.assertTrue(changer_statut(premiere, 'annulee').succes)
+        self.assertTrue(changer_statut(seconde, 'confirmee').succes)
+        self.assertEqual(
+            list(HistoriqueReservation.objects.filter(reservation=seconde).values_list('action', flat=True)),
+            ['Statut changé de "en_attente" à "confirmee"'],
+        )
+
+
+class SerieReservationTests(TestCase):
+
+    def setUp(self):
+        self.membre = User.objects.create_user('membre', password='x')
+        type_espace = TypeEspace.objects.create(nom='Salle de réunion')
+        self.espace = EspaceTravail.objects.create(nom='R1', type_espace=type_espace, capacite=8, prix_heure=20)
+        # Les arbres en mémoire survivent à l'annulation des transactions de test
+        moteur.invalider()
+        # Un mardi à 9 h, heure locale
+        self.debut = timezone.make_aware(datetime(2030, 1, 1, 9))
+        self.fin = self.debut + timedelta(hours=2)
+
+    def test_creneaux_mensuels_et_exceptions(self):
+        debut = timezone.make_aware(datetime(2030, 1, 31, 9))
+        creneaux = creneaux_serie(debut, debut + timedelta(hours=1), 'mensuelle', nombre=4)
+        # Février et avril n'ont pas de 31 : sautés
+        self.assertEqual([timezone.localtime(d).date() for d, _ in creneaux], [
+            date(2030, 1, 31), date(2030, 3, 31), date(2030, 5, 31), date(2030, 7, 31),
+        ])
+        creneaux = creneaux_serie(self.debut, self.fin, 'hebdomadaire', 2, jusqu_au=date(2030, 2, 28),
+                                  exceptions=[date(2030, 1, 29)])
+        self.assertEqual([timezone.localtime(d).date() for d, _ in creneaux], [
+            date(2030, 1, 1), date(2030, 1, 15), date(2030, 2, 12), date(2030, 2, 26),
+        ])
+        # Même heure locale de part et d'autre du passage à l'heure d'été
+        with self.settings(TIME_ZONE='Europe/Paris'):
+            debut = timezone.make_aware(datetime(2030, 3, 19, 9))
+            creneaux = creneaux_serie(debut, debut + timedelta(hours=1), 'hebdomadaire', nombre=3)
+            self.assertEqual({timezone.localtime(d).hour for d, _ in creneaux}, {9})
+            ecart = creneaux[2][0].timestamp() - creneaux[1][0].timestamp()
+            self.assertEqual(ecart, (timedelta(weeks=1) - timedelta(hours=1)).total_seconds())
+
+    def test_serie_de_52_semaines_en_quelques_requetes(self):
+        semaine_10 = (self.debut + timedelta(weeks=10), self.fin + timedelta(weeks=10))
+        # Arbre de l'espace chargé avant la série
+        self.assertEqual(moteur.conflits(self.espace.pk, *semaine_10), [])
+        # Dont l'abonnement du membre et les règles de tarif (grille absente du cache)
+        with self.assertNumQueries(9):
+            resultat = reserver_serie(self.membre, self.espace, self.debut, self.fin, 'hebdomadaire',
+                                      nombre=52, statut='confirmee')
+        self.assertEqual(resultat.statut, ResultatSerie.OK)
+        self.assertEqual(Reservation.objects.filter(serie=resultat.serie).count(), 52)
+        self.assertEqual(resultat.reservations[0].prix_total, 40)
+        # Le moteur de disponibilité voit les occurrences créées en masse
+        self.assertEqual(moteur.conflits(self.espace.pk, *semaine_10), [resultat.reservations[10].pk])
+        self.assertFalse(est_disponible(self.espace, *semaine_10))
+
+    def test_conflits_par_occurrence(self):
+        occupee = Reservation.objects.create(
+            membre=self.membre, espace=self.espace, statut='confirmee', prix_total=20,
+            date_debut=self.debut + timedelta(weeks=2, hours=1), date_fin=self.fin + timedelta(weeks=3),
+        )
+        resultat = reserver_serie(self.membre, self.espace, self.debut, self.fin, 'hebdomadaire', nombre=6)
+        self.assertEqual(len(resultat.reservations), 4)
+        self.assertEqual([(debut, ids) for debut, _, ids in resultat.conflits], [
+            (self.debut + timedelta(weeks=2), [occupee.pk]),
+            (self.debut + timedelta(weeks=3), [occupee.pk]),
+        ])
+        refus = reserver_serie(self.membre, self.espace, self.debut, self.fin, 'hebdomadaire', nombre=6,
+                               tout_ou_rien=True)
+        self.assertEqual(refus.statut, ResultatSerie.CONFLIT)
+        self.assertEqual(Reservation.objects.filter(serie__isnull=False).count(), 4)
+
+    def test_formulaire_de_serie(self):
+        self.client.force_login(self.membre)
+        reponse = self.client.post(reverse('reserver_espace'), {
+            'espace': self.espace.pk,
+            'date_debut': '2030-01-01T09:00', 'date_fin': '2030-01-01T11:00',
+            'frequence': 'hebdomadaire', 'intervalle': 1, 'nombre_occurrences': 10,
+            'exceptions': '08/01/2030',
+        })
+        self.assertRedirects(reponse, reverse('mes_reservations'))
+        self.assertEqual(Reservation.objects.filter(membre=self.membre).count(), 9)
+
+
+class OccupationTests(TestCase):
+
+    def setUp(self):
+        cache_modeles.cache.clear()
+        self.membre = User.objects.create_user('membre', password='x')
+        type_espace = TypeEspace.objects.create(nom='Bureau')
+        self.espace = EspaceTravail.objects.create(nom='B1', type_espace=type_espace, capacite=2, prix_heure=10)
+        self.lundi = date(2030, 1, 7)
+
+    def reserver(self, debut, fin, statut='confirmee'):
+        return Reservation.objects.create(
+            membre=self.membre, espace=self.espace, statut=statut, prix_total=10,
+            date_debut=timezone.make_aware(debut), date_fin=timezone.make_aware(fin),
+        )
+
+    def test_repartition_par_heure(self):
+        self.reserver(datetime(2030, 1, 7, 9, 30), datetime(2030, 1, 7, 11, 15))
+        self.reserver(datetime(2030, 1, 8, 14), datetime(2030, 1, 8, 14, 45), statut='annulee')
+        # Du dimanche 22 h au lundi suivant 1 h : coupée entre les deux semaines
+        self.reserver(datetime(2030, 1, 13, 22), datetime(2030, 1, 14, 1))
+        matrices = occupation.matrices([self.espace.id], self.lundi, self.lundi + timedelta(days=7))[self.espace.id]
+        semaine, suivante = matrices[self.lundi], matrices[self.lundi + timedelta(weeks=1)]
+        self.assertEqual(semaine[9:12], [0.5, 1.0, 0.25])
+        self.assertEqual(semaine[24 + 14], 0)
+        self.assertEqual(semaine[-2:], [1.0, 1.0])
+        self.assertEqual(suivante[:2], [1.0, 0])
+        self.assertAlmostEqual(sum(semaine), 3.75)
+
+    def test_seules_les_semaines_touchees_sont_recalculees(self):
+        fin = self.lundi + timedelta(weeks=3)
+        occupation.matrices([self.espace.id], self.lundi, fin)
+        with self.assertNumQueries(0):
+            occupation.matrices([self.espace.id], self.lundi, fin)
+        self.reserver(datetime(2030, 1, 15, 10), datetime(2030, 1, 15, 12))
+        with self.assertNumQueries(1):
+            matrices = occupation.matrices([self.espace.id], self.lundi, fin)[self.espace.id]
+        self.assertEqual(matrices[self.lundi + timedelta(weeks=1)][24 + 10:24 + 12], [1.0, 1.0])
+        self.assertEqual(cache_modeles.cache.get(occupation.cle(self.espace.id, self.lundi)), [0] * 168)
+
+    def test_api_occupation(self):
+        gestionnaire = User.objects.create_user('gestionnaire', password='x')
+        RoleUtilisateur.objects.create(user=gestionnaire, role='gestionnaire')
+        self.client.force_login(gestionnaire)
+        # Semaine proche : l'API refuse les périodes au-delà de l'horizon des devis
+        lundi = occupation.lundi(timezone.localdate()) + timedelta(weeks=2)
+        self.reserver(datetime(lundi.year, lundi.month, lundi.day, 8), datetime(lundi.year, lundi.month, lundi.day, 20))
+        reponse = self.client.get(reverse('api_occupation_admin'),
+                                  {'debut': lundi.isoformat(), 'fin': (lundi + timedelta(days=6)).isoformat()})
+        donnees = reponse.json()
+        self.assertEqual(donnees['semaines'], [lundi.isoformat()])
+        espace = donnees['espaces'][0]
+        self.assertEqual(espace['jours'][0][8:20], [1.0] * 12)
+        # 12 heures sur les 7 × 12 heures d'ouverture de la semaine
+        self.assertAlmostEqual(espace['taux'], round(1 / 7, 4))
+        self.assertEqual(self.client.get(reverse('dashboard_admin')).status_code, 200)
+        # Date inexistante, puis dates en bout de calendrier ou hors de l'horizon
+        for parametres in ({'debut': '2030-02-30'}, {'fin': '9999-12-31'}, {'fin': '0001-01-03'},
+                           {'debut': '2000-01-03', 'fin': '2000-01-09'}):
+            with self.subTest(**parametres):
+                reponse = self.client.get(reverse('api_occupation_admin'), parametres)
+                self.assertEqual(reponse.status_code, 400)
+                self.assertIn('erreur', reponse.json())
+
+    def test_taux_sur_les_seuls_jours_de_la_periode(self):
+        # Mercredi entièrement occupé pendant les heures d'ouverture
+        self.reserver(datetime(2030, 1, 9, 8), datetime(2030, 1, 9, 20))
+        mercredi = self.lundi + timedelta(days=2)
+        self.assertEqual(occupation.taux_periode([self.espace.id], mercredi, mercredi), {self.espace.id: 1.0})
+        # Du lundi au jeudi : un jour sur quatre, là où la semaine entière en compterait sept
+        jeudi = self.lundi + timedelta(days=3)
+        self.assertEqual(occupation.taux_periode([self.espace.id], self.lundi, jeudi)[self.espace.id], 0.25)
+        semaines = occupation.occupation([self.espace.id], self.lundi, jeudi)
+        self.assertEqual(semaines[self.espace.id].taux, round(1 / 7, 4))
+
+
+class RevenusTests(TestCase):
+
+    def setUp(self):
+        self.membre = User.objects.create_user('membre', password='x')
+        ProfilMembre.objects.create(user=self.membre, type_abonnement='mois')
+        self.sans_profil = User.objects.create_user('sans_profil', password='x')
+        self.bureau = TypeEspace.objects.create(nom='Bureau')
+        self.salle = TypeEspace.objects.create(nom='Salle')
+        self.espaces = {
+            type_espace: EspaceTravail.objects.create(nom=type_espace.nom, type_espace=type_espace,
+                                                      capacite=2, prix_heure=10)
+            for type_espace in (self.bureau, self.salle)
+        }
+        self.jour = timezone.make_aware(datetime(2030, 3, 10, 12))
+
+    def facturer(self, membre, type_espace=None, montant=100, statut='en_attente', jour=None):
+        reservation = type_espace and Reservation.objects.create(
+            membre=membre, espace=self.espaces[type_espace], prix_total=montant,
+            date_debut=self.jour, date_fin=self.jour + timedelta(hours=2),
+        )
+        return enregistrer_facture(Facture(
+            membre=membre, reservation=reservation, montant_total=montant, statut=statut,
+            date_creation=jour or self.jour, date_echeance=self.jour + timedelta(days=30),
+        ))
+
+    def cumuls(self):
+        return sorted(
+            RevenuJournalier.objects.exclude(**{nom: 0 for nom in revenus.MESURES})
+            .values_list('jour', 'type_espace_id', 'type_abonnement', *revenus.MESURES)
+        )
+
+    def test_cumuls_tenus_comme_une_reconstruction(self):
+        payee = self.facturer(self.membre, self.bureau, 120)
+        annulee = self.facturer(self.membre, self.salle, 80)
+        self.facturer(self.sans_profil, montant=50, jour=self.jour + timedelta(days=40))
+        payee.statut = 'payee'
+        payee.save()
+        annulee.statut = 'annulee'
+        annulee.save()
+        paiement = HistoriquePaiement.objects.create(facture=payee, montant=120,
+                                                     date_paiement=self.jour + timedelta(days=2))
+        HistoriquePaiement.objects.create(facture=payee, montant=5).delete()
+        reservation = Reservation.objects.create(
+            membre=self.membre, espace=self.espaces[self.salle], prix_total=30,
+            date_debut=self.jour, date_fin=self.jour + timedelta(hours=1),
+        )
+        self.assertEqual(len(facturer_reservations_en_attente(Reservation.objects.filter(pk=reservation.pk))), 1)
+
+        incremental = self.cumuls()
+        self.assertIn(
+            (self.jour.date(), self.bureau.id, 'mois', 1, 120, 1, 120, 0, 0), incremental,
+        )
+        self.assertIn((paiement.date_paiement.date(), self.bureau.id, 'mois', 0, 0, 0, 0, 1, 120), incremental)
+        revenus.reconstruire()
+        self.assertEqual(self.cumuls(), incremental)
+
+        # Suppression (et paiements supprimés en cascade) : plus rien à compter
+        Facture.objects.all().delete()
+        self.assertEqual(self.cumuls(), [])
+
+    def test_rapports(self):
+        self.facturer(self.membre, self.bureau, 100, statut='payee')
+        self.facturer(self.membre, self.salle, 40, statut='payee', jour=self.jour + timedelta(days=31))
+        self.facturer(self.sans_profil, montant=10)
+        debut, fin = date(2030, 3, 1), date(2030, 4, 30)
+        with self.assertNumQueries(1):
+            par_mois = revenus.rapport(debut, fin)
+        self.assertEqual([(ligne['groupe'], ligne['montant_emis'], ligne['montant_paye']) for ligne in par_mois],
+                         [(date(2030, 3, 1), 110, 100), (date(2030, 4, 1), 40, 40)])
+        par_type = {ligne['groupe']: ligne['montant_emis'] for ligne in revenus.rapport(debut, fin, par='type_espace')}
+        self.assertEqual(par_type, {None: 10, 'Bureau': 100, 'Salle': 40})
+        par_abonnement = revenus.rapport(debut, fin, par='abonnement')
+        self.assertEqual({ligne['groupe']: ligne['nombre_factures'] for ligne in par_abonnement}, {'': 1, 'mois': 2})
+        with self.assertRaises(ValueError):
+            revenus.rapport(debut, fin, par='membre')
+
+        # Un type d'espace supprimé : ses revenus restent, sans type
+        self.salle.delete()
+        self.assertEqual(revenus.totaux(debut, fin)['montant_emis'], 150)
+
+        gestionnaire = User.objects.create_user('gestionnaire', password='x')
+        RoleUtilisateur.objects.create(user=gestionnaire, role='gestionnaire')
+        self.client.force_login(gestionnaire)
+        donnees = self.client.get(reverse('api_revenus_admin'),
+                                  {'debut': '2030-03-01', 'fin': '2030-04-30', 'par': 'type_espace'}).json()
+        self.assertEqual(Decimal(donnees['total']['montant_paye']), 140)
+        self.assertEqual([ligne['groupe'] for ligne in donnees['lignes']], [None, 'Bureau'])
+        self.assertEqual(self.client.get(reverse('api_revenus_admin'), {'par': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_revenus_admin'), {'fin': '2030-02-30'}).status_code, 400)
+
+    def test_revenus_du_mois_lus_dans_les_cumuls(self):
+        maintenant = timezone.now()
+        self.facturer(self.membre, self.bureau, 75, statut='payee', jour=maintenant)
+        self.facturer(self.membre, self.bureau, 30, jour=maintenant)
+        self.assertEqual(statistiques.calculer().revenus_mois, 75)
+
+
+class StatistiquesTests(TestCase):
+
+    def setUp(self):
+        self.type_espace = TypeEspace.objects.create(nom='Bureau')
+        self.creer_espace('B1')
+
+    def creer_espace(self, nom):
+        return EspaceTravail.objects.create(nom=nom, type_espace=self.type_espace, capacite=2, prix_heure=10)
+
+    def test_snapshot_recalcule_une_fois_perime(self):
+        premier = statistiques.snapshot()
+        self.assertEqual(premier.total_espaces, 1)
+        self.creer_espace('B2')
+        # Encore frais : une seule lecture, chiffres inchangés
+        with self.assertNumQueries(1):
+            self.assertEqual(statistiques.snapshot().total_espaces, 1)
+        plus_tard = premier.date_calcul + timedelta(seconds=statistiques.FRAICHEUR + 1)
+        with mock.patch('coworking.statistiques.timezone.now', return_value=plus_tard):
+            recalcule = statistiques.snapshot()
+        self.assertEqual((recalcule.total_espaces, recalcule.date_calcul), (2, plus_tard))
+        self.assertEqual(StatistiquesSnapshot.objects.count(), 1)
+
+    def test_snapshot_recalcule_le_jour_suivant(self):
+        statistiques.snapshot()
+        StatistiquesSnapshot.objects.update(date_calcul=timezone.now() - timedelta(days=1))
+        self.creer_espace('B2')
+        # Même avec une fraîcheur très large, les chiffres « du jour » sont recalculés
+        self.assertEqual(statistiques.snapshot(fraicheur=7 * 24 * 3600).total_espaces, 2)
+
+    def test_commande_rafraichir(self):
+        statistiques.snapshot()
+        self.creer_espace('B2')
+        sortie = StringIO()
+        call_command('rafraichir_statistiques', stdout=sortie)
+        self.assertIn('Statistiques recalculées', sortie.getvalue())
+        self.assertEqual(StatistiquesSnapshot.objects.get().total_espaces, 2)
+
+
+class PaginationTests(TestCase):
+
+    def setUp(self):
+        organisateur = User.objects.create_user('organisateur')
+        debut = timezone.make_aware(datetime(2030, 1, 7, 9))
+        # Deux événements par jour : la clé (date_debut, id) départage les égalités
+        for rang in range(8):
+            Evenement.objects.create(
+                nom=f'E{rang}', description='', lieu='Salle', places_max=10, organisateur=organisateur,
+                date_debut=debut + timedelta(days=rang // 2), date_fin=debut + timedelta(days=rang // 2, hours=2),
+            )
+        self.evenements = Evenement.objects.all()
+        self.attendu = list(self.evenements.order_by('-date_debut', '-id').values_list('id', flat=True))
+
+    def page(self, cle=('-date_debut', '-id'), **parametres):
+        requete = RequestFactory().get('/', parametres)
+        return pagination.paginer(requete, self.evenements, cle=cle, taille=3)
+
+    def test_parcours_dans_les_deux_sens(self):
+        pages = [self.page(filtre='tous')]
+        while pages[-1].suivant:
+            pages.append(self.page(apres=pages[-1].suivant, filtre='tous'))
+        self.assertEqual([[e.id for e in page] for page in pages],
+                         [self.attendu[0:3], self.attendu[3:6], self.attendu[6:]])
+        self.assertIsNone(pages[0].precedent)
+        # Les liens gardent les autres paramètres, sans les curseurs
+        self.assertEqual(pages[1].parametres, 'filtre=tous')
+
+        retour = self.page(avant=pages[2].precedent)
+        self.assertEqual([e.id for e in retour], self.attendu[3:6])
+        self.assertEqual([e.id for e in self.page(avant=retour.precedent)], self.attendu[0:3])
+        self.assertIsNone(self.page(avant=retour.precedent).precedent)
+
+    def test_cle_croissante_et_curseur_invalide(self):
+        croissant = self.page(cle=('id',))
+        self.assertEqual([e.id for e in croissant], sorted(self.attendu)[:3])
+        suivante = self.page(cle=('id',), apres=croissant.suivant)
+        self.assertEqual([e.id for e in suivante], sorted(self.attendu)[3:6])
+        # Un curseur illisible ramène à la première page
+        self.assertEqual([e.id for e in self.page(apres='nimporte')], self.attendu[:3])
+        with self.assertRaises(ValueError):
+            self.page(cle=('-date_debut', 'id'))
+
+    def test_comptes(self):
+        self.assertEqual(self.page().total, pagination.Compte(8))
+        self.assertEqual(pagination.compter(self.evenements, approximatif=False), pagination.Compte(8))
+        with mock.patch.object(pagination, 'PLAFOND_COMPTE', 5):
+            plafonne = self.page().total
+            self.assertEqual(str(plafonne), '~5')
+            self.assertTrue(plafonne.approximatif)
+            # ?compte=exact demande le COUNT complet
+            self.assertEqual(self.page(compte='exact').total, pagination.Compte(8))
+        requete = RequestFactory().get('/')
+        self.assertIsNone(pagination.paginer(requete, self.evenements, compte=False).total)
+
+
+class ExportsTests(TestCase):
+
+    def setUp(self):
+        gestionnaire = User.objects.create_user('gestionnaire')
+        RoleUtilisateur.objects.create(user=gestionnaire, role='gestionnaire')
+        self.client.force_login(gestionnaire)
+        self.membre = User.objects.create_user('membre')
+        type_espace = TypeEspace.objects.create(nom='Bureau')
+        self.espace = EspaceTravail.objects.create(nom='B1', type_espace=type_espace, capacite=2, prix_heure=10)
+        self.autre = EspaceTravail.objects.create(nom='B2', type_espace=type_espace, capacite=2, prix_heure=10)
+        self.reservations = [
+            Reservation.objects.create(
+                membre=self.membre, espace=espace, statut=statut, prix_total=prix,
+                date_debut=timezone.make_aware(datetime(2030, 1, jour, 9)),
+                date_fin=timezone.make_aware(datetime(2030, 1, jour, 11)),
+            )
+            for jour, espace, statut, prix in (
+                (7, self.espace, 'confirmee', '20.00'),
+                (8, self.autre, 'confirmee', '15.50'),
+                (9, self.espace, 'annulee', '20.00'),
+                (31, self.espace, 'confirmee', '20.00'),
+            )
+        ]
+
+    def exporter(self, **parametres):
+        return self.client.get(reverse('exporter_admin', args=['reservations']), parametres)
+
+    def test_csv_filtre(self):
+        reponse = self.exporter(statut='confirmee', espace=self.espace.id, du='2030-01-01', au='2030-01-30')
+        self.assertEqual(reponse['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('reservations_2030-01-01_2030-01-30.csv', reponse['Content-Disposition'])
+        lignes = b''.join(reponse.streaming_content).decode().splitlines()
+        self.assertEqual(lignes[0], '\ufeffid;membre;espace;date_debut;date_fin;statut;prix_total;date_creation')
+        # Seule la réservation confirmée de B1 en janvier avant le 31 ; dates en heure locale
+        reservation = self.reservations[0]
+        debut, fin = (timezone.localtime(moment).isoformat(sep=' ', timespec='seconds')
+                      for moment in (reservation.date_debut, reservation.date_fin))
+        self.assertEqual(len(lignes), 2)
+        self.assertTrue(lignes[1].startswith(f'{reservation.id};membre;B1;{debut};{fin};confirmee;20.00;'))
+
+    def test_queryset_filtres_et_bornes_incluses(self):
+        ids = [ligne[0] for ligne in exports.queryset('reservations', {'statut': 'confirmee'})]
+        self.assertEqual(ids, [self.reservations[i].id for i in (0, 1, 3)])
+        # « au » inclut toute la journée
+        ids = [ligne[0] for ligne in exports.queryset('reservations', du=date(2030, 1, 8), au=date(2030, 1, 9))]
+        self.assertEqual(ids, [self.reservations[1].id, self.reservations[2].id])
+        self.assertEqual(
+            list(exports.partitions(date(2030, 1, 30), date(2030, 2, 2), 'mois')),
+            [('2030-01', date(2030, 1, 30), date(2030, 1, 31)), ('2030-02', date(2030, 2, 1), date(2030, 2, 2))],
+        )
+
+    def test_parquet(self):
+        if exports.pyarrow is None:
+            self.skipTest("pyarrow n'est pas installé")
+        lignes = exports.queryset('reservations', {'espace': self.espace.id})
+        contenu = b''.join(exports.flux('reservations', 'parquet', lignes, taille_lot=2))
+        table = exports.pyarrow.parquet.read_table(BytesIO(contenu))
+        self.assertEqual(table.column_names, exports.JEUX['reservations'].entetes)
+        # Deux groupes de lignes pour trois lignes par lots de deux
+        self.assertEqual(exports.pyarrow.parquet.ParquetFile(BytesIO(contenu)).num_row_groups, 2)
+        self.assertEqual(table.column('statut').to_pylist(), ['confirmee', 'annulee', 'confirmee'])
+        self.assertEqual(table.column('prix_total').to_pylist(), [Decimal('20.00')] * 3)
+        self.assertEqual(table.column('date_debut').to_pylist()[0], self.reservations[0].date_debut)
+
+    def test_format_indisponible_et_date_inexistante(self):
+        for parametres in ({'format': 'xlsx'}, {'du': '2030-02-30'}, {'au': '9999-12-31'}):
+            with self.subTest(**parametres):
+                reponse = self.exporter(**parametres)
+                self.assertRedirects(reponse, reverse('liste_reservations_admin'), fetch_redirect_response=False)
+
+
+class ProfilsReglagesTests(SimpleTestCase):
+    """Profils de base et de cache choisis par l'environnement (Coworkong_system.settings)."""
+
+    def reglages(self, **environ):
+        chemin = os.path.join(settings.BASE_DIR, 'Coworkong_system', 'settings.py')
+        # Les variables de profil de l'environnement courant ne doivent pas s'en mêler
+        propre = {cle: valeur for cle, valeur in os.environ.items() if not cle.startswith(('COWORKING_', 'POSTGRES_'))}
+        with mock.patch.dict(os.environ, {**propre, **environ}, clear=True):
+            return runpy.run_path(chemin)
+
+    def test_sqlite_par_defaut(self):
+        reglages = self.reglages()
+        base = reglages['DATABASES']['default']
+        self.assertEqual(base['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(base['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('PRAGMA journal_mode=WAL', base['OPTIONS']['init_command'])
+        self.assertEqual(reglages['CACHES']['default']['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        base = self.reglages(COWORKING_SQLITE_OPTIMISE='0', COWORKING_SQLITE='autre.sqlite3')['DATABASES']['default']
+        self.assertEqual(base['NAME'], 'autre.sqlite3')
+        self.assertNotIn('OPTIONS', base)
+
+    def test_postgres(self):
+        base = self.reglages(COWORKING_BASE='postgres', POSTGRES_DB='cw')['DATABASES']['default']
+        self.assertEqual((base['ENGINE'], base['NAME']), ('django.db.backends.postgresql', 'cw'))
+        self.assertEqual((base['CONN_MAX_AGE'], base['CONN_HEALTH_CHECKS']), (60, True))
+        self.assertFalse(base['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertNotIn('pool', base['OPTIONS'])
+
+        base = self.reglages(COWORKING_BASE='postgres', COWORKING_BASE_POOL='10',
+                             COWORKING_PGBOUNCER='1')['DATABASES']['default']
+        # Avec le pool, les connexions persistantes sont désactivées
+        self.assertEqual(base['CONN_MAX_AGE'], 0)
+        self.assertEqual(base['OPTIONS']['pool'], {'min_size': 2, 'max_size': 10, 'timeout': 10})
+        self.assertTrue(base['DISABLE_SERVER_SIDE_CURSORS'])
+
+    def test_profils_de_cache(self):
+        for profil, backend in (
+            ('fichier', 'django.core.cache.backends.filebased.FileBasedCache'),
+            ('base', 'django.core.cache.backends.db.DatabaseCache'),
+        ):
+            with self.subTest(profil=profil):
+                cache = self.reglages(COWORKING_CACHE=profil)['CACHES']['default']
+                self.assertEqual(cache['BACKEND'], backend)
+
+
+class TarifsTests(TestCase):
+
+    def setUp(self):
+        cache_modeles.cache.clear()
+        self.membre = User.objects.create_user('membre', password='x')
+        ProfilMembre.objects.create(user=self.membre, type_abonnement='mois')
+        self.bureau = TypeEspace.objects.create(nom='Bureau')
+        self.espace = EspaceTravail.objects.create(nom='B1', type_espace=self.bureau, capacite=2, prix_heure=10)
+        self.autre = EspaceTravail.objects.create(nom='B2', type_espace=self.bureau, capacite=2, prix_heure='12.34')
+        # Lundi
+        self.lundi = date(2030, 1, 7)
+
+    def moment(self, jours, heure, minute=0):
+        return timezone.make_aware(datetime.combine(self.lundi + timedelta(days=jours), datetime.min.time())
+                                   + timedelta(hours=heure, minutes=minute))
+
+    def test_prix_horaire_sans_regle(self):
+        self.assertEqual(tarifs.prix(self.autre, self.moment(0, 9), self.moment(0, 11, 30)), Decimal('30.85'))
+        # Une semaine et un jour : le prix ne dépend pas de la durée
+        self.assertEqual(tarifs.prix(self.espace, self.moment(0, 0), self.moment(8, 0)), Decimal('1920.00'))
+
+    def test_pointe_plafond_et_remise(self):
+        RegleTarif.objects.create(nom='Matin', genre='pointe', type_espace=self.bureau,
+                                  heure_debut=9, heure_fin=12, coefficient='1.5')
+        # Du lundi 8 h au lundi 10 h 30 : 1 h à 10 €, 1 h 30 à 15 €
+        self.assertEqual(tarifs.prix(self.espace, self.moment(0, 8), self.moment(0, 10, 30)), Decimal('32.50'))
+        # Le samedi n'est pas en pointe
+        self.assertEqual(tarifs.prix(self.espace, self.moment(5, 9), self.moment(5, 10)), Decimal('10.00'))
+        # Une règle de l'espace remplace celle de son type
+        RegleTarif.objects.create(nom='Soir', genre='pointe', espace=self.espace,
+                                  heure_debut=18, heure_fin=20, coefficient=2)
+        self.assertEqual(tarifs.prix(self.espace, self.moment(0, 9), self.moment(0, 10)), Decimal('10.00'))
+        self.assertEqual(tarifs.prix(self.autre, self.moment(0, 9), self.moment(0, 10)), Decimal('18.51'))
+
+        RegleTarif.objects.create(nom='Journée', genre='plafond_jour', plafond=60)
+        RegleTarif.objects.create(nom='Mensuels', genre='remise', type_abonnement='mois', pourcentage=10)
+        # Lundi 8 h - mardi 20 h : deux journées plafonnées
+        debut, fin = self.moment(0, 8), self.moment(1, 20)
+        self.assertEqual(tarifs.prix(self.espace, debut, fin), Decimal('120.00'))
+        self.assertEqual(tarifs.prix(self.espace, debut, fin, tarifs.abonnement(self.membre)), Decimal('108.00'))
+        resultat = reserver(self.membre, self.espace, debut, fin)
+        self.assertEqual(resultat.reservation.prix_total, Decimal('108.00'))
+
+    def test_devis_en_lot_depuis_le_cache(self):
+        creneaux = [(espace.id, self.moment(jour, 9), self.moment(jour, 10))
+                    for espace in (self.espace, self.autre) for jour in range(50)]
+        with self.assertNumQueries(2):
+            tarifs.devis(creneaux)
+        with self.assertNumQueries(0):
+            prix = tarifs.devis(creneaux)
+        self.assertEqual(prix[0], 10)
+        self.assertEqual(tarifs.devis([(0, self.moment(0, 9), self.moment(0, 10))]), [None])
+        RegleTarif.objects.create(nom='Tout', genre='pointe', jours='0123456', heure_debut=0, heure_fin=24,
+                                  coefficient=2)
+        self.assertEqual(tarifs.devis(creneaux[:1]), [Decimal('20.00')])
+
+    def test_api_devis(self):
+        self.client.force_login(self.membre)
+        RegleTarif.objects.create(nom='Mensuels', genre='remise', type_abonnement='mois', pourcentage=50)
+        # Dates proches d'aujourd'hui : api_devis refuse celles au-delà de tarifs.HORIZON
+        jour = (timezone.localdate() + timedelta(days=7)).isoformat()
+        reponse = self.client.post(reverse('api_devis'), {'creneaux': [
+            {'espace': self.espace.id, 'date_debut': f'{jour}T09:00', 'date_fin': f'{jour}T11:00'},
+            {'espace': self.espace.id, 'date_debut': f'{jour}T11:00', 'date_fin': f'{jour}T09:00'},
+            {'espace': 0, 'date_debut': f'{jour}T09:00', 'date_fin': f'{jour}T11:00'},
+        ]}, content_type='application/json')
+        devis = reponse.json()['devis']
+        self.assertEqual(devis[0]['prix'], '10.00')
+        self.assertEqual([d.get('erreur') for d in devis[1:]], ['Créneau invalide', 'Espace inconnu'])
+        self.assertEqual(self.client.post(reverse('api_devis'), 'x', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_devis')).status_code, 405)
+
+    def test_api_devis_creneaux_refuses(self):
+        jour = timezone.localdate() + timedelta(days=7)
+        reponse = self.client.post(reverse('api_devis'), {'creneaux': [
+            # Une date avec fuseau, l'autre sans
+            {'espace': self.espace.id, 'date_debut': f'{jour}T09:00', 'date_fin': f'{jour}T11:00+00:00'},
+            {'espace': self.espace.id, 'date_debut': f'{jour}T09:00', 'date_fin': f'{jour + timedelta(days=60)}T09:00'},
+            {'espace': self.espace.id, 'date_debut': '0001-01-02T00:00', 'date_fin': '9999-12-30T00:00'},
+            {'espace': self.espace.id, 'date_debut': '0001-01-02T00:00', 'date_fin': '0001-01-03T00:00'},
+            {'espace': self.espace.id, 'date_debut': 'demain', 'date_fin': f'{jour}T11:00'},
+            {'espace': self.espace.id, 'date_debut': f'{jour}T09:00'},
+        ]}, content_type='application/json')
+        devis = reponse.json()['devis']
+        self.assertEqual(devis[0]['prix'], '20.00')
+        trop_long = f'Créneau de plus de {tarifs.DUREE_MAX_CRENEAU.days} jours'
+        trop_loin = f"Créneau à plus de {tarifs.HORIZON.days} jours d'aujourd'hui"
+        self.assertEqual([d.get('erreur') for d in devis[1:]], [
+            trop_long, trop_long, trop_loin, 'Créneau invalide', 'Créneau invalide',
+        ])
+
+
+class GenerationDonneesTests(TestCase):
+    def generer(self, **options):
+        call_command('generer_donnees', membres=30, gestionnaires=1, espaces=4, reservations=400, evenements=5,
+                     notifications=100, reference=date(2030, 1, 1), stdout=StringIO(), **options)
+
+    def test_jeu_reproductible_et_coherent(self):
+        self.generer()
+        reservations = Reservation.objects.filter(membre__username__startswith='gen_')
+        self.assertEqual(reservations.count(), 400)
+        actives = sorted(reservations.filter(statut__in=['en_attente', 'confirmee'])
+                         .values_list('espace_id', 'date_debut', 'date_fin'))
+        self.assertFalse([
+            (a, b) for a, b in zip(actives, actives[1:]) if a[0] == b[0] and b[1] < a[2]
+        ])
+        self.assertEqual(
+            revenus.totaux(date(2020, 1, 1), date(2040, 1, 1))['montant_emis'],
+            Facture.objects.exclude(statut='annulee').aggregate(total=Sum('montant_total'))['total'],
+        )
+        evenement = Evenement.objects.first()
+        self.assertEqual(evenement.nb_inscrits, evenement.inscription_set.count())
+        with self.assertRaises(CommandError):
+            self.generer()
+
+        tirage = list(reservations.order_by('id').values_list('date_debut', 'prix_total', 'statut'))
+        self.generer(prefixe='bis_')
+        self.assertEqual(tirage, list(
+            Reservation.objects.filter(membre__username__startswith='bis_')
+            .order_by('id').values_list('date_debut', 'prix_total', 'statut')
+        ))
+
+
+class RechercheMembresTests(TestCase):
+
+    def setUp(self):
+        for username, prenom, nom, entreprise, telephone in (
+            ('cdupont', 'Camille', 'Dupont', 'Atelier Nord', '06 12 34 56 78'),
+            ('ldupontel', 'Léa', 'Dupontel', '', ''),
+            ('ptellier', 'Paul', 'Tellier', '', ''),
+            ('amartin', 'Alice', 'Martin', 'Studio Delta', ''),
+            ('jo', 'Jo', 'Li', '', ''),
+        ):
+            membre = User.objects.create_user(username, first_name=prenom, last_name=nom)
+            RoleUtilisateur.objects.create(user=membre, role='membre')
+            ProfilMembre.objects.create(user=membre, entreprise=entreprise, telephone=telephone)
+        index_membres().reconstruire()
+
+    def noms(self, requete, limite=10):
+        ids = rechercher_membres(requete, limite)
+        noms = dict(User.objects.filter(id__in=ids).values_list('id', 'username'))
+        return [noms[user_id] for user_id in ids]
+
+    def test_sous_chaines_sans_accents(self):
+        self.assertEqual(self.noms('LEA'), ['ldupontel'])
+        self.assertEqual(self.noms('atelier camille'), ['cdupont'])
+        # Téléphone saisi sans espaces
+        self.assertEqual(self.noms('0612345'), ['cdupont'])
+        self.assertEqual(self.noms('dupont'), ['ldupontel', 'cdupont'])
+
+    def test_classement(self):
+        # En début de mot (Tellier) avant le milieu d'un mot, puis les documents courts d'abord
+        self.assertEqual(self.noms('tel'), ['ptellier', 'ldupontel', 'cdupont'])
+        self.assertEqual(self.noms('tel', limite=1), ['ptellier'])
+
+    def test_fautes_de_frappe(self):
+        self.assertEqual(self.noms('mratin'), ['amartin'])
+        self.assertEqual(self.noms('martn'), ['amartin'])
+        self.assertEqual(self.noms('marteen'), [])
+        # Mots trop courts pour être corrigés
+        self.assertEqual(self.noms('jp'), [])
+
+    def test_mots_courts_sans_index(self):
+        self.assertEqual(self.noms('jo'), ['jo'])
+        self.assertCountEqual(self.noms('li'), ['jo', 'amartin', 'cdupont', 'ptellier'])
+        self.assertEqual(self.noms('"'), [])
+
+    def test_mise_a_jour_par_les_signaux(self):
+        membre = User.objects.get(username='jo')
+        with self.captureOnCommitCallbacks(execute=True):
+            membre.last_name = 'Zanetti'
+            membre.save()
+        self.assertEqual(self.noms('zanetti'), ['jo'])
+        with self.captureOnCommitCallbacks(execute=True):
+            membre.delete()
+        self.assertEqual(self.noms('zanetti'), [])
+
+    def test_echapper_like(self):
+        self.assertEqual(echapper_like('50%_a\\b'), '50\\%\\_a\\\\b')
+
+    def test_liste_tronquee_signalee(self):
+        gestionnaire = User.objects.create_user('gestionnaire', password='x')
+        RoleUtilisateur.objects.create(user=gestionnaire, role='gestionnaire')
+        self.client.force_login(gestionnaire)
+        reponse = self.client.get(reverse('liste_membres_admin'), {'recherche': 'dupont'})
+        self.assertFalse(reponse.context['recherche_tronquee'])
+        with mock.patch.object(views, 'LIMITE_RECHERCHE_LISTE', 1):
+            reponse = self.client.get(reverse('liste_membres_admin'), {'recherche': 'dupont'})
+        self.assertTrue(reponse.context['recherche_tronquee'])
+        self.assertContains(reponse, 'recherche-tronquee')
+
+
+class CompteurNotificationsTests(TestCase):
+
+    def setUp(self):
+        cache_modeles.cache.clear()
+        self.membre = User.objects.create_user('membre', password='x')
+        self.autre = User.objects.create_user('autre', password='x')
+
+    def non_lues(self, user):
+        return CompteurNotifications.objects.get(user=user).non_lues
+
+    def verifier(self, membre, autre):
+        self.assertEqual((self.non_lues(self.membre), self.non_lues(self.autre)), (membre, autre))
+        for user in (self.membre, self.autre):
+            self.assertEqual(self.non_lues(user), Notification.objects.filter(destinataire=user, lue=False).count())
+
+    def test_compteur_suit_les_ecritures(self):
+        notification = Notification.objects.create(destinataire=self.membre, titre='A', message='a')
+        Notification.objects.create(destinataire=self.autre, titre='B', message='b')
+        self.verifier(1, 1)
+        # Comme depuis l'administration : save() après modification de lue
+        notification.lue = True
+        notification.save()
+        self.verifier(0, 1)
+        notification.save()
+        self.verifier(0, 1)
+        notification.lue = False
+        notification.save()
+        self.verifier(1, 1)
+        notification.destinataire = self.autre
+        notification.save()
+        self.verifier(0, 2)
+        # Un save() limité à d'autres champs ne touche pas au compteur
+        notification.lue = True
+        notification.titre = 'A bis'
+        notification.save(update_fields=['titre'])
+        self.verifier(0, 2)
+        notification.save()
+        self.verifier(0, 1)
+        Notification.objects.filter(destinataire=self.autre, lue=False).get().delete()
+        self.verifier(0, 0)
+
+    def test_api_notifications_304(self):
+        notification = Notification.objects.create(destinataire=self.membre, titre='A', message='a')
+        self.client.force_login(self.membre)
+        reponse = self.client.get(reverse('api_notifications'))
+        self.assertEqual(reponse.json()['non_lues'], 1)
+        etag = reponse['ETag']
+        reponse = self.client.get(reverse('api_notifications'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(reponse.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.lue = True
+            notification.save()
+        reponse = self.client.get(reverse('api_notifications'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertNotEqual(reponse['ETag'], etag)
+        self.assertEqual(reponse.json()['non_lues'], 0)
+
+
+class DiffusionNotificationsTests(TestCase):
+
+    def setUp(self):
+        self.membres = [User.objects.create_user(f'membre{rang}', password='x') for rang in range(5)]
+
+    def test_diffusion_par_lots(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            total = notifications.diffuser(User.objects.all(), 'Fermeture', 'Lundi férié', taille_lot=2)
+        self.assertEqual(total, 5)
+        self.assertEqual(Notification.objects.filter(titre='Fermeture').count(), 5)
+        self.assertEqual(set(CompteurNotifications.objects.values_list('non_lues', flat=True)), {1})
+        # Un destinataire présent deux fois dans une liste compte deux notifications
+        premier = self.membres[0].id
+        self.assertEqual(notifications.diffuser([premier, premier, self.membres[1].id], 'Rappel', 'r'), 3)
+        self.assertEqual(CompteurNotifications.objects.get(user_id=premier).non_lues, 3)
+
+    def test_envoi_immediat_sous_le_seuil(self):
+        resultat = notifications.envoyer([membre.id for membre in self.membres[:3]], 'A', 'a')
+        self.assertEqual(resultat, (3, False))
+        # Écrites dans la requête, sans attendre la validation
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_envoi_differe_au_dela_du_seuil(self):
+        with mock.patch.object(notifications, 'SEUIL_ARRIERE_PLAN', 3), \
+                mock.patch.object(notifications, '_executeur_fond') as executeur:
+            with self.captureOnCommitCallbacks() as rappels:
+                resultat = notifications.envoyer(User.objects.all(), 'A', 'a')
+            self.assertEqual(resultat, (5, True))
+            # Rien n'est écrit ni confié au thread avant la validation de la transaction
+            self.assertFalse(Notification.objects.exists())
+            executeur.return_value.submit.assert_not_called()
+            for rappel in rappels:
+                rappel()
+        executeur.return_value.submit.assert_called_once()
+
+
+class EnvoiEnArrierePlanTests(TransactionTestCase):
+
+    def test_thread_de_fond(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("base SQLite en mémoire : non partagée entre threads")
+        for rang in range(5):
+            User.objects.create_user(f'membre{rang}', password='x')
+        with mock.patch.object(notifications, 'SEUIL_ARRIERE_PLAN', 3):
+            self.assertEqual(notifications.envoyer(User.objects.all(), 'Fermeture', 'Lundi férié'), (5, True))
+        # Un seul thread de fond : la tâche suivante attend la fin de la diffusion
+        notifications._executeur_fond().submit(lambda: None).result(timeout=30)
+        self.assertEqual(Notification.objects.filter(titre='Fermeture').count(), 5)
+        self.assertEqual(set(CompteurNotifications.objects.values_list('non_lues', flat=True)), {1})
+
+
+class TempsReelTests(TestCase):
+
+    def test_courtier(self):
+        courtier = temps_reel.Courtier()
+
+        async def scenario():
+            premier, second, autre = courtier.abonner(1), courtier.abonner(1), courtier.abonner(2)
+            self.assertEqual(courtier.abonnes({1, 2, 3}), {1, 2})
+            self.assertEqual(courtier.nombre_connexions(), 3)
+            # Publication depuis un autre thread, comme le thread de diffusion
+            publication = threading.Thread(target=courtier.publier, args=(1, {'id': 7}))
+            publication.start()
+            publication.join()
+            self.assertEqual(await asyncio.wait_for(premier[1].get(), 1), {'id': 7})
+            self.assertEqual(await asyncio.wait_for(second[1].get(), 1), {'id': 7})
+            self.assertTrue(autre[1].empty())
+            # Un client trop lent perd les événements au-delà de sa file
+            for rang in range(temps_reel.TAILLE_FILE + 5):
+                courtier.publier(2, {'id': rang})
+            await asyncio.sleep(0)
+            self.assertEqual(autre[1].qsize(), temps_reel.TAILLE_FILE)
+            courtier.desabonner(1, premier)
+            courtier.desabonner(1, second)
+            self.assertEqual(courtier.abonnes({1, 2}), {2})
+
+        asyncio.run(scenario())
+        # Boucle fermée avant le désabonnement : la publication est ignorée sans erreur
+        courtier.publier(2, {'id': 0})
+
+    async def test_flux_notifications(self):
+        url = reverse('flux_notifications')
+        self.assertEqual((await self.async_client.get(url)).status_code, 401)
+
+        membre = await User.objects.acreate_user('membre', password='x')
+        await Notification.objects.acreate(destinataire=membre, titre='Ancienne', message='a')
+        await self.async_client.aforce_login(membre)
+        reponse = await self.async_client.get(url)
+        self.assertEqual(reponse['Content-Type'], 'text/event-stream')
+        flux = aiter(reponse.streaming_content)
+        self.assertEqual(await anext(flux), b'retry: 5000\n\n')
+        self.assertEqual(await anext(flux), b'event: compteur\ndata: {"non_lues": 1}\n\n')
+        self.assertEqual(temps_reel.courtier.abonnes({membre.id}), {membre.id})
+
+        notification = Notification(id=42, destinataire=membre, titre='Nouvelle', message='n',
+                                    type_notification='general', date_creation=timezone.now())
+        temps_reel.publier_notifications([notification])
+        evenement = (await asyncio.wait_for(anext(flux), 1)).decode()
+        self.assertTrue(evenement.startswith('event: notification\n'))
+        self.assertIn('"titre": "Nouvelle"', evenement)
+        # Client déconnecté : le serveur annule la tâche en attente, l'abonnement est retiré
+        attente = asyncio.ensure_future(anext(flux))
+        await asyncio.sleep(0)
+        attente.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await attente
+        self.assertEqual(temps_reel.courtier.abonnes({membre.id}), set())
+
+
+class DisponibiliteTests(TestCase):
+
+    def setUp(self):
+        # Les arbres en mémoire survivent à l'annulation des transactions de test
+        moteur.invalider()
+        self.membre = User.objects.create_user('membre', password='x')
+        type_espace = TypeEspace.objects.create(nom='Bureau')
+        self.espace = EspaceTravail.objects.create(nom='B1', type_espace=type_espace, capacite=2, prix_heure=10)
+        self.autre = EspaceTravail.objects.create(nom='B2', type_espace=type_espace, capacite=2, prix_heure=10)
+        self.origine = (timezone.now() + timedelta(days=2)).replace(hour=8, minute=0, second=0, microsecond=0)
+
+    def heures(self, debut, fin):
+        return self.origine + timedelta(hours=debut), self.origine + timedelta(hours=fin)
+
+    def reserver(self, debut, fin, statut='confirmee'):
+        date_debut, date_fin = self.heures(debut, fin)
+        return Reservation.objects.create(membre=self.membre, espace=self.espace, statut=statut, prix_total=10,
+                                          date_debut=date_debut, date_fin=date_fin)
+
+    def test_arbre_intervalles(self):
+        arbre = ArbreIntervalles([(1, 3, 'a'), (5, 8, 'b'), (2, 6, 'c'), (10, 11, 'd')])
+        # Intervalles semi-ouverts : [1, 3) et [5, 8) ne touchent pas [3, 5)
+        self.assertEqual(arbre.chevauchements(3, 5), [(2, 6, 'c')])
+        self.assertEqual([i[2] for i in arbre.chevauchements(0, 20)], ['a', 'c', 'b', 'd'])
+        self.assertFalse(arbre.chevauche(8, 10))
+        self.assertTrue(arbre.chevauche(7, 9))
+        self.assertFalse(arbre.chevauche(7, 9, exclure='b'))
+        self.assertEqual(ArbreIntervalles([]).chevauchements(0, 20), [])
+
+    def test_conflits_suivent_les_signaux(self):
+        # Arbre chargé vide, puis invalidé par chaque écriture
+        self.assertEqual(moteur.conflits(self.espace.pk, *self.heures(0, 8)), [])
+        premiere = self.reserver(1, 3)
+        self.reserver(2, 4, statut='en_attente')
+        seconde = self.reserver(5, 6)
+        self.assertEqual(moteur.conflits(self.espace.pk, *self.heures(0, 8)), [premiere.pk, seconde.pk])
+        self.assertEqual(moteur.conflits(self.espace.pk, *self.heures(3, 5)), [])
+        self.assertEqual(moteur.conflits(self.espace.pk, *self.heures(0, 8), exclure=premiere.pk), [seconde.pk])
+        premiere.statut = 'annulee'
+        premiere.save()
+        self.assertEqual(moteur.conflits(self.espace.pk, *self.heures(0, 8)), [seconde.pk])
+        self.assertEqual(moteur.espaces_libres([self.espace.pk, self.autre.pk], *self.heures(5, 6)), {self.autre.pk})
+
+    def test_validation_lit_la_base(self):
+        reservation = self.reserver(1, 3)
+        self.assertEqual(moteur.conflits(self.espace.pk, *self.heures(0, 8)), [reservation.pk])
+        # Écriture sans signal, comme depuis un autre processus : l'arbre garde l'ancien état...
+        Reservation.objects.filter(pk=reservation.pk).update(statut='annulee')
+        self.assertEqual(moteur.conflits(self.espace.pk, *self.heures(0, 8)), [reservation.pk])
+        # ... mais pas la validation
+        self.assertTrue(est_disponible(self.espace, *self.heures(0, 8)))
+        self.assertTrue(self.espace.est_disponible(*self.heures(0, 8)))
+        self.assertEqual(conflits_en_base(self.espace.pk, *self.heures(0, 8)), [])
+        # L'arbre est rechargé une fois sa durée de validité écoulée
+        with mock.patch('coworking.disponibilite.time.monotonic', return_value=time.monotonic() + DUREE_VALIDITE + 1):
+            self.assertEqual(moteur.conflits(self.espace.pk, *self.heures(0, 8)), [])
+
+        Reservation.objects.filter(pk=reservation.pk).update(statut='confirmee')
+        self.assertFalse(est_disponible(self.espace, *self.heures(2, 4)))
+        self.assertTrue(est_disponible(self.espace, *self.heures(2, 4), exclure=reservation.pk))
+        debut, fin = (f'{timezone.localtime(moment):%Y-%m-%d %H:%M}' for moment in self.heures(2, 4))
+        form = ReservationForm({'espace': self.espace.pk, 'date_debut': debut, 'date_fin': fin})
+        self.assertFalse(form.is_valid())
+        self.assertIn("Cet espace est déjà réservé pour cette période", form.non_field_errors())
+
+    def test_reservations_avant_l_horizon(self):
+        ancienne = Reservation.objects.create(
+            membre=self.membre, espace=self.espace, statut='confirmee', prix_total=10,
+            date_debut=timezone.now() - timedelta(days=10), date_fin=timezone.now() - timedelta(days=9),
+        )
+        periode = (timezone.now() - timedelta(days=11), timezone.now() + timedelta(days=1))
+        self.assertEqual(moteur.conflits(self.espace.pk, *periode), [ancienne.pk])
+        self.assertEqual(moteur.espaces_libres([self.espace.pk, self.autre.pk], *periode), {self.autre.pk})
+        self.assertFalse(est_disponible(self.espace, *periode))
+
+
+class CreneauxTests(TestCase):
+
+    def setUp(self):
+        moteur.invalider()
+        cache_modeles.cache.clear()
+        self.membre = User.objects.create_user('membre', password='x')
+        self.bureau = TypeEspace.objects.create(nom='Bureau')
+        salle = TypeEspace.objects.create(nom='Salle')
+        self.petit = EspaceTravail.objects.create(nom='B1', type_espace=self.bureau, capacite=2, prix_heure=10)
+        self.grand = EspaceTravail.objects.create(nom='B2', type_espace=self.bureau, capacite=6, prix_heure=10)
+        self.salle = EspaceTravail.objects.create(nom='S1', type_espace=salle, capacite=10, prix_heure=30)
+        EspaceTravail.objects.create(nom='Fermé', type_espace=salle, capacite=10, prix_heure=30, disponible=False)
+        self.origine = (timezone.now() + timedelta(days=2)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def h(self, debut, fin):
+        return self.origine + timedelta(hours=debut), self.origine + timedelta(hours=fin)
+
+    def reserver(self, debut, fin, statut='confirmee'):
+        date_debut, date_fin = self.h(debut, fin)
+        return Reservation.objects.create(membre=self.membre, espace=self.petit, statut=statut, prix_total=10,
+                                          date_debut=date_debut, date_fin=date_fin)
+
+    def rechercher(self, debut, fin, **options):
+        return {r.espace: r for r in rechercher_creneaux(*self.h(debut, fin), **options)}
+
+    def test_creneaux_proposes(self):
+        matinee = self.reserver(9, 11)
+        self.reserver(12, 13)
+        self.reserver(13, 14, statut='en_attente')
+        resultats = self.rechercher(9, 10)
+        self.assertEqual(set(resultats), {self.petit, self.grand, self.salle})
+        self.assertFalse(resultats[self.petit].libre)
+        self.assertTrue(resultats[self.grand].libre)
+        # Créneaux d'une heure au plus tôt : après 9 h - 11 h, en sautant 12 h - 13 h
+        self.assertEqual(resultats[self.petit].prochains_creneaux, [self.h(11, 12), self.h(13, 14), self.h(14, 15)])
+        self.assertEqual(resultats[self.grand].prochains_creneaux, [self.h(9, 10), self.h(10, 11), self.h(11, 12)])
+        # Fenêtre de suggestions limitée à 2 h après la fin demandée
+        resultats = self.rechercher(9, 10, horizon=timedelta(hours=2))
+        self.assertEqual(resultats[self.petit].prochains_creneaux, [self.h(11, 12)])
+
+        matinee.statut = 'annulee'
+        matinee.save()
+        resultats = self.rechercher(9, 11, nombre=2)
+        self.assertTrue(resultats[self.petit].libre)
+        self.assertEqual(resultats[self.petit].prochains_creneaux, [self.h(9, 11), self.h(13, 15)])
+
+    def test_filtres_et_requetes(self):
+        self.assertEqual(list(self.rechercher(9, 10, type_espace=self.bureau, capacite_min=4)), [self.grand])
+        self.assertEqual(self.rechercher(9, 10, nombre=0)[self.salle].prochains_creneaux, [])
+        # Arbres déjà chargés : seule la liste des candidats est lue
+        with self.assertNumQueries(1):
+            self.rechercher(15, 16)
+
+    def test_api_creneaux(self):
+        self.reserver(9, 11)
+        debut, fin = (f'{timezone.localtime(moment):%Y-%m-%d %H:%M}' for moment in self.h(9, 10))
+        reponse = self.client.get(reverse('api_creneaux'), {
+            'date_debut': debut, 'date_fin': fin, 'type_espace': self.bureau.pk, 'capacite_min': 2, 'nombre': 1,
+        })
+        espaces = {espace['nom']: espace for espace in reponse.json()['espaces']}
+        self.assertEqual(set(espaces), {'B1', 'B2'})
+        self.assertFalse(espaces['B1']['libre'])
+        self.assertEqual(len(espaces['B1']['prochains_creneaux']), 1)
+        self.assertEqual(espaces['B1']['prochains_creneaux'][0]['prix'], '10.00')
+        reponse = self.client.get(reverse('api_creneaux'), {'date_debut': fin, 'date_fin': debut})
+        self.assertEqual(reponse.status_code, 400)
+
+    def test_periode_bornee(self):
+        for debut, fin in (
+            # Fin de calendrier : plus de dépassement de capacité sur date_fin + horizon
+            ('9999-12-30T10:00', '9999-12-31T10:00'),
+            # Plusieurs décennies : ni parcours des arbres ni chiffrage jour par jour
+            ('2000-01-01T10:00', '2090-01-01T10:00'),
+        ):
+            with self.subTest(debut=debut, fin=fin):
+                parametres = {'date_debut': debut, 'date_fin': fin}
+                reponse = self.client.get(reverse('api_creneaux'), parametres)
+                self.assertEqual(reponse.status_code, 400)
+                self.assertIn('date_fin', reponse.json()['erreurs'])
+                reponse = self.client.get(reverse('liste_espaces'), parametres)
+                self.assertEqual(reponse.status_code, 200)
+                self.assertFalse(reponse.context['periode'])
+                self.assertIn('date_fin', reponse.context['form'].errors)
+
+    def test_chiffrage_borne(self):
+        debut = timezone.now() - timedelta(days=365 * 30)
+        resultats = rechercher_creneaux(debut, debut + timedelta(hours=1))
+        with self.assertRaises(ValueError):
+            chiffrer(resultats, debut, debut + timedelta(days=60))
+        chiffrer(resultats, *self.h(9, 10))
+        self.assertEqual({r.espace: r.prix for r in resultats}[self.petit], Decimal('10.00'))
+
+
+class EvenementsTests(TestCase):
+
+    def setUp(self):
+        organisateur = User.objects.create_user('organisateur', password='x')
+        debut = timezone.now() + timedelta(days=7)
+        self.evenement = Evenement.objects.create(
+            nom='Atelier', description='', lieu='Salle', places_max=1, organisateur=organisateur,
+            date_debut=debut, date_fin=debut + timedelta(hours=2),
+        )
+        self.membres = [User.objects.create_user(f'membre{rang}') for rang in range(13)]
+
+    def test_liste_attente_puis_promotion(self):
+        self.assertEqual(inscrire(self.membres[0], self.evenement).statut, ResultatInscription.INSCRIT)
+        resultat = inscrire(self.membres[1], self.evenement)
+        self.assertEqual((resultat.statut, resultat.position), (ResultatInscription.EN_ATTENTE, 1))
+        self.assertEqual(desinscrire(self.membres[0], self.evenement), [self.membres[1].id])
+        self.evenement.refresh_from_db()
+        self.assertEqual(self.evenement.nb_inscrits, 1)
+        self.assertFalse(ListeAttente.objects.exists())
+
+    def test_promotion_quand_les_premieres_demandes_sont_prises(self):
+        for membre in self.membres[1:]:
+            ListeAttente.objects.create(membre=membre, evenement=self.evenement)
+        supprimer = QuerySet.delete
+        prises = []
+
+        def prise_par_un_autre(queryset):
+            # Les dix premières demandes lues disparaissent avant notre DELETE
+            resultat = supprimer(queryset)
+            if queryset.model is ListeAttente and len(prises) < 10:
+                prises.append(queryset)
+                return 0, {}
+            return resultat
+
+        with mock.patch.object(QuerySet, 'delete', autospec=True, side_effect=prise_par_un_autre):
+            promus = promouvoir(self.evenement)
+        # La liste est relue : la onzième demande obtient la place au lieu de la rendre
+        self.assertEqual(promus, [self.membres[11].id])
+        self.evenement.refresh_from_db()
+        self.assertEqual(self.evenement.nb_inscrits, 1)
+        self.assertEqual(list(ListeAttente.objects.values_list('membre_id', flat=True)), [self.membres[12].id])
+
+
+    def nb_inscrits(self):
+        self.evenement.refresh_from_db()
+        return self.evenement.nb_inscrits
+
+    def test_compteur_tenu_par_les_signaux(self):
+        inscription = Inscription.objects.create(membre=self.membres[0], evenement=self.evenement)
+        Inscription.objects.create(membre=self.membres[1], evenement=self.evenement)
+        self.assertEqual(self.nb_inscrits(), 2)
+        inscription.save()
+        self.assertEqual(self.nb_inscrits(), 2)
+        inscription.delete()
+        self.assertEqual(self.nb_inscrits(), 1)
+        Inscription.objects.filter(evenement=self.evenement).delete()
+        self.assertEqual(self.nb_inscrits(), 0)
+        # inscrire() a déjà pris la place : le signal ne la compte pas une seconde fois
+        inscrire(self.membres[2], self.evenement)
+        self.assertEqual(self.nb_inscrits(), 1)
+
+    def test_commande_recalculer_compteurs(self):
+        # Écritures qui échappent aux signaux
+        Inscription.objects.bulk_create(
+            [Inscription(membre=membre, evenement=self.evenement) for membre in self.membres[:3]]
+        )
+        Notification.objects.create(destinataire=self.membres[0], titre='A', message='a')
+        Notification.objects.filter(destinataire=self.membres[0]).update(lue=True)
+        version = CompteurNotifications.objects.get(user=self.membres[0]).version
+        sortie = StringIO()
+        call_command('recalculer_compteurs', stdout=sortie)
+        self.assertEqual(self.nb_inscrits(), 3)
+        compteur = CompteurNotifications.objects.get(user=self.membres[0])
+        self.assertEqual((compteur.non_lues, compteur.version), (0, version + 1))
+        self.assertIn('1 événement(s)', sortie.getvalue())
+
+class InscriptionsConcurrentesTests(TransactionTestCase):
+
+    def test_inscriptions_et_promotions_concurrentes(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("base SQLite en mémoire : non partagée entre threads")
+        organisateur = User.objects.create_user('organisateur', password='x')
+        debut = timezone.now() + timedelta(days=7)
+        evenement = Evenement.objects.create(
+            nom='Atelier', description='', lieu='Salle', places_max=5, organisateur=organisateur,
+            date_debut=debut, date_fin=debut + timedelta(hours=2),
+        )
+        membres = [User.objects.create_user(f'membre{rang}', password='x') for rang in range(20)]
+
+        def en_parallele(action, liste):
+            def appeler(membre):
+                try:
+                    return action(membre, evenement)
+                finally:
+                    connections.close_all()
+
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                return list(pool.map(appeler, liste))
+
+        # UPDATE conditionnel : jamais plus d'inscrits que de places
+        resultats = en_parallele(inscrire, membres)
+        inscrits = [
+            membre for membre, resultat in zip(membres, resultats) if resultat.statut == ResultatInscription.INSCRIT
+        ]
+        self.assertEqual(len(inscrits), 5)
+        self.assertEqual(ListeAttente.objects.filter(evenement=evenement).count(), 15)
+
+        # Chaque place libérée revient à une demande différente de la liste d'attente
+        promus = [membre_id for liste in en_parallele(desinscrire, inscrits) for membre_id in liste]
+        self.assertEqual(len(promus), 5)
+        self.assertEqual(len(set(promus)), 5)
+        evenement.refresh_from_db()
+        self.assertEqual(evenement.nb_inscrits, 5)
+        inscriptions = Inscription.objects.filter(evenement=evenement).values_list('membre_id', flat=True)
+        self.assertEqual(set(inscriptions), set(promus))
+        self.assertEqual(ListeAttente.objects.filter(evenement=evenement).count(), 10)
@@ -27,10 +27,15 @@ urlpatterns = [
     path('evenements/', views.liste_evenements, name='liste_evenements'),
     path('evenements/<int:evenement_id>/', views.detail_evenement, name='detail_evenement'),
     path('evenements/<int:evenement_id>/inscription/', views.inscription_evenement, name='inscription_evenement'),
+    path('evenements/<int:evenement_id>/desinscription/', views.desinscription_evenement, name='desinscription_evenement'),
     
   
     # API AJAX
     path('api/notifications/', views.api_notifications, name='api_notifications'),
+    path('api/notifications/flux/', views.flux_notifications, name='flux_notifications'),
+    path('api/creneaux/', views.api_creneaux, name='api_creneaux'),
+    path('api/devis/', views.api_devis, name='api_devis'),
+    path('api/membres/recherche/', views.api_recherche_membres, name='api_recherche_membres'),
     path('api/notifications/<int:notification_id>/lue/', views.marquer_notification_lue, name='marquer_notification_lue'),
 
 
@@ -78,8 +83,17 @@ urlpatterns = [
     # Gestion des factures
     path('gestion/factures/', liste_factures_admin, name='liste_factures_admin'),
     path('gestion/factures/creer/', creer_facture_admin, name='creer_facture_admin'),
+    path('gestion/factures/generer/', generer_factures_admin, name='generer_factures_admin'),
     path('gestion/factures/<int:facture_id>/', detail_facture_admin, name='detail_facture_admin'),
 
+    # Exports (réservations, factures, paiements)
+    path('gestion/exports/<str:jeu>/', exporter_admin, name='exporter_admin'),
+
+    # Cache des pages publiques (ratios de succès)
+    path('gestion/cache/', api_cache_admin, name='api_cache_admin'),
+    path('gestion/occupation/', api_occupation_admin, name='api_occupation_admin'),
+    path('gestion/revenus/', api_revenus_admin, name='api_revenus_admin'),
+
     # Notifications admin
     path('gestion/notifications/envoyer/', envoyer_notification_admin, name='envoyer_notification_admin'),
 
@@ -4,16 +4,50 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
 from django.contrib import messages
-from django.http import JsonResponse
+from django.contrib.auth import SESSION_KEY
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.db.models import Q, Count
 from django.utils import timezone
-from decimal import Decimal
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_POST
+import asyncio
+import json
+from asgiref.sync import sync_to_async
 from .models import *
 from .forms import *
-
+from .notifications import (
+    compteur, marquer_lue, mettre_version_en_cache, nombre_non_lues, page_non_lues, version_en_cache,
+)
+from .evenements import ResultatInscription, desinscrire, inscrire, position_attente, promouvoir
+from . import exports, statistiques
+from .statistiques import contexte_admin, stats_gestionnaire
+from .factures import enregistrer_facture, facturer_reservations_en_attente
+from .pagination import compte_demande_exact, compter, paginer
+from .recherche import rechercher_membres
+from .budget_requetes import budget_requetes
+from .roles import gestionnaire_requis
+from . import cache_modeles, occupation, revenus, tarifs
+from .reponses import condition_modeles
+from .temps_reel import courtier, format_sse
+from .creneaux import NB_SUGGESTIONS, candidats, chiffrer, rechercher_creneaux
+from .reservations import ResultatReservation, changer_statut, reserver, reserver_serie
+
+# Modèles dont dépendent les pages publiques mises en cache (voir coworking.cache_modeles)
+MODELES_ESPACES = (EspaceTravail, TypeEspace)
+MODELES_DETAIL_ESPACE = (EspaceTravail, TypeEspace, Reservation)
+# Les prix affichés dépendent des règles de tarif et de l'abonnement du membre
+MODELES_RECHERCHE = MODELES_DETAIL_ESPACE + (RegleTarif, ProfilMembre)
+MODELES_ACCUEIL = (EspaceTravail, TypeEspace, Evenement, Inscription)
+MODELES_EVENEMENTS = (Evenement, Inscription, ListeAttente)
+
+# Créneaux chiffrés au plus par appel de api_devis
+MAX_DEVIS = 500
+
+@condition_modeles('accueil', MODELES_ACCUEIL)
 def accueil(request):
     """Page d'accueil avec aperçu des espaces et événements"""
-    espaces = EspaceTravail.objects.filter(disponible=True)[:6]
+    # Querysets évalués dans les fragments en cache du gabarit : aucune requête quand ils y sont
+    espaces = EspaceTravail.objects.filter(disponible=True).select_related('type_espace')[:6]
     evenements = Evenement.objects.filter(date_debut__gte=timezone.now())[:4]
     return render(request, 'coworking/accueil.html', {
         'espaces': espaces,
@@ -45,42 +79,26 @@ def inscription(request):
     })
 
 
+@budget_requetes(6)
 @login_required
 def dashboard(request):
     """Tableau de bord personnalisé selon le type d'utilisateur"""
     profil = getattr(request.user, 'profilmembre', None)
     
-    try:
-        role = request.user.roleutilisateur.role
-    except RoleUtilisateur.DoesNotExist:
-        role = 'membre'
-    
-    if role == 'gestionnaire':
+    if request.role == 'gestionnaire':
         # Dashboard gestionnaire
-        stats = {
-            'membres_total': ProfilMembre.objects.count(),
-            'reservations_jour': Reservation.objects.filter(
-                date_debut__date=timezone.now().date()
-            ).count(),
-            'evenements_a_venir': Evenement.objects.filter(
-                date_debut__gte=timezone.now()
-            ).count(),
-            'factures_impayees': Facture.objects.filter(statut='en_attente').count()
-        }
+        stats = stats_gestionnaire(statistiques.snapshot())
         return render(request, 'coworking/dashboard_gestionnaire.html', {'stats': stats})
     else:
         # Dashboard membre
         mes_reservations = Reservation.objects.filter(
             membre=request.user,
             date_debut__gte=timezone.now()
-        )[:5]
+        ).select_related('espace')[:5]
         mes_evenements = request.user.evenements_participes.filter(
             date_debut__gte=timezone.now()
         )[:3]
-        notifications_non_lues = Notification.objects.filter(
-            destinataire=request.user,
-            lue=False
-        ).count()
+        notifications_non_lues = nombre_non_lues(request.user)
         
         return render(request, 'coworking/dashboard_membre.html', {
             'profil': profil,
@@ -91,10 +109,13 @@ def dashboard(request):
 
 
 # === VUES ESPACES ===
+@condition_modeles('espaces', MODELES_RECHERCHE)
 def liste_espaces(request):
     """Liste des espaces avec recherche et filtre par disponibilité"""
     form = RechercheEspaceForm(request.GET)
     espaces = EspaceTravail.objects.filter(disponible=True)
+    espaces_occupes = []
+    periode = False
     
     if form.is_valid():
         type_espace = form.cleaned_data.get('type_espace')
@@ -102,31 +123,136 @@ def liste_espaces(request):
         date_debut = form.cleaned_data.get('date_debut')
         date_fin = form.cleaned_data.get('date_fin')
         
-        if type_espace:
-            espaces = espaces.filter(type_espace=type_espace)
-        if capacite_min:
-            espaces = espaces.filter(capacite__gte=capacite_min)
-        if date_debut and date_fin:
-            espaces = espaces.exclude(
-                reservation__date_debut__lt=date_fin,
-                reservation__date_fin__gt=date_debut,
-                reservation__statut='confirmee'
+        if date_debut and date_fin and date_debut < date_fin:
+            # Espaces libres + créneaux alternatifs pour les espaces occupés
+            resultats = rechercher_creneaux(date_debut, date_fin, type_espace, capacite_min)
+            # Prix de la période et des créneaux proposés : un seul devis
+            chiffrer(resultats, date_debut, date_fin, tarifs.abonnement(request.user))
+            periode = True
+            espaces = []
+            for r in resultats:
+                if r.libre:
+                    r.espace.prix_periode = r.prix
+                    espaces.append(r.espace)
+            espaces_occupes = [r for r in resultats if not r.libre]
+        else:
+            espaces = cache_modeles.lire(
+                'liste_espaces', MODELES_ESPACES,
+                lambda: list(candidats(type_espace, capacite_min)),
+                (type_espace.pk if type_espace else None, capacite_min),
             )
     
     return render(request, 'coworking/liste_espaces.html', {
         'espaces': espaces,
+        'espaces_occupes': espaces_occupes,
+        'periode': periode,
         'form': form
     })
 
 
+def api_creneaux(request):
+    """API : espaces libres et prochains créneaux libres pour une période"""
+    form = RechercheEspaceForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'erreurs': form.errors}, status=400)
+    date_debut = form.cleaned_data.get('date_debut')
+    date_fin = form.cleaned_data.get('date_fin')
+    if not (date_debut and date_fin) or date_fin <= date_debut:
+        return JsonResponse({'erreurs': {'date_fin': ['Période invalide.']}}, status=400)
+    try:
+        nombre = min(max(int(request.GET.get('nombre', NB_SUGGESTIONS)), 0), 20)
+    except ValueError:
+        nombre = NB_SUGGESTIONS
+    
+    resultats = rechercher_creneaux(
+        date_debut, date_fin,
+        form.cleaned_data.get('type_espace'),
+        form.cleaned_data.get('capacite_min'),
+        nombre=nombre,
+    )
+    chiffrer(resultats, date_debut, date_fin, tarifs.abonnement(request.user))
+    return JsonResponse({'espaces': [
+        {
+            'id': r.espace.id,
+            'nom': r.espace.nom,
+            'type_espace': r.espace.type_espace.nom,
+            'capacite': r.espace.capacite,
+            'libre': r.libre,
+            'prix': r.prix,
+            'prochains_creneaux': [
+                {'date_debut': debut, 'date_fin': fin, 'prix': prix} for debut, fin, prix in r.creneaux_chiffres
+            ],
+        }
+        for r in resultats
+    ]})
+
+
+@require_POST
+def api_devis(request):
+    """API : prix d'un lot de créneaux, corps JSON {"creneaux": [{"espace", "date_debut", "date_fin"}]}
+
+    Les prix tiennent compte de l'abonnement du membre connecté. Un créneau
+    invalide, trop long ou trop lointain (voir tarifs.erreur_creneau), ou sur
+    un espace inconnu, reçoit une erreur à sa place, sans empêcher le
+    chiffrage des autres.
+    """
+    try:
+        creneaux = json.loads(request.body)['creneaux']
+        if not isinstance(creneaux, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'erreur': 'Corps attendu : {"creneaux": [...]}'}, status=400)
+    if len(creneaux) > MAX_DEVIS:
+        return JsonResponse({'erreur': f'Au plus {MAX_DEVIS} créneaux par demande'}, status=400)
+
+    demandes, erreurs = [], {}
+    for rang, creneau in enumerate(creneaux):
+        try:
+            espace_id = int(creneau['espace'])
+            debut = parse_datetime(creneau['date_debut'])
+            fin = parse_datetime(creneau['date_fin'])
+            # Chaque date reçoit son fuseau : l'une peut en avoir un et l'autre non
+            debut, fin = (moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+                          for moment in (debut, fin))
+        except (KeyError, TypeError, ValueError, AttributeError, OverflowError):
+            erreurs[rang] = 'Créneau invalide'
+            continue
+        erreur = tarifs.erreur_creneau(debut, fin)
+        if erreur:
+            erreurs[rang] = erreur
+            continue
+        demandes.append((rang, espace_id, debut, fin))
+    prix = dict(zip(
+        (rang for rang, _, _, _ in demandes),
+        tarifs.devis([demande[1:] for demande in demandes], tarifs.abonnement(request.user)),
+    ))
+
+    devis = []
+    for rang, creneau in enumerate(creneaux):
+        if rang in erreurs or prix[rang] is None:
+            devis.append({'erreur': erreurs.get(rang, 'Espace inconnu')})
+        else:
+            devis.append({'espace': int(creneau['espace']), 'date_debut': creneau['date_debut'],
+                          'date_fin': creneau['date_fin'], 'prix': prix[rang]})
+    return JsonResponse({'devis': devis})
+
+
+@budget_requetes(4)
+@condition_modeles('espace', MODELES_DETAIL_ESPACE)
 def detail_espace(request, espace_id):
     """Détail d'un espace de travail"""
-    espace = get_object_or_404(EspaceTravail, id=espace_id)
-    reservations_recentes = Reservation.objects.filter(
-        espace=espace,
-        statut='confirmee',
-        date_debut__gte=timezone.now()
-    ).order_by('date_debut')[:5]
+    def charger():
+        espace = get_object_or_404(EspaceTravail.objects.select_related('type_espace'), id=espace_id)
+        reservations_recentes = list(Reservation.objects.filter(
+            espace=espace,
+            statut='confirmee',
+            date_debut__gte=timezone.now()
+        ).order_by('date_debut')[:5])
+        return espace, reservations_recentes
+    
+    espace, reservations_recentes = cache_modeles.lire(
+        'detail_espace', MODELES_DETAIL_ESPACE, charger, (espace_id,)
+    )
     
     return render(request, 'coworking/detail_espace.html', {
         'espace': espace,
@@ -141,29 +267,42 @@ def reserver_espace(request, espace_id=None):
     
     if request.method == 'POST':
         form = ReservationForm(request.POST)
-        if form.is_valid():
-            reservation = form.save(commit=False)
-            reservation.membre = request.user
-            
-            # Vérifier conflits
-            conflits = Reservation.objects.filter(
-                espace=reservation.espace,
-                statut='confirmee',
-                date_debut__lt=reservation.date_fin,
-                date_fin__gt=reservation.date_debut
+        if form.is_valid() and form.cleaned_data['frequence']:
+            resultat = reserver_serie(
+                request.user,
+                form.cleaned_data['espace'],
+                form.cleaned_data['date_debut'],
+                form.cleaned_data['date_fin'],
+                form.cleaned_data['frequence'],
+                intervalle=form.cleaned_data['intervalle'],
+                nombre=form.cleaned_data['nombre_occurrences'],
+                jusqu_au=form.cleaned_data['jusqu_au'],
+                exceptions=form.cleaned_data['exceptions'],
             )
-            if conflits.exists():
-                messages.error(request, 'Cet espace est déjà réservé pour cette période.')
-                return redirect('reserver_espace', espace_id=espace.id if espace else None)
-            
-            # Calcul du prix
-            duree = reservation.date_fin - reservation.date_debut
-            heures = duree.total_seconds() / 3600
-            reservation.prix_total = Decimal(heures) * reservation.espace.prix_heure
-            
-            reservation.save()
-            messages.success(request, 'Réservation créée avec succès !')
-            return redirect('mes_reservations')
+            jours = ', '.join(f"{timezone.localtime(debut):%d/%m/%Y}" for debut, _, _ in resultat.conflits)
+            if resultat.statut == ResultatReservation.CONFLIT:
+                form.add_error(None, f'Toutes les occurrences sont déjà réservées ({jours}).')
+            elif resultat.statut == ResultatReservation.INDISPONIBLE:
+                form.add_error('espace', "Cet espace n'est plus disponible à la réservation.")
+            else:
+                messages.success(request, f'{len(resultat.reservations)} réservations créées.')
+                if resultat.conflits:
+                    messages.warning(request, f'Créneaux déjà réservés, non créés : {jours}.')
+                return redirect('mes_reservations')
+        elif form.is_valid():
+            resultat = reserver(
+                request.user,
+                form.cleaned_data['espace'],
+                form.cleaned_data['date_debut'],
+                form.cleaned_data['date_fin'],
+            )
+            if resultat.statut == ResultatReservation.CONFLIT:
+                form.add_error(None, 'Cet espace est déjà réservé pour cette période.')
+            elif resultat.statut == ResultatReservation.INDISPONIBLE:
+                form.add_error('espace', "Cet espace n'est plus disponible à la réservation.")
+            else:
+                messages.success(request, 'Réservation créée avec succès !')
+                return redirect('mes_reservations')
     else:
         initial_data = {}
         if espace:
@@ -177,12 +316,13 @@ def reserver_espace(request, espace_id=None):
 
 
 # === VUES RÉSERVATIONS ===
+@budget_requetes(3)
 @login_required
 def mes_reservations(request):
     """Liste des réservations du membre connecté"""
     reservations = Reservation.objects.filter(
         membre=request.user
-    ).order_by('-date_creation', '-date_debut')
+    ).select_related('espace').order_by('-date_creation', '-date_debut')
     
     now = timezone.now()
     return render(request, 'coworking/mes_reservations.html', {
@@ -211,6 +351,7 @@ def annuler_reservation(request, reservation_id):
 
 
 # === VUES ÉVÉNEMENTS ===
+@condition_modeles('evenements', (Evenement, Inscription))
 def liste_evenements(request):
     """Liste des événements à venir"""
     evenements = Evenement.objects.filter(
@@ -222,6 +363,7 @@ def liste_evenements(request):
     })
 
 
+@condition_modeles('evenement', MODELES_EVENEMENTS)
 def detail_evenement(request, evenement_id):
     """Détail d'un événement"""
     evenement = get_object_or_404(Evenement, id=evenement_id)
@@ -232,32 +374,49 @@ def detail_evenement(request, evenement_id):
             evenement=evenement
         ).exists()
     
+    position_liste_attente = None
+    if request.user.is_authenticated and not inscrit:
+        position_liste_attente = position_attente(request.user, evenement)
+    participants = evenement.participants.all()
+    
     return render(request, 'coworking/detail_evenement.html', {
         'evenement': evenement,
-        'inscrit': inscrit
+        'participants': participants,
+        'inscrit': inscrit,
+        'position_liste_attente': position_liste_attente,
     })
 
 @login_required
 def inscription_evenement(request, evenement_id):
-    """S'inscrire à un événement"""
+    """S'inscrire à un événement (ou rejoindre la liste d'attente s'il est complet)"""
     evenement = get_object_or_404(Evenement, id=evenement_id)
-    
-    if evenement.places_restantes > 0:
-        inscription, created = Inscription.objects.get_or_create(
-            membre=request.user,
-            evenement=evenement
-        )
-        
-        if created:
-            messages.success(request, f'Inscription confirmée pour "{evenement.nom}"')
-        else:
-            messages.info(request, 'Vous êtes déjà inscrit à cet événement.')
+    if request.method != 'POST':
+        return redirect('detail_evenement', evenement_id=evenement_id)
+    
+    resultat = inscrire(request.user, evenement)
+    if resultat.statut == ResultatInscription.INSCRIT:
+        messages.success(request, f'Inscription confirmée pour "{evenement.nom}"')
+    elif resultat.statut == ResultatInscription.DEJA_INSCRIT:
+        messages.info(request, 'Vous êtes déjà inscrit à cet événement.')
     else:
-        messages.error(request, 'Aucune place disponible pour cet événement.')
+        messages.info(
+            request,
+            f'Événement complet : vous êtes en position {resultat.position} sur la liste d\'attente.'
+        )
     
     return redirect('detail_evenement', evenement_id=evenement_id)
 
 
+@login_required
+def desinscription_evenement(request, evenement_id):
+    """Se désinscrire d'un événement ; la place revient au premier de la liste d'attente"""
+    evenement = get_object_or_404(Evenement, id=evenement_id)
+    if request.method == 'POST':
+        desinscrire(request.user, evenement)
+        messages.success(request, f'Votre inscription à "{evenement.nom}" a été annulée.')
+    return redirect('detail_evenement', evenement_id=evenement_id)
+
+
 # === VUES GESTIONNAIRE ===@login_required
 def gestion_membres(request):
     """Vue gestionnaire - Liste des membres (staff uniquement)"""
@@ -316,15 +475,80 @@ def gestion_evenements(request):
     })
 
 # === API AJAX ===
-@login_required
 def api_notifications(request):
-    """API pour récupérer les notifications non lues"""
-    notifications = Notification.objects.filter(
-        destinataire=request.user,
-        lue=False
-    ).values('id', 'titre', 'message', 'type_notification', 'date_creation')
+    """API pour récupérer les notifications non lues (paginée, avec ETag)
+
+    Un navigateur qui renvoie l'ETag d'une boîte inchangée reçoit un 304
+    sans qu'aucune requête ne touche aux notifications : la version de la
+    boîte est lue dans le cache à partir de l'identifiant de session.
+    """
+    user_id = request.session.get(SESSION_KEY)
+    etag_client = request.headers.get('If-None-Match')
+    if user_id and etag_client:
+        version = version_en_cache(user_id)
+        if version is not None and etag_client == etag_notifications(user_id, version):
+            return HttpResponseNotModified(headers={'ETag': etag_client})
+    return _api_notifications(request)
+
+
+@login_required
+def _api_notifications(request):
+    boite = compteur(request.user.id)
+    mettre_version_en_cache(request.user.id, boite.version)
+    etag = etag_notifications(request.user.id, boite.version)
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponseNotModified(headers={'ETag': etag})
     
-    return JsonResponse(list(notifications), safe=False)
+    try:
+        limite = min(max(int(request.GET.get('limite', 20)), 1), 100)
+    except ValueError:
+        limite = 20
+    notifications, suivant = page_non_lues(request.user.id, request.GET.get('curseur'), limite)
+    
+    response = JsonResponse({
+        'non_lues': boite.non_lues,
+        'notifications': notifications,
+        'suivant': suivant,
+    })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def etag_notifications(user_id, version):
+    return f'W/"notifications-{user_id}-{version}"'
+
+
+# Intervalle (secondes) des commentaires de maintien de connexion
+INTERVALLE_PING = 15
+
+async def flux_notifications(request):
+    """Flux Server-Sent Events des nouvelles notifications (à servir en ASGI)"""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    non_lues = await sync_to_async(nombre_non_lues)(user)
+    
+    async def evenements():
+        abonnement = courtier.abonner(user.id)
+        try:
+            yield 'retry: 5000\n\n'
+            yield format_sse({'non_lues': non_lues}, evenement='compteur')
+            while True:
+                try:
+                    notification = await asyncio.wait_for(abonnement[1].get(), INTERVALLE_PING)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                yield format_sse(notification, evenement='notification')
+        finally:
+            courtier.desabonner(user.id, abonnement)
+    
+    response = StreamingHttpResponse(evenements(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Désactive la mise en tampon des proxys (nginx)
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @login_required
 def marquer_notification_lue(request, notification_id):
@@ -335,8 +559,7 @@ def marquer_notification_lue(request, notification_id):
             id=notification_id,
             destinataire=request.user
         )
-        notification.lue = True
-        notification.save()
+        marquer_lue(notification)
         return JsonResponse({'success': True})
     
     return JsonResponse({'success': False})
@@ -386,72 +609,129 @@ def connexion(request):
 
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.db.models import Q, Count, Sum
+from django.db.models import Q, Count
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from django.http import JsonResponse
 from .models import *
 from .forms import *
 
-def est_gestionnaire(user):
-    """Vérifie si l'utilisateur est un gestionnaire"""
-    try:
-        return user.roleutilisateur.role == 'gestionnaire'
-    except:
-        return False
+# Période de la carte d'occupation du tableau de bord (coworking.occupation)
+SEMAINES_OCCUPATION = 4
+JOURS_SEMAINE = ('Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim')
+# Mois du rapport de revenus du tableau de bord (coworking.revenus), mois en cours compris
+MOIS_REVENUS = 6
 
-@login_required
-@user_passes_test(est_gestionnaire)
+
+def premier_jour_mois(jour, mois_avant=0):
+    """1er du mois situé `mois_avant` mois avant celui de `jour`."""
+    annee, mois = divmod(jour.year * 12 + jour.month - 1 - mois_avant, 12)
+    return jour.replace(year=annee, month=mois + 1, day=1)
+
+@gestionnaire_requis
 def dashboard_admin(request):
     """Dashboard principal pour les administrateurs"""
-    # Statistiques générales
-    total_membres = User.objects.filter(roleutilisateur__role='membre').count()
-    total_espaces = EspaceTravail.objects.count()
-    reservations_aujourd_hui = Reservation.objects.filter(
-        date_debut__date=timezone.now().date(),
-        statut='confirmee'
-    ).count()
-    
-    # Revenus du mois
-    debut_mois = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    revenus_mois = Facture.objects.filter(
-        date_creation__gte=debut_mois,
-        statut='payee'
-    ).aggregate(total=Sum('montant_total'))['total'] or 0
-    
-    # Réservations récentes
-    reservations_recentes = Reservation.objects.select_related(
-        'membre', 'espace'
-    ).order_by('-date_creation')[:5]
-    
-    # Factures en attente
-    factures_en_attente = Facture.objects.filter(
-        statut='en_attente'
-    ).count()
-    
-    # Événements à venir
-    evenements_a_venir = Evenement.objects.filter(
-        date_debut__gte=timezone.now()
-    ).order_by('date_debut')[:3]
+    # Chiffres précalculés : une seule ligne lue (voir coworking.statistiques)
+    context = contexte_admin(statistiques.snapshot())
+    
+    # Carte de chaleur des SEMAINES_OCCUPATION dernières semaines (matrices en cache)
+    aujourd_hui = timezone.localdate()
+    espaces = list(EspaceTravail.objects.order_by('nom').values_list('id', 'nom'))
+    occupations = occupation.occupation(
+        [espace_id for espace_id, _ in espaces],
+        aujourd_hui - timedelta(weeks=SEMAINES_OCCUPATION - 1), aujourd_hui,
+    )
+    globale = occupation.occupation_globale(occupations)
+    ouverture, fermeture = occupation.HEURES_OUVERTURE
+    context.update({
+        'semaines_occupation': SEMAINES_OCCUPATION,
+        'heures_occupation': range(ouverture, fermeture),
+        'carte_occupation': [
+            (jour, heures[ouverture:fermeture]) for jour, heures in zip(JOURS_SEMAINE, globale.jours)
+        ],
+        'taux_occupation': globale.taux * 100,
+        'espaces_occupation': sorted(
+            ((nom, occupations[espace_id].taux * 100) for espace_id, nom in espaces),
+            key=lambda ligne: -ligne[1],
+        )[:5],
+    })
     
-    context = {
-        'total_membres': total_membres,
-        'total_espaces': total_espaces,
-        'reservations_aujourd_hui': reservations_aujourd_hui,
-        'revenus_mois': revenus_mois,
-        'reservations_recentes': reservations_recentes,
-        'factures_en_attente': factures_en_attente,
-        'evenements_a_venir': evenements_a_venir,
-    }
+    # Revenus : sommes de cumuls journaliers, deux requêtes quelle que soit la période
+    abonnements = dict(ProfilMembre.TYPES_ABONNEMENT)
+    debut_mois = premier_jour_mois(aujourd_hui)
+    context.update({
+        'mois_revenus': MOIS_REVENUS,
+        'revenus_par_mois': revenus.rapport(premier_jour_mois(aujourd_hui, MOIS_REVENUS - 1), aujourd_hui),
+        'revenus_par_abonnement': [
+            dict(ligne, nom=abonnements.get(ligne['groupe'], 'Sans profil'))
+            for ligne in revenus.rapport(debut_mois, aujourd_hui, par='abonnement')
+        ],
+    })
     
     return render(request, 'admin/dashboard_admin.html', context)
 
+
+@gestionnaire_requis
+def api_occupation_admin(request):
+    """API : cartes d'occupation (7 jours × 24 heures) par espace, ?debut=&fin=&espace="""
+    aujourd_hui = timezone.localdate()
+    espaces = EspaceTravail.objects.order_by('nom')
+    if request.GET.getlist('espace'):
+        espaces = espaces.filter(id__in=[int(i) for i in request.GET.getlist('espace') if i.isdigit()])
+    espaces = list(espaces.values_list('id', 'nom'))
+    try:
+        # parse_date lève ValueError pour une date bien formée mais inexistante (2030-02-30)
+        fin = parse_date(request.GET.get('fin') or '') or aujourd_hui
+        debut = parse_date(request.GET.get('debut') or '') or fin - timedelta(weeks=SEMAINES_OCCUPATION - 1)
+        # Même horizon que les devis : les semaines sont prolongées au-delà des dates demandées
+        if not (aujourd_hui - tarifs.HORIZON <= debut and fin <= aujourd_hui + tarifs.HORIZON):
+            raise ValueError(f"Période à plus de {tarifs.HORIZON.days} jours d'aujourd'hui")
+        occupations = occupation.occupation([espace_id for espace_id, _ in espaces], debut, fin)
+    except (ValueError, OverflowError) as erreur:
+        return JsonResponse({'erreur': str(erreur)}, status=400)
+    return JsonResponse({
+        'semaines': [semaine.isoformat() for semaine in occupation.semaines(debut, fin)],
+        'heures_ouverture': list(occupation.HEURES_OUVERTURE),
+        'global': {
+            'taux': occupation.occupation_globale(occupations).taux,
+            'jours': occupation.occupation_globale(occupations).jours,
+        },
+        'espaces': [
+            {'id': espace_id, 'nom': nom, 'taux': occupations[espace_id].taux, 'jours': occupations[espace_id].jours}
+            for espace_id, nom in espaces
+        ],
+    })
+
+
+@gestionnaire_requis
+def api_revenus_admin(request):
+    """API : revenus par période, ?debut=&fin=&par=mois|jour|type_espace|abonnement"""
+    aujourd_hui = timezone.localdate()
+    par = request.GET.get('par') or 'mois'
+    try:
+        fin = parse_date(request.GET.get('fin') or '') or aujourd_hui
+        debut = parse_date(request.GET.get('debut') or '') or premier_jour_mois(fin, MOIS_REVENUS - 1)
+        lignes = revenus.rapport(debut, fin, par=par)
+    except ValueError as erreur:
+        return JsonResponse({'erreur': str(erreur)}, status=400)
+    return JsonResponse({
+        'debut': debut,
+        'fin': fin,
+        'par': par,
+        'total': revenus.totaux(debut, fin),
+        'lignes': lignes,
+    })
+
 # ============== GESTION DES MEMBRES ==============
 
-@login_required
-@user_passes_test(est_gestionnaire)
+# Nombre maximal de membres retenus par une recherche dans la liste
+LIMITE_RECHERCHE_LISTE = 500
+NB_SUGGESTIONS_MEMBRES = 10
+
+@budget_requetes(6)
+@gestionnaire_requis
 def liste_membres_admin(request):
     """Liste tous les membres avec filtres"""
     membres = User.objects.filter(roleutilisateur__role='membre').select_related('profilmembre')
@@ -460,46 +740,77 @@ def liste_membres_admin(request):
     recherche = request.GET.get('recherche')
     type_abonnement = request.GET.get('type_abonnement')
     
+    recherche_tronquee = False
     if recherche:
-        membres = membres.filter(
-            Q(username__icontains=recherche) |
-            Q(first_name__icontains=recherche) |
-            Q(last_name__icontains=recherche) |
-            Q(email__icontains=recherche)
-        )
+        ids = rechercher_membres(recherche, limite=LIMITE_RECHERCHE_LISTE)
+        # Limite atteinte : d'autres membres correspondent sans doute
+        recherche_tronquee = len(ids) >= LIMITE_RECHERCHE_LISTE
+        membres = membres.filter(id__in=ids)
     
     if type_abonnement:
         membres = membres.filter(profilmembre__type_abonnement=type_abonnement)
     
+    exact = compte_demande_exact(request)
     context = {
-        'membres': membres,
+        # User n'a pas de date indexée : la clé de pagination est l'id (ordre d'inscription)
+        'membres': paginer(request, membres, cle=('-id',)),
+        'abonnements_actifs': compter(membres.filter(profilmembre__abonnement_actif=True), not exact),
+        'abonnements_inactifs': compter(membres.filter(profilmembre__abonnement_actif=False), not exact),
         'types_abonnement': ProfilMembre.TYPES_ABONNEMENT,
+        'recherche_tronquee': recherche_tronquee,
+        'limite_recherche': LIMITE_RECHERCHE_LISTE,
     }
     
     return render(request, 'admin/membres/liste_membres.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
+def api_recherche_membres(request):
+    """API : autocomplétion des membres (nom, email, entreprise, téléphone)"""
+    requete = request.GET.get('q', '').strip()
+    if not requete:
+        return JsonResponse({'membres': []})
+    ids = rechercher_membres(requete, limite=NB_SUGGESTIONS_MEMBRES * 2)
+    membres = {
+        membre['id']: membre
+        for membre in User.objects.filter(id__in=ids, roleutilisateur__role='membre').values(
+            'id', 'username', 'first_name', 'last_name', 'email', 'profilmembre__entreprise',
+        )
+    }
+    # Les résultats gardent l'ordre de pertinence de l'index
+    return JsonResponse({'membres': [
+        {
+            'id': membre['id'],
+            'username': membre['username'],
+            'nom': f"{membre['first_name']} {membre['last_name']}".strip(),
+            'email': membre['email'],
+            'entreprise': membre['profilmembre__entreprise'] or '',
+        }
+        for membre in (membres.get(user_id) for user_id in ids) if membre
+    ][:NB_SUGGESTIONS_MEMBRES]})
+
+@budget_requetes(7)
+@gestionnaire_requis
 def detail_membre_admin(request, membre_id):
     """Détail d'un membre avec ses statistiques"""
-    membre = get_object_or_404(User, id=membre_id, roleutilisateur__role='membre')
+    membre = get_object_or_404(
+        User.objects.select_related('profilmembre'), id=membre_id, roleutilisateur__role='membre'
+    )
     
-    # Statistiques du membre
-    total_reservations = Reservation.objects.filter(membre=membre).count()
-    reservations_confirmees = Reservation.objects.filter(
-        membre=membre, statut='confirmee'
-    ).count()
+    # Statistiques du membre (une seule requête pour les deux compteurs)
+    compteurs = Reservation.objects.filter(membre=membre).aggregate(
+        total=Count('id'), confirmees=Count('id', filter=Q(statut='confirmee')),
+    )
+    total_reservations = compteurs['total']
+    reservations_confirmees = compteurs['confirmees']
     
     # Dernières réservations
     dernieres_reservations = Reservation.objects.filter(
         membre=membre
-    ).select_related('espace').order_by('-date_creation')[:5]
+    ).select_related('espace__type_espace').order_by('-date_creation')[:5]
     
-    # Factures
-    factures = Facture.objects.filter(membre=membre).order_by('-date_creation')[:5]
-    
-    # Événements participés
-    evenements = membre.evenements_participes.all()[:5]
+    # Factures et événements participés, lus une fois (le gabarit les compte puis les parcourt)
+    factures = list(Facture.objects.filter(membre=membre).order_by('-date_creation')[:5])
+    evenements = list(membre.evenements_participes.all()[:5])
     
     context = {
         'membre': membre,
@@ -512,8 +823,7 @@ def detail_membre_admin(request, membre_id):
     
     return render(request, 'admin/membres/detail_membre.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def creer_membre_admin(request):
     """Création d'un nouveau membre par l'admin"""
     if request.method == 'POST':
@@ -540,8 +850,7 @@ def creer_membre_admin(request):
     
     return render(request, 'admin/membres/form_membre.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def modifier_membre_admin(request, membre_id):
     """Modification d'un membre"""
     membre = get_object_or_404(User, id=membre_id, roleutilisateur__role='membre')
@@ -571,8 +880,7 @@ def modifier_membre_admin(request, membre_id):
     
     return render(request, 'admin/membres/modifier_membre.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def supprimer_membre_admin(request, membre_id):
     """Suppression d'un membre"""
     membre = get_object_or_404(User, id=membre_id, roleutilisateur__role='membre')
@@ -588,8 +896,7 @@ def supprimer_membre_admin(request, membre_id):
 
 # ============== GESTION DES ESPACES ==============
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def liste_espaces_admin(request):
     """Liste tous les espaces de travail"""
     espaces = EspaceTravail.objects.select_related('type_espace').all()
@@ -607,14 +914,14 @@ def liste_espaces_admin(request):
     types_espaces = TypeEspace.objects.all()
     
     context = {
-        'espaces': espaces,
+        'espaces': paginer(request, espaces, cle=('-id',)),
+        'espaces_disponibles': compter(espaces.filter(disponible=True), not compte_demande_exact(request)),
         'types_espaces': types_espaces,
     }
     
     return render(request, 'admin/espaces/liste_espaces.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def detail_espace_admin(request, espace_id):
     """Détail d'un espace de travail"""
     espace = get_object_or_404(EspaceTravail, id=espace_id)
@@ -624,24 +931,27 @@ def detail_espace_admin(request, espace_id):
         espace=espace
     ).select_related('membre').order_by('-date_creation')[:10]
     
-    # Statistiques
+    # Statistiques : mois en cours (plage de dates, pas date__month qui ignore l'année)
+    aujourd_hui = timezone.localdate()
+    debut_mois = aujourd_hui.replace(day=1)
     total_reservations = Reservation.objects.filter(espace=espace).count()
     reservations_mois = Reservation.objects.filter(
         espace=espace,
-        date_creation__month=timezone.now().month
+        date_creation__gte=timezone.make_aware(datetime.combine(debut_mois, time())),
     ).count()
+    taux_occupation = occupation.taux_periode([espace.id], debut_mois, aujourd_hui)[espace.id] * 100
     
     context = {
         'espace': espace,
         'reservations_recentes': reservations_recentes,
         'total_reservations': total_reservations,
         'reservations_mois': reservations_mois,
+        'taux_occupation': taux_occupation,
     }
     
     return render(request, 'admin/espaces/detail_espace.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def creer_espace_admin(request):
     """Création d'un nouvel espace de travail"""
     if request.method == 'POST':
@@ -660,8 +970,7 @@ def creer_espace_admin(request):
     
     return render(request, 'admin/espaces/form_espace.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def modifier_espace_admin(request, espace_id):
     """Modification d'un espace de travail"""
     espace = get_object_or_404(EspaceTravail, id=espace_id)
@@ -689,6 +998,7 @@ from django.shortcuts import get_object_or_404
 from .models import EspaceTravail
 
 @csrf_exempt
+@gestionnaire_requis
 def supprimer_espace_admin(request, espace_id):
     if request.method == 'POST':
         espace = get_object_or_404(EspaceTravail, id=espace_id)
@@ -702,8 +1012,7 @@ def supprimer_espace_admin(request, espace_id):
 
 # ============== GESTION DES TYPES D'ESPACES ==============
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def liste_types_espaces_admin(request):
     """Liste tous les types d'espaces"""
     types_espaces = TypeEspace.objects.annotate(
@@ -713,8 +1022,7 @@ def liste_types_espaces_admin(request):
     context = {'types_espaces': types_espaces}
     return render(request, 'admin/types_espaces/liste_types.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def creer_type_espace_admin(request):
     """Création d'un nouveau type d'espace"""
     if request.method == 'POST':
@@ -733,8 +1041,7 @@ def creer_type_espace_admin(request):
     
     return render(request, 'admin/types_espaces/form_type.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def modifier_type_espace_admin(request, type_id):
     """Modification d'un type d'espace"""
     type_espace = get_object_or_404(TypeEspace, id=type_id)
@@ -758,6 +1065,7 @@ def modifier_type_espace_admin(request, type_id):
 
 from django.views.decorators.http import require_POST
 @require_POST
+@gestionnaire_requis
 def supprimer_type_espace_admin(request, type_id):
     from .models import TypeEspace
     type_espace = get_object_or_404(TypeEspace, id=type_id)
@@ -774,6 +1082,7 @@ from django.shortcuts import get_object_or_404
 from .models import TypeEspace
 
 @require_POST
+@gestionnaire_requis
 def supprimer_type_espace_admin(request, type_id):
     type_espace = get_object_or_404(TypeEspace, id=type_id)
     try:
@@ -786,13 +1095,11 @@ def supprimer_type_espace_admin(request, type_id):
 
 # ============== GESTION DES RÉSERVATIONS ==============
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@budget_requetes(5)
+@gestionnaire_requis
 def liste_reservations_admin(request):
     """Liste toutes les réservations avec filtres"""
-    reservations = Reservation.objects.select_related(
-        'membre', 'espace'
-    ).order_by('-date_creation')
+    reservations = Reservation.objects.select_related('membre', 'espace__type_espace')
     
     # Filtres
     statut = request.GET.get('statut')
@@ -808,30 +1115,29 @@ def liste_reservations_admin(request):
     if date_debut:
         reservations = reservations.filter(date_debut__date=date_debut)
     
-    # Pagination simple
-    reservations = reservations[:50]  # Limiter à 50 résultats
-    
     espaces = EspaceTravail.objects.all()
     
     context = {
-        'reservations': reservations,
+        'reservations': paginer(request, reservations, cle=('-date_creation', '-id')),
         'espaces': espaces,
         'statuts': Reservation.STATUTS,
     }
     
     return render(request, 'admin/reservations/liste_reservations.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@budget_requetes(4)
+@gestionnaire_requis
 def detail_reservation_admin(request, reservation_id):
     """Détail d'une réservation"""
-    reservation = get_object_or_404(Reservation, id=reservation_id)
+    reservation = get_object_or_404(
+        Reservation.objects.select_related('membre', 'espace').prefetch_related('historiquereservation_set'),
+        id=reservation_id,
+    )
     
     context = {'reservation': reservation}
     return render(request, 'admin/reservations/detail_reservation.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def modifier_statut_reservation(request, reservation_id):
     """Modification du statut d'une réservation"""
     reservation = get_object_or_404(Reservation, id=reservation_id)
@@ -839,15 +1145,10 @@ def modifier_statut_reservation(request, reservation_id):
     if request.method == 'POST':
         nouveau_statut = request.POST.get('statut')
         if nouveau_statut in [choice[0] for choice in Reservation.STATUTS]:
-            ancien_statut = reservation.statut
-            reservation.statut = nouveau_statut
-            reservation.save()
-            
-            # Créer historique
-            HistoriqueReservation.objects.create(
-                reservation=reservation,
-                action=f'Statut changé de "{ancien_statut}" à "{nouveau_statut}"'
-            )
+            resultat = changer_statut(reservation, nouveau_statut)
+            if not resultat.succes:
+                messages.error(request, 'Impossible de confirmer : le créneau chevauche une réservation déjà confirmée.')
+                return redirect('detail_reservation_admin', reservation_id=reservation.id)
             
             messages.success(request, f'Statut de la réservation modifié avec succès.')
             
@@ -870,23 +1171,19 @@ def modifier_statut_reservation(request, reservation_id):
 
 # ============== GESTION DES ÉVÉNEMENTS ==============
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def liste_evenements_admin(request):
     """Liste tous les événements"""
-    evenements = Evenement.objects.select_related('organisateur').annotate(
-        nb_participants=Count('participants')
-    ).order_by('-date_debut')
+    evenements = Evenement.objects.select_related('organisateur')
     
-    context = {'evenements': evenements}
+    context = {'evenements': paginer(request, evenements, cle=('-date_debut', '-id'))}
     return render(request, 'admin/evenements/liste_evenements.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def detail_evenement_admin(request, evenement_id):
     """Détail d'un événement"""
     evenement = get_object_or_404(Evenement, id=evenement_id)
-    participants = evenement.participants.all()
+    participants = Inscription.objects.filter(evenement=evenement).select_related('membre').order_by('date_inscription')
     
     context = {
         'evenement': evenement,
@@ -895,8 +1192,7 @@ def detail_evenement_admin(request, evenement_id):
     
     return render(request, 'admin/evenements/detail_evenement.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def creer_evenement_admin(request):
     """Création d'un nouvel événement"""
     if request.method == 'POST':
@@ -917,8 +1213,7 @@ def creer_evenement_admin(request):
     
     return render(request, 'admin/evenements/form_evenement.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def modifier_evenement_admin(request, evenement_id):
     """Modification d'un événement"""
     evenement = get_object_or_404(Evenement, id=evenement_id)
@@ -927,6 +1222,8 @@ def modifier_evenement_admin(request, evenement_id):
         form = EvenementForm(request.POST, instance=evenement)
         if form.is_valid():
             form.save()
+            # Des places ont pu être ajoutées : la liste d'attente en profite
+            promouvoir(evenement)
             messages.success(request, f'Événement "{evenement.nom}" modifié avec succès.')
             return redirect('detail_evenement_admin', evenement_id=evenement.id)
     else:
@@ -942,44 +1239,52 @@ def modifier_evenement_admin(request, evenement_id):
 
 # ============== GESTION DES FACTURES ==============
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def liste_factures_admin(request):
     """Liste toutes les factures"""
-    factures = Facture.objects.select_related('membre').order_by('-date_creation')
+    toutes = Facture.objects.select_related('membre')
     
     # Filtres
     statut = request.GET.get('statut')
-    if statut:
-        factures = factures.filter(statut=statut)
+    factures = toutes.filter(statut=statut) if statut else toutes
+    
+    exact = compte_demande_exact(request)
+    comptes_statuts = {
+        code: compter(toutes.filter(statut=code), not exact) for code in ('payee', 'en_attente', 'en_retard')
+    }
+    comptes_statuts['total'] = compter(toutes, not exact)
     
     context = {
-        'factures': factures,
+        'factures': paginer(request, factures, cle=('-date_creation', '-id')),
+        'comptes_statuts': comptes_statuts,
         'statuts': Facture.STATUTS_FACTURE,
     }
     
     return render(request, 'admin/factures/liste_factures.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@budget_requetes(4)
+@gestionnaire_requis
 def detail_facture_admin(request, facture_id):
     """Détail d'une facture"""
-    facture = get_object_or_404(Facture, id=facture_id)
+    facture = get_object_or_404(
+        Facture.objects.select_related(
+            'membre__profilmembre', 'reservation__espace__type_espace',
+        ).prefetch_related('historiquepaiement_set'),
+        id=facture_id,
+    )
     
     context = {'facture': facture}
     return render(request, 'admin/factures/detail_facture.html', context)
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def creer_facture_admin(request):
     """Création d'une nouvelle facture"""
     if request.method == 'POST':
         form = FactureForm(request.POST)
         if form.is_valid():
             facture = form.save(commit=False)
-            # Générer numéro unique
-            facture.numero = f"FAC-{timezone.now().strftime('%Y%m%d')}-{Facture.objects.count() + 1:04d}"
-            facture.save()
+            # Numéro unique attribué par la séquence du jour
+            enregistrer_facture(facture)
             messages.success(request, f'Facture {facture.numero} créée avec succès.')
             return redirect('liste_factures_admin')
     else:
@@ -992,30 +1297,78 @@ def creer_facture_admin(request):
     
     return render(request, 'admin/factures/form_facture.html', context)
 
+@gestionnaire_requis
+@require_POST
+def generer_factures_admin(request):
+    """Facture en une fois toutes les réservations en attente non facturées"""
+    factures = facturer_reservations_en_attente()
+    if factures:
+        messages.success(request, f'{len(factures)} facture(s) générée(s) ({factures[0].numero} à {factures[-1].numero}).')
+    else:
+        messages.info(request, 'Aucune réservation en attente à facturer.')
+    return redirect('liste_factures_admin')
+
+# ============== EXPORTS ==============
+
+# Liste d'origine de chaque export (retour en cas d'erreur)
+LISTES_EXPORT = {
+    'reservations': 'liste_reservations_admin',
+    'factures': 'liste_factures_admin',
+    'paiements': 'liste_factures_admin',
+}
+
+@gestionnaire_requis
+def exporter_admin(request, jeu):
+    """Export en flux (CSV, ou Parquet avec ?format=parquet) avec les filtres de la liste"""
+    if jeu not in exports.JEUX:
+        raise Http404
+    format_export = request.GET.get('format', 'csv')
+    try:
+        exports.verifier_format(format_export)
+    except exports.ExportIndisponible as erreur:
+        messages.error(request, str(erreur))
+        return redirect(LISTES_EXPORT[jeu])
+    try:
+        du = parse_date(request.GET.get('du') or '')
+        au = parse_date(request.GET.get('au') or '')
+        # Les bornes deviennent des dates-heures (lendemain de « au ») : 9999-12-31 déborde
+        lignes = exports.queryset(jeu, request.GET, du=du, au=au)
+    except (ValueError, OverflowError):
+        # Date inexistante (2030-02-30) ou hors du calendrier
+        messages.error(request, 'Date invalide.')
+        return redirect(LISTES_EXPORT[jeu])
+    response = StreamingHttpResponse(
+        exports.flux(jeu, format_export, lignes),
+        content_type=exports.type_contenu(format_export),
+    )
+    nom_fichier = f"{jeu}_{du or 'debut'}_{au or timezone.localdate()}.{format_export}"
+    response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    return response
+
+# ============== CACHE DES PAGES PUBLIQUES ==============
+
+@gestionnaire_requis
+def api_cache_admin(request):
+    """API : succès / défauts du cache des pages publiques (processus courant)"""
+    return JsonResponse({'entrees': [
+        {'nom': nom, 'succes': succes, 'defauts': defauts, 'ratio': round(ratio, 3)}
+        for nom, (succes, defauts, ratio) in cache_modeles.ratios().items()
+    ]})
+
 # ============== GESTION DES NOTIFICATIONS ==============
 
-@login_required
-@user_passes_test(est_gestionnaire)
+@gestionnaire_requis
 def envoyer_notification_admin(request):
     """Envoi de notifications aux membres"""
     if request.method == 'POST':
         form = NotificationForm(request.POST)
         if form.is_valid():
-            destinataires = form.cleaned_data.get('destinataires_multiples')
-            
-            if not destinataires:
-                # Envoyer à tous les membres
-                destinataires = User.objects.filter(roleutilisateur__role='membre')
+            nombre, differe = form.save()
             
-            for user in destinataires:
-                Notification.objects.create(
-                    destinataire=user,
-                    titre=form.cleaned_data['titre'],
-                    message=form.cleaned_data['message'],
-                    type_notification=form.cleaned_data['type_notification']
-                )
-            
-            messages.success(request, f'Notification envoyée à {destinataires.count()} membre(s).')
+            if differe:
+                messages.success(request, f'Envoi de la notification à {nombre} membre(s) en cours.')
+            else:
+                messages.success(request, f'Notification envoyée à {nombre} membre(s).')
             return redirect('dashboard_admin')
     else:
         form = NotificationForm()
@@ -1050,12 +1403,13 @@ ABONNEMENTS = {
     }
 }
 
+@budget_requetes(4)
 @login_required
 def choisir_paiement(request):
     """
     Page où l'utilisateur choisit de payer sa réservation ou son abonnement.
     """
-    reservations = Reservation.objects.filter(membre=request.user, statut='en_attente')
+    reservations = Reservation.objects.filter(membre=request.user, statut='en_attente').select_related('espace')
     profil = get_object_or_404(ProfilMembre, user=request.user)
     return render(request, 'paiement/choisir.html', {
         'reservations': reservations,